@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+Steady-state allocation rate of the capture-to-send path
+
+Run from the src directory:
+    python -m benchmarks.alloc_rate [--seconds 60] [--chunk-size 1024]
+
+Feeds simulated capture chunks through the ring buffer, the VAD gate and the
+framer into a no-op sink, once with the copying ring read (a fresh bytes per
+chunk) and once with pooled buffers. For each path it reports, per second of
+audio:
+
+    alloc KiB/s  bytes allocated and freed again while handling a chunk
+                 (tracemalloc peak above the steady-state baseline)
+    gc0/s        generation-0 garbage collections triggered by object churn
+    pool miss/s  buffers the pool had to allocate because it ran dry
+
+PyAudio still returns a new bytes per read; that allocation happens before the
+ring buffer and is the same for both paths, so it is left out here.
+"""
+
+import argparse
+import gc
+import os
+import time
+import tracemalloc
+
+from core.buffer_pool import BufferPool
+from core.framer import AudioFramer
+from core.ring_buffer import PCMRingBuffer
+from core.vad import VoiceActivityGate
+
+
+def build_stages(sample_rate: int):
+    """Return the head of a VAD -> framer -> no-op sink chain"""
+    gate = VoiceActivityGate(sample_rate=sample_rate, energy_threshold_db=-90.0)
+    framer = AudioFramer(frame_ms=40, sample_rate=sample_rate)
+    framer.set_audio_callback(lambda frame: None)
+    gate.set_audio_callback(framer.process)
+    return gate
+
+
+def run(pooled: bool, seconds: float, chunk_size: int, sample_rate: int) -> dict:
+    """Push `seconds` of audio through one path and measure its allocations"""
+    ring = PCMRingBuffer(chunk_size * 8)
+    pool = BufferPool(chunk_size * 2, count=2)
+    head = build_stages(sample_rate)
+    captured = os.urandom(chunk_size * 2)
+    chunks = int(seconds * sample_rate / chunk_size)
+
+    def step():
+        ring.write(captured)
+        if pooled:
+            buffer = pool.acquire()
+            ring.read_into(buffer.samples)
+            head.process(buffer.view)
+            buffer.release()
+        else:
+            head.process(ring.read(chunk_size))
+
+    # Warm up so scratch buffers and caches have reached their final size
+    for _ in range(50):
+        step()
+
+    collections = [0]
+
+    def on_gc(phase, info):
+        if phase == 'start' and info['generation'] == 0:
+            collections[0] += 1
+
+    gc.callbacks.append(on_gc)
+    tracemalloc.start()
+    misses_before = pool.misses
+    transient = 0
+    start = time.perf_counter()
+    try:
+        for _ in range(chunks):
+            baseline = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            step()
+            transient += tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        elapsed = time.perf_counter() - start
+        tracemalloc.stop()
+        gc.callbacks.remove(on_gc)
+
+    return {
+        'alloc_kib_per_s': transient / 1024 / seconds,
+        'gc0_per_s': collections[0] / seconds,
+        'pool_misses_per_s': (pool.misses - misses_before) / seconds,
+        'speed': seconds / elapsed if elapsed else float('inf'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Capture path allocation benchmark')
+    parser.add_argument('--seconds', type=float, default=60.0, help='Seconds of simulated audio per path')
+    parser.add_argument('--chunk-size', type=int, default=1024, help='Capture frames per chunk')
+    parser.add_argument('--sample-rate', type=int, default=16000, help='PCM sample rate in Hz')
+    args = parser.parse_args()
+
+    print(f"{'path':>8} {'alloc KiB/s':>12} {'gc0/s':>7} {'pool miss/s':>12} {'speed':>10}")
+    for name, pooled in (('copying', False), ('pooled', True)):
+        result = run(pooled, args.seconds, args.chunk_size, args.sample_rate)
+        print(f"{name:>8} {result['alloc_kib_per_s']:>12.1f} {result['gc0_per_s']:>7.2f} "
+              f"{result['pool_misses_per_s']:>12.2f} {result['speed']:>9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+Server message handling throughput of TingwuSDK
+
+Run from the src directory:
+    python -m benchmarks.decode_rate [--messages 200000]
+
+Replays a synthetic result stream (partials with a SentenceEnd every 20
+messages, as the real-time service sends them) through three paths and
+reports messages per second:
+
+    legacy      json.loads, the old if/elif chain on namespace/name and an
+                f-string of the whole message for the debug log
+    decoder     decode_message + handler table with the standard json module
+    decoder+    the same with the fastest installed backend (orjson/ujson)
+
+Logging is raised to WARNING for the run, so any time spent formatting log
+messages that are never written shows up as lost throughput.
+"""
+
+import argparse
+import json
+import logging
+import time
+
+from core.tingwu_sdk import decoder
+from core.tingwu_sdk.ws import TingwuSDK
+from utils.logger import logger
+
+PARTIALS_PER_SENTENCE = 20
+TEXT = '今天下午三点在二号会议室讨论下个季度的预算安排'
+
+
+def build_messages(count: int):
+    """Return `count` JSON text frames shaped like the service's result events"""
+    messages = []
+    for i in range(count):
+        index = i // (PARTIALS_PER_SENTENCE + 1) + 1
+        step = i % (PARTIALS_PER_SENTENCE + 1)
+        name = 'SentenceEnd' if step == PARTIALS_PER_SENTENCE else 'TranscriptionResultChanged'
+        text = TEXT[:max(1, len(TEXT) * (step + 1) // (PARTIALS_PER_SENTENCE + 1))]
+        messages.append(json.dumps({
+            'header': {'namespace': 'SpeechTranscriber', 'name': name, 'status': 20000000,
+                       'message_id': f'{i:032x}', 'task_id': 'a' * 32, 'status_text': 'Gateway:SUCCESS:Success.'},
+            'payload': {'index': index, 'time': 1000 + step * 200, 'begin_time': 1000, 'result': text,
+                        'confidence': 0.9, 'words': [{'text': ch, 'startTime': 1000 + j * 40, 'endTime': 1040 + j * 40}
+                                                     for j, ch in enumerate(text)]},
+        }, ensure_ascii=False))
+    return messages
+
+
+def legacy_handle(message: str, on_result) -> None:
+    """The message path as it was before the decoder layer"""
+    data = json.loads(message)
+    logger.debug(f"Received message: {data}")
+    if 'header' in data:
+        header = data['header']
+        name = header.get('name', '')
+        namespace = header.get('namespace', '')
+        status = header.get('status', 0)
+        if namespace == 'SpeechTranscriber':
+            if name in ('TranscriptionStarted', 'StartTranscriptionResponse'):
+                pass
+            elif name == 'TranscriptionResultChanged' or name == 'SentenceEnd':
+                if 'payload' in data and 'result' in data['payload']:
+                    result = data['payload']['result']
+                    is_final = data['payload'].get('is_final', False)
+                    confidence = data['payload'].get('confidence', 0)
+                    if is_final:
+                        logger.info(f"Final result: {result} (confidence: {confidence})")
+                    else:
+                        logger.debug(f"Intermediate result: {result} (confidence: {confidence})")
+                    on_result(result, is_final, confidence)
+            elif name == 'TranscriptionCompleted':
+                pass
+            elif name == 'TaskFailed':
+                pass
+        else:
+            logger.debug(f"Received message from namespace {namespace}: {name}")
+
+
+def measure(handle, messages) -> float:
+    """Return messages per second for one handler"""
+    for message in messages[:1000]:
+        handle(message)
+    start = time.perf_counter()
+    for message in messages:
+        handle(message)
+    elapsed = time.perf_counter() - start
+    return len(messages) / elapsed if elapsed else float('inf')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Server message decode benchmark')
+    parser.add_argument('--messages', type=int, default=200000, help='Number of messages per path')
+    args = parser.parse_args()
+
+    messages = build_messages(args.messages)
+    logger.logger.setLevel(logging.WARNING)
+
+    sdk = TingwuSDK('benchmark', 'benchmark', 'benchmark')
+    sdk.on_result = lambda result, is_final, confidence: None
+    sdk_handle = lambda message: sdk._on_ws_message(None, message)
+
+    fastest = decoder.loads
+    paths = [('legacy', lambda message: legacy_handle(message, sdk.on_result), json.loads),
+             ('decoder', sdk_handle, json.loads)]
+    if decoder.JSON_BACKEND != 'json':
+        paths.append((f'decoder+{decoder.JSON_BACKEND}', sdk_handle, fastest))
+
+    print(f"{'path':>16} {'msg/s':>10} {'us/msg':>8}")
+    for name, handle, loads in paths:
+        decoder.loads = loads
+        rate = measure(handle, messages)
+        print(f"{name:>16} {rate:>10.0f} {1e6 / rate:>8.2f}")
+    decoder.loads = fastest
+
+
+if __name__ == "__main__":
+    main()
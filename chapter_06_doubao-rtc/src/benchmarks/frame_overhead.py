@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+Upstream frame size trade-off: per-frame wire overhead vs. buffering latency
+
+Run from the src directory:
+    python -m benchmarks.frame_overhead [--sample-rate 16000]
+
+For each frame duration the table shows the PCM payload, the bytes added by
+WebSocket/TLS/TCP/IP framing, the resulting uplink bitrate and the minimum
+delay a frame adds before its first sample can leave the machine. The last
+section times AudioFramer itself on 1024-frame capture chunks.
+"""
+
+import argparse
+import os
+import time
+
+from core.framer import AudioFramer, frame_bytes_for
+
+FRAME_SIZES_MS = (10, 20, 30, 40, 60, 80, 100, 120, 160, 200)
+
+TLS_RECORD_OVERHEAD = 5 + 8 + 16   # header + explicit nonce + GCM tag
+TCP_IP_OVERHEAD = 20 + 20 + 12     # IPv4 + TCP + timestamps option
+TCP_MSS = 1448
+
+
+def ws_header_bytes(payload: int) -> int:
+    """Client-to-server WebSocket header size (always masked)"""
+    if payload < 126:
+        return 2 + 4
+    if payload < 65536:
+        return 4 + 4
+    return 10 + 4
+
+
+def wire_overhead_bytes(payload: int) -> int:
+    """Bytes added to one binary WebSocket message on its way to the wire"""
+    record = payload + ws_header_bytes(payload) + TLS_RECORD_OVERHEAD
+    segments = -(-record // TCP_MSS)
+    return record - payload + segments * TCP_IP_OVERHEAD
+
+
+def bench_framer(frame_ms: int, sample_rate: int, seconds: float = 60.0) -> float:
+    """Return framer throughput as a multiple of real time"""
+    framer = AudioFramer(frame_ms=frame_ms, sample_rate=sample_rate)
+    framer.set_audio_callback(lambda frame: None)
+    chunk = os.urandom(1024 * 2)
+    chunks = int(seconds * sample_rate / 1024)
+    start = time.perf_counter()
+    for _ in range(chunks):
+        framer.process(chunk)
+    elapsed = time.perf_counter() - start
+    return seconds / elapsed if elapsed else float('inf')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Upstream audio frame size benchmark')
+    parser.add_argument('--sample-rate', type=int, default=16000, help='PCM sample rate in Hz')
+    args = parser.parse_args()
+
+    print(f"{'frame':>6} {'payload':>8} {'overhead':>9} {'ovh %':>6} {'msg/s':>6} {'wire kbit/s':>12} {'buffering':>10}")
+    for frame_ms in FRAME_SIZES_MS:
+        payload = frame_bytes_for(frame_ms, args.sample_rate)
+        overhead = wire_overhead_bytes(payload)
+        per_second = 1000 / frame_ms
+        kbps = (payload + overhead) * per_second * 8 / 1000
+        print(f"{frame_ms:>4}ms {payload:>8} {overhead:>9} {100 * overhead / payload:>5.1f}% {per_second:>6.1f} {kbps:>12.1f} {frame_ms:>8}ms")
+
+    print("\nAudioFramer throughput (1024-frame capture chunks):")
+    for frame_ms in FRAME_SIZES_MS:
+        print(f"{frame_ms:>4}ms  {bench_framer(frame_ms, args.sample_rate):>10.0f}x real time")
+
+
+if __name__ == "__main__":
+    main()
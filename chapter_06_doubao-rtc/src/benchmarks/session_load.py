@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+Concurrent session load against the local Tingwu emulator
+
+Run from the src directory:
+    python -m benchmarks.session_load [--sessions 50] [--seconds 20]
+
+Starts a TingwuEmulator in-process (or uses --endpoint to reach one started
+with `python -m core.tingwu_sdk.emulator` in another process, which keeps
+its CPU out of this one), opens N SessionManager sessions and streams
+real-time paced PCM into all of them from one thread, as N capture
+callbacks would. Reported:
+
+    start       time for create_task + connect of all sessions
+    finals      final results received, and sessions that lost their connection
+    latency     from the send time of the audio that ends a sentence to its
+                final result in the callback (emulated server latency included;
+                the schedule is known, so no timestamps travel on the wire)
+    cpu         process CPU time per second of streamed session audio
+
+Fault options (--jitter-ms, --loss-rate, --disconnect-after, --fail-rate) are
+passed to the in-process emulator; an external one has to be started with the
+same --sentence-ms/--gap-ms for the latency figures to be right.
+"""
+
+import argparse
+import threading
+import time
+
+from core.quantile import QuantileSketch
+from core.tingwu_sdk.emulator import TingwuEmulator
+from core.tingwu_sdk.session_manager import SessionManager
+
+SAMPLE_RATE = 16000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent session load against the Tingwu emulator')
+    parser.add_argument('--sessions', type=int, default=50, help='Concurrent sessions')
+    parser.add_argument('--seconds', type=float, default=20.0, help='Audio streamed per session')
+    parser.add_argument('--frame-ms', type=int, default=40, help='Upstream frame duration')
+    parser.add_argument('--endpoint', default=None, help='Control-plane endpoint of an external emulator')
+    parser.add_argument('--sentence-ms', type=float, default=3000.0, help='Audio per emulated sentence')
+    parser.add_argument('--gap-ms', type=float, default=500.0, help='Audio between emulated sentences')
+    parser.add_argument('--latency-ms', type=float, default=150.0, help='Emulated server latency')
+    parser.add_argument('--jitter-ms', type=float, default=30.0, help='+/- variation of the server latency')
+    parser.add_argument('--loss-rate', type=float, default=0.0, help='Probability a message needs a retransmission')
+    parser.add_argument('--disconnect-after', type=float, default=None, help='Drop sessions after this many seconds')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='Probability a session start fails with TaskFailed')
+    args = parser.parse_args()
+
+    emulator = None
+    endpoint = args.endpoint
+    if endpoint is None:
+        emulator = TingwuEmulator(http_port=0, ws_port=0, sentence_ms=args.sentence_ms, gap_ms=args.gap_ms,
+                                  latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, loss_rate=args.loss_rate,
+                                  disconnect_after_s=args.disconnect_after, fail_rate=args.fail_rate).start()
+        endpoint = emulator.endpoint
+
+    sentence_period_ms = args.sentence_ms + args.gap_ms
+    frame = bytes(SAMPLE_RATE * args.frame_ms // 1000 * 2)
+    latency = QuantileSketch()
+    lock = threading.Lock()
+    finals = {}
+    lost = set()
+    stream_start = [0.0]
+    streaming = threading.Event()
+
+    def on_result(session_id, text, is_final, confidence):
+        if not is_final or not stream_start[0]:
+            return
+        arrived = time.time()
+        count = finals[session_id] = finals.get(session_id, 0) + 1
+        # Sentence `count` ends at this service offset; a silence frame precedes our audio
+        end_ms = count * sentence_period_ms
+        if end_ms <= args.seconds * 1000.0:
+            sent_at = stream_start[0] + (end_ms - args.frame_ms) / 1000.0
+            with lock:
+                latency.observe((arrived - sent_at) * 1000.0)
+
+    manager = SessionManager('emulator', 'emulator', 'emulator', frame_ms=args.frame_ms, endpoint=endpoint)
+    def on_connection_close(session_id):
+        if streaming.is_set():
+            lost.add(session_id)
+
+    manager.set_callbacks(on_result=on_result, on_connection_close=on_connection_close)
+    session_ids = [f's{i:03d}' for i in range(args.sessions)]
+    for session_id in session_ids:
+        manager.add_session(session_id, sample_rate=SAMPLE_RATE)
+
+    start = time.perf_counter()
+    started = manager.start_sessions(session_ids)
+    start_seconds = time.perf_counter() - start
+    print(f"start: {len(started)}/{args.sessions} sessions in {start_seconds:.2f} s")
+
+    frames = int(args.seconds * 1000 / args.frame_ms)
+    cpu_start = time.process_time()
+    stream_start[0] = time.time()
+    streaming.set()
+    late_ticks = 0
+    for tick in range(1, frames + 1):
+        # Frame tick-1 becomes available once it has been "captured"
+        delay = stream_start[0] + tick * args.frame_ms / 1000.0 - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            late_ticks += 1
+        for session_id in started:
+            manager.send_audio_data(session_id, frame)
+    time.sleep((args.latency_ms + args.jitter_ms) / 1000.0 + 0.5)
+    cpu = time.process_time() - cpu_start
+    streaming.clear()
+    manager.close()
+
+    snapshot = latency.snapshot()
+    print(f"finals: {sum(finals.values())} from {len(finals)} sessions, connections lost: {len(lost)}, "
+          f"late ticks: {late_ticks}/{frames}")
+    print(f"latency ms: p50={snapshot['p50']:.1f} p95={snapshot['p95']:.1f} p99={snapshot['p99']:.1f} "
+          f"max={snapshot['max']:.1f} (n={snapshot['count']})")
+    audio_seconds = len(started) * args.seconds
+    if audio_seconds:
+        print(f"cpu: {cpu:.2f} s for {audio_seconds:.0f} s of session audio ({cpu / audio_seconds * 1000:.2f} ms/s)")
+    control = manager.get_control_stats()
+    create = control['operations_ms'].get('CreateTask', {})
+    print(f"control plane: CreateTask mean={create.get('mean', 0.0):.1f} ms, connections opened={control['connections_opened']}")
+    if emulator is not None:
+        print(f"emulator: {emulator.get_stats()}")
+        emulator.stop()
+
+
+if __name__ == "__main__":
+    main()
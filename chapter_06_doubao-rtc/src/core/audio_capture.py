@@ -2,13 +2,50 @@
 # coding=utf-8
 
 import pyaudio
+import queue
 import threading
 import time
-from typing import Callable
+from typing import Dict, Optional, Union
 
+from core.audio_source import AudioSource
+from core.buffer_pool import BufferPool
+from core.metrics import CaptureMetrics, Histogram
+from core.resampler import PolyphaseResampler
+from core.ring_buffer import PCMRingBuffer
+from core.tracing import tracer
 from utils.logger import logger
 
-class AudioCapture:
+# Capture engines
+MODE_BLOCKING = 'blocking'  # a Python thread polls stream.read()
+MODE_CALLBACK = 'callback'  # PortAudio pushes frames through stream_callback
+
+def find_input_device(p: pyaudio.PyAudio, device: Union[int, str, None] = None) -> Dict:
+    """
+    Look up an input device by index or by (partial, case-insensitive) name
+    
+    Args:
+        p: PyAudio instance
+        device: Device index, part of the device name, or None for the default
+        
+    Returns:
+        PyAudio device info dictionary
+    """
+    if device is None:
+        return p.get_default_input_device_info()
+    if isinstance(device, int):
+        info = p.get_device_info_by_index(device)
+        if info['maxInputChannels'] < 1:
+            raise ValueError(f"Audio device {device} ({info['name']}) has no input channels")
+        return info
+    
+    wanted = device.lower()
+    for index in range(p.get_device_count()):
+        info = p.get_device_info_by_index(index)
+        if info['maxInputChannels'] > 0 and wanted in info['name'].lower():
+            return info
+    raise ValueError(f"No audio input device matching '{device}'")
+
+class AudioCapture(AudioSource):
     """
     Audio capture module for recording microphone input
     """
@@ -16,7 +53,14 @@ class AudioCapture:
                  format: int = pyaudio.paInt16,
                  channels: int = 1,
                  rate: int = 16000,
-                 chunk_size: int = 1024):
+                 chunk_size: int = 1024,
+                 buffer_seconds: float = 0.0,
+                 mode: str = MODE_BLOCKING,
+                 queue_chunks: int = 32,
+                 native_format: bool = False,
+                 device: Union[int, str, None] = None,
+                 pyaudio_instance: Optional[pyaudio.PyAudio] = None,
+                 shared_queue: Optional[queue.Queue] = None):
         """
         Initialize audio capture with the specified parameters
         
@@ -25,31 +69,79 @@ class AudioCapture:
             channels: Number of audio channels (default: 1 - mono)
             rate: Sampling rate in Hz (default: 16000)
             chunk_size: Number of frames per buffer (default: 1024)
+            buffer_seconds: Size of the ring buffer between capture and the audio
+                callback. 0 calls the callback directly from the capture thread.
+            mode: 'blocking' to poll the stream from a thread (fallback) or
+                'callback' to let PortAudio push frames via stream_callback
+            queue_chunks: Capacity of the frame queue used in callback mode when
+                no ring buffer is configured
+            native_format: Open the device at its default rate and channel count
+                and convert to `rate` Hz mono in software
+            device: Input device index or name; None uses the default device
+            pyaudio_instance: PyAudio instance to share with other captures; it
+                is left running on stop()
+            shared_queue: Callback mode only: put (capture, data) items on this
+                queue instead of starting a dispatch thread per capture. The
+                owner drains it and calls capture.dispatch(data).
         """
+        if mode not in (MODE_BLOCKING, MODE_CALLBACK):
+            raise ValueError(f"Unknown capture mode: {mode}")
+        
         self.format = format
         self.channels = channels
         self.rate = rate
         self.chunk_size = chunk_size
+        self.mode = mode
+        self.buffer_seconds = buffer_seconds
+        self.native_format = native_format
+        self.device = device
+        self.device_name = None
+        
+        # Format actually requested from the device; differs from the output
+        # format only in native mode, where the resampler bridges the two
+        self.capture_rate = rate
+        self.capture_channels = channels
+        self.capture_chunk_size = chunk_size
+        self.resampler = None
         
+        self._shared_pyaudio = pyaudio_instance
         self.p = None
         self.stream = None
         self.is_recording = False
         self.recording_thread = None
+        self.sender_thread = None
+        self.dispatch_thread = None
         
         # Callback for audio data
         self.on_audio_data = None
         
-        logger.info(f"AudioCapture initialized with rate={rate}Hz, channels={channels}, format={format}, chunk_size={chunk_size}")
-    
-    def set_audio_callback(self, callback: Callable[[bytes], None]) -> None:
-        """
-        Set callback for audio data
+        # 环形缓冲区：采集线程只负责写入，由独立的发送线程调用回调
+        self.ring_buffer = None
+        self.buffer_pool = None
+        if (buffer_seconds > 0 or native_format) and format != pyaudio.paInt16:
+            raise ValueError("Ring buffer and native format require 16-bit PCM (pyaudio.paInt16)")
+        if buffer_seconds > 0:
+            self.ring_buffer = PCMRingBuffer(int(rate * buffer_seconds), channels)
         
-        Args:
-            callback: Function to call with audio data
-        """
-        self.on_audio_data = callback
-        logger.debug("Audio callback set")
+        # 回调模式下没有环形缓冲区时，使用预分配大小的队列把帧交给分发线程
+        self._frame_queue = None
+        self._shared_queue = None
+        self.queue_drops = 0
+        if mode == MODE_CALLBACK and self.ring_buffer is None:
+            if shared_queue is not None:
+                self._shared_queue = shared_queue
+            else:
+                self._frame_queue = queue.Queue(maxsize=queue_chunks)
+        
+        # Deviation of each read/callback interval from the nominal chunk period
+        self.jitter_histogram = Histogram()
+        self._last_chunk_time = None
+        self._overflow_frames = 0
+        
+        # 采集链路健康指标：溢出次数、读间隔分布、回调耗时、缓冲区水位
+        self.metrics = CaptureMetrics()
+        
+        logger.info(f"AudioCapture initialized with rate={rate}Hz, channels={channels}, format={format}, chunk_size={chunk_size}, buffer_seconds={buffer_seconds}, mode={mode}, native_format={native_format}")
     
     def _audio_callback(self, in_data, frame_count, time_info, status) -> tuple:
         """
@@ -64,10 +156,152 @@ class AudioCapture:
         Returns:
             Tuple of (None, flag) where flag indicates stream should continue
         """
-        if self.is_recording and self.on_audio_data:
-            self.on_audio_data(in_data)
+        if status & pyaudio.paInputOverflow:
+            self.metrics.input_overflows += 1
+        self._record_jitter(frame_count)
+        if self.is_recording:
+            # Runs on the PortAudio thread: only hand the frame off, never call out
+            try:
+                if self.ring_buffer is not None:
+                    self.ring_buffer.write(in_data)
+                elif self._shared_queue is not None:
+                    self._shared_queue.put_nowait((self, in_data))
+                else:
+                    self._frame_queue.put_nowait(in_data)
+            except queue.Full:
+                self.queue_drops += 1
         return (None, pyaudio.paContinue)
     
+    def _record_jitter(self, frame_count: int) -> None:
+        """
+        Record the interval since the previous chunk and how far it deviates
+        from the nominal chunk period
+        
+        Args:
+            frame_count: Number of frames in the current chunk
+        """
+        now = time.perf_counter()
+        self.metrics.chunks_captured += 1
+        self.metrics.frames_captured += frame_count
+        if self._last_chunk_time is not None:
+            interval = now - self._last_chunk_time
+            self.metrics.interval_histogram.observe(interval * 1000)
+            self.jitter_histogram.observe(abs(interval - frame_count / self.capture_rate) * 1000)
+        self._last_chunk_time = now
+    
+    def _deliver(self, data: bytes) -> None:
+        """
+        Hand captured audio to the consumer
+        
+        With a ring buffer the samples are only copied in and the sender thread
+        invokes the callback; otherwise the callback runs on the capture thread.
+        
+        Args:
+            data: Captured audio data
+        """
+        if self.ring_buffer is not None:
+            self.ring_buffer.write(data)
+        else:
+            self._emit(data)
+    
+    def _emit(self, data: bytes) -> None:
+        """
+        Convert captured audio to the output format and invoke the audio callback
+        
+        The data may be a pooled buffer that is reused once the callback returns;
+        consumers that keep audio beyond the call must copy it.
+        
+        Args:
+            data: Audio data in the device capture format
+        """
+        if self.resampler is not None:
+            data = self.resampler.process(data)
+            if not data:
+                return
+        if self.on_audio_data:
+            start = time.perf_counter()
+            self.on_audio_data(data)
+            elapsed = time.perf_counter() - start
+            self.metrics.callback_histogram.observe(elapsed * 1000)
+            if tracer.enabled:
+                # VAD, framing, encoding and enqueueing for upstream
+                tracer.complete('capture', 'capture', start * 1e6, elapsed * 1e6, {'bytes': len(data)})
+    
+    def _record_fill(self, fill: int) -> None:
+        """
+        Track the peak fill level seen by the consumer
+        
+        Args:
+            fill: Current number of buffered samples (ring) or chunks (queue)
+        """
+        if fill > self.metrics.peak_fill:
+            self.metrics.peak_fill = fill
+    
+    def dispatch(self, data: bytes) -> None:
+        """
+        Deliver a frame taken from the shared queue on the owner's thread
+        
+        Args:
+            data: Audio data in the device capture format
+        """
+        self._emit(data)
+    
+    def _sender_thread_func(self) -> None:
+        """Sender thread function that drains the ring buffer into the audio callback"""
+        logger.info("Sender thread started")
+        chunk_samples = self.capture_chunk_size * self.capture_channels
+        # Wait up to a few chunk periods before counting an underrun
+        timeout = max(4 * self.capture_chunk_size / self.capture_rate, 0.1)
+        
+        # Chunks are read into pooled buffers and handed on as memoryviews, so
+        # the steady state allocates no audio buffers from here to the sink
+        if self.buffer_pool is None or self.buffer_pool.buffer_size != chunk_samples * 2:
+            self.buffer_pool = BufferPool(chunk_samples * 2, count=2)
+        
+        try:
+            while self.is_recording:
+                self._record_fill(self.ring_buffer.available())
+                buffer = self.buffer_pool.acquire()
+                try:
+                    if self.ring_buffer.read_into(buffer.samples, timeout=timeout):
+                        self._emit(buffer.view)
+                finally:
+                    buffer.release()
+            
+            # Flush whatever was captured before stop()
+            tail = self.ring_buffer.read_available()
+            if tail:
+                self._emit(tail)
+        except Exception as e:
+            logger.error(f"Error in sender thread: {str(e)}")
+        
+        logger.info("Sender thread stopped")
+    
+    def _dispatch_thread_func(self) -> None:
+        """Dispatch thread function that drains the callback-mode frame queue"""
+        logger.info("Dispatch thread started")
+        
+        try:
+            while self.is_recording:
+                try:
+                    data = self._frame_queue.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                self._record_fill(self._frame_queue.qsize() + 1)
+                self._emit(data)
+            
+            # Flush frames queued before stop()
+            while True:
+                try:
+                    data = self._frame_queue.get_nowait()
+                except queue.Empty:
+                    break
+                self._emit(data)
+        except Exception as e:
+            logger.error(f"Error in dispatch thread: {str(e)}")
+        
+        logger.info("Dispatch thread stopped")
+    
     def _recording_thread_func(self) -> None:
         """Recording thread function that reads from the audio stream"""
         logger.info("Recording thread started")
@@ -75,9 +309,15 @@ class AudioCapture:
         try:
             while self.is_recording:
                 if self.stream:
-                    data = self.stream.read(self.chunk_size, exception_on_overflow=False)
-                    if self.is_recording and self.on_audio_data:
-                        self.on_audio_data(data)
+                    # PyAudio discards the whole chunk when it raises on an overflow, so
+                    # overflows are estimated from the backlog instead: a read that finds
+                    # the device buffer full has (almost certainly) lost input
+                    if self.stream.get_read_available() >= self._overflow_frames:
+                        self.metrics.input_overflows += 1
+                    data = self.stream.read(self.capture_chunk_size, exception_on_overflow=False)
+                    self._record_jitter(self.capture_chunk_size)
+                    if self.is_recording:
+                        self._deliver(data)
                 time.sleep(0.001)  # Small sleep to prevent CPU overuse
         except Exception as e:
             logger.error(f"Error in recording thread: {str(e)}")
@@ -85,6 +325,27 @@ class AudioCapture:
             
         logger.info("Recording thread stopped")
     
+    def _configure_native_format(self, info: Dict) -> None:
+        """
+        Capture at the device's own rate and channel count and resample in software
+        
+        Args:
+            info: PyAudio device info of the input device
+        """
+        self.capture_rate = int(info['defaultSampleRate'])
+        self.capture_channels = max(1, int(info['maxInputChannels']))
+        # Keep the chunk duration the same as requested at the output rate
+        self.capture_chunk_size = max(1, round(self.chunk_size * self.capture_rate / self.rate))
+        logger.info(f"Native capture format: rate={self.capture_rate}Hz, channels={self.capture_channels}, chunk_size={self.capture_chunk_size}")
+        
+        if self.capture_rate != self.rate or self.capture_channels != 1:
+            self.resampler = PolyphaseResampler(self.capture_rate, self.rate, self.capture_channels)
+        else:
+            self.resampler = None
+        
+        if self.buffer_seconds > 0:
+            self.ring_buffer = PCMRingBuffer(int(self.capture_rate * self.buffer_seconds), self.capture_channels)
+    
     def start(self) -> None:
         """Start audio capture from microphone"""
         if self.is_recording:
@@ -94,27 +355,51 @@ class AudioCapture:
         logger.info("Starting audio capture")
         
         try:
-            self.p = pyaudio.PyAudio()
+            self.p = self._shared_pyaudio or pyaudio.PyAudio()
             
             # Get device info
-            info = self.p.get_default_input_device_info()
+            info = find_input_device(self.p, self.device)
+            self.device_name = info['name']
             logger.info(f"Using audio input device: {info['name']}")
             
-            # Open stream
+            if self.native_format:
+                self._configure_native_format(info)
+            
+            self._last_chunk_time = None
+            self.is_recording = True
+            
+            # Open stream; in callback mode PortAudio starts calling immediately
             self.stream = self.p.open(
                 format=self.format,
-                channels=self.channels,
-                rate=self.rate,
+                channels=self.capture_channels,
+                rate=self.capture_rate,
                 input=True,
-                frames_per_buffer=self.chunk_size,
+                input_device_index=int(info['index']),
+                frames_per_buffer=self.capture_chunk_size,
+                stream_callback=self._audio_callback if self.mode == MODE_CALLBACK else None,
             )
             
-            self.is_recording = True
+            # Blocking reads: backlog at which the device buffer counts as full
+            # (at least two chunks, so a read that is merely one chunk late is not counted)
+            self._overflow_frames = max(2 * self.capture_chunk_size,
+                                        int(self.stream.get_input_latency() * self.capture_rate))
+            
+            # Start sender thread before capture so no audio piles up unread
+            if self.ring_buffer is not None:
+                self.sender_thread = threading.Thread(target=self._sender_thread_func)
+                self.sender_thread.daemon = True
+                self.sender_thread.start()
             
-            # Start recording thread
-            self.recording_thread = threading.Thread(target=self._recording_thread_func)
-            self.recording_thread.daemon = True
-            self.recording_thread.start()
+            if self.mode == MODE_CALLBACK:
+                if self._frame_queue is not None:
+                    self.dispatch_thread = threading.Thread(target=self._dispatch_thread_func)
+                    self.dispatch_thread.daemon = True
+                    self.dispatch_thread.start()
+            else:
+                # Start recording thread
+                self.recording_thread = threading.Thread(target=self._recording_thread_func)
+                self.recording_thread.daemon = True
+                self.recording_thread.start()
             
             logger.info("Audio capture started")
             
@@ -136,6 +421,16 @@ class AudioCapture:
             self.recording_thread.join(timeout=2.0)
             self.recording_thread = None
         
+        # Stop sender after capture so the buffered tail is flushed
+        if self.sender_thread:
+            self.ring_buffer.interrupt()
+            self.sender_thread.join(timeout=2.0)
+            self.sender_thread = None
+        
+        if self.dispatch_thread:
+            self.dispatch_thread.join(timeout=2.0)
+            self.dispatch_thread = None
+        
         # Close stream
         if self.stream:
             self.stream.stop_stream()
@@ -144,7 +439,59 @@ class AudioCapture:
             
         # Terminate PyAudio
         if self.p:
-            self.p.terminate()
+            if self.p is not self._shared_pyaudio:
+                self.p.terminate()
             self.p = None
             
         logger.info("Audio capture stopped")
+    
+    def get_buffer_stats(self) -> Optional[Dict]:
+        """
+        Get ring buffer counters
+        
+        Returns:
+            Dictionary with fill level, overrun and underrun counters, or None
+            when capture runs without a ring buffer
+        """
+        if self.ring_buffer is None:
+            return None
+        return self.ring_buffer.get_stats()
+    
+    def get_jitter_stats(self) -> Dict:
+        """
+        Get the per-chunk timing jitter histogram
+        
+        Returns:
+            Histogram snapshot in milliseconds, tagged with the capture mode
+        """
+        stats = self.jitter_histogram.snapshot()
+        stats['mode'] = self.mode
+        stats['queue_drops'] = self.queue_drops
+        return stats
+    
+    def get_metrics(self) -> Dict:
+        """
+        Get capture-path health metrics
+        
+        Returns:
+            Dictionary with frames captured, input overflows (flagged by the
+            device in callback mode, estimated from the read backlog in
+            blocking mode), read-to-read interval and on_audio_data time
+            histograms (ms), queue drops and the current/peak buffer fill level
+        """
+        stats = self.metrics.snapshot()
+        stats['mode'] = self.mode
+        stats['queue_drops'] = self.queue_drops
+        if self.buffer_pool is not None:
+            stats['pool'] = self.buffer_pool.get_stats()
+        if self.ring_buffer is not None:
+            stats['buffer'] = self.ring_buffer.get_stats()
+            stats['fill'] = self.ring_buffer.available()
+            stats['capacity'] = self.ring_buffer.capacity
+        elif self._frame_queue is not None:
+            stats['fill'] = self._frame_queue.qsize()
+            stats['capacity'] = self._frame_queue.maxsize
+        else:
+            stats['fill'] = 0
+            stats['capacity'] = 0
+        return stats
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+import math
+import time
+from typing import Optional
+
+import numpy as np
+
+
+class AudioOffsetClock:
+    """
+    Send time of each position on the upstream audio timeline
+
+    Offsets are milliseconds of audio since the first frame sent on the
+    connection, the timeline the service uses for begin_time/time in its
+    results. The most recent window_ms is kept at resolution_ms granularity
+    in a preallocated ring, so memory stays fixed however long a session runs.
+    """
+    def __init__(self, window_ms: int = 120000, resolution_ms: int = 10):
+        """
+        Preallocate the ring
+
+        Args:
+            window_ms: Amount of audio whose send time is remembered
+            resolution_ms: Granularity of the lookup
+        """
+        if resolution_ms <= 0 or window_ms < resolution_ms:
+            raise ValueError("window_ms must be at least resolution_ms, which must be positive")
+
+        self.resolution_ms = resolution_ms
+        self.capacity = window_ms // resolution_ms  # in slots
+        self._times = np.zeros(self.capacity, dtype=np.float64)
+        self.end_ms = 0.0  # offset one past the newest audio sent
+
+    def _first_slot(self) -> int:
+        """Oldest slot still held"""
+        return max(0, math.ceil(self.end_ms / self.resolution_ms) - self.capacity)
+
+    def advance(self, duration_ms: float, sent_at: Optional[float] = None) -> None:
+        """
+        Record that the next `duration_ms` of audio went out
+
+        Each slot is stamped with the send time of the frame holding its
+        first sample, so a lookup is off by less than one slot.
+
+        Args:
+            duration_ms: Duration of the audio sent
+            sent_at: Send time in seconds (default: time.time())
+        """
+        sent_at = time.time() if sent_at is None else sent_at
+        first = math.ceil(self.end_ms / self.resolution_ms)
+        self.end_ms += duration_ms
+        last = math.ceil(self.end_ms / self.resolution_ms)  # one past the last slot started
+        first = max(first, last - self.capacity)
+        if first >= last:
+            return
+
+        start = first % self.capacity
+        count = last - first
+        head = min(count, self.capacity - start)
+        self._times[start:start + head] = sent_at
+        if head < count:
+            self._times[:count - head] = sent_at
+
+    def lookup(self, offset_ms: float) -> Optional[float]:
+        """
+        Send time of the audio at an offset
+
+        Args:
+            offset_ms: Offset on the connection's audio timeline
+
+        Returns:
+            Send time in seconds, or None if the offset was not sent yet or
+            has left the window
+        """
+        if offset_ms < 0 or offset_ms >= self.end_ms:
+            return None
+        slot = int(offset_ms // self.resolution_ms)
+        if slot < self._first_slot():
+            return None
+        return float(self._times[slot % self.capacity])
+
+    def reset(self) -> None:
+        """Restart the timeline at offset zero (new connection)"""
+        self.end_ms = 0.0
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+import mmap
+import struct
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Optional
+
+from core.resampler import PolyphaseResampler
+from utils.logger import logger
+
+
+class AudioSource(ABC):
+    """
+    Interface shared by every audio producer that feeds the SDKs
+
+    A source pushes 16-bit PCM chunks to the callback registered with
+    set_audio_callback() between start() and stop(); `is_recording` turns
+    False once it has stopped, whether by stop() or by running out of audio.
+    """
+    rate: int = 16000
+    channels: int = 1
+    is_recording: bool = False
+    on_audio_data: Optional[Callable] = None
+
+    def set_audio_callback(self, callback: Callable[[bytes], None]) -> None:
+        """
+        Set callback for audio data
+
+        Args:
+            callback: Function to call with audio data
+        """
+        self.on_audio_data = callback
+        logger.debug("Audio callback set")
+
+    @abstractmethod
+    def start(self) -> None:
+        """Start producing audio"""
+
+    @abstractmethod
+    def stop(self) -> None:
+        """Stop producing audio"""
+
+
+class FileAudioSource(AudioSource):
+    """
+    Replays a WAV or raw PCM file through the AudioSource contract
+
+    The file is memory-mapped and chunks are handed out as zero-copy memoryview
+    slices, either at wall-clock pace (to emulate a microphone) or as fast as
+    the consumer accepts them (batch jobs and benchmarks).
+    """
+    def __init__(self,
+                 path: str,
+                 chunk_size: int = 1024,
+                 realtime: bool = True,
+                 rate: int = 16000,
+                 channels: int = 1,
+                 target_rate: Optional[int] = None):
+        """
+        Initialize the file source
+
+        Args:
+            path: Path to a 16-bit PCM WAV file or a headerless .pcm file
+            chunk_size: Number of frames per chunk
+            realtime: Pace chunks at the audio's own rate; False replays as fast
+                as possible
+            rate: Sample rate of headerless PCM (WAV files carry their own)
+            channels: Channel count of headerless PCM (WAV files carry their own)
+            target_rate: If set, resample and downmix to this rate in mono
+        """
+        self.path = path
+        self.chunk_size = chunk_size
+        self.realtime = realtime
+        self.is_recording = False
+        self.on_audio_data = None
+
+        self._file = None
+        self._mmap = None
+        self._thread = None
+        self._finished = threading.Event()
+
+        self.rate, self.channels, self._data_offset, self._data_size = self._probe(path, rate, channels)
+        self.resampler = None
+        if target_rate and (target_rate != self.rate or self.channels != 1):
+            self.resampler = PolyphaseResampler(self.rate, target_rate, self.channels)
+
+        logger.info(f"FileAudioSource initialized with path={path}, rate={self.rate}Hz, channels={self.channels}, realtime={realtime}")
+
+    @staticmethod
+    def _probe(path: str, rate: int, channels: int) -> tuple:
+        """
+        Read the format and data chunk location of a WAV file
+
+        Returns:
+            Tuple of (rate, channels, data_offset, data_size); headerless files
+            use the given rate/channels and the whole file as data
+        """
+        with open(path, 'rb') as f:
+            header = f.read(12)
+            f.seek(0, 2)
+            file_size = f.tell()
+            if len(header) < 12 or header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+                return rate, channels, 0, file_size
+
+            offset = 12
+            fmt = None
+            while offset + 8 <= file_size:
+                f.seek(offset)
+                chunk_id, chunk_size = struct.unpack('<4sI', f.read(8))
+                if chunk_id == b'fmt ':
+                    fmt = struct.unpack('<HHIIHH', f.read(16))
+                elif chunk_id == b'data':
+                    if fmt is None:
+                        break
+                    audio_format, channels, rate, _, _, bits = fmt
+                    if audio_format != 1 or bits != 16:
+                        raise ValueError(f"Only 16-bit PCM WAV is supported: {path}")
+                    return rate, channels, offset + 8, min(chunk_size, file_size - offset - 8)
+                offset += 8 + chunk_size + (chunk_size & 1)
+        raise ValueError(f"Malformed WAV file: {path}")
+
+    def start(self) -> None:
+        """Start replaying the file"""
+        if self.is_recording:
+            logger.warning("Already replaying")
+            return
+
+        self._file = open(self.path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._finished.clear()
+        self.is_recording = True
+
+        self._thread = threading.Thread(target=self._replay_thread_func)
+        self._thread.daemon = True
+        self._thread.start()
+        logger.info(f"File replay started: {self.path}")
+
+    def _replay_thread_func(self) -> None:
+        """Replay thread function that slices the mapped file into chunks"""
+        data = memoryview(self._mmap)[self._data_offset:self._data_offset + self._data_size]
+        chunk_bytes = self.chunk_size * self.channels * 2
+        chunk_seconds = self.chunk_size / self.rate
+        next_time = time.monotonic()
+
+        try:
+            for pos in range(0, len(data), chunk_bytes):
+                if not self.is_recording:
+                    break
+                if self.realtime:
+                    delay = next_time - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    next_time += chunk_seconds
+
+                chunk = data[pos:pos + chunk_bytes]
+                if self.resampler is not None:
+                    chunk = self.resampler.process(chunk)
+                if self.on_audio_data and len(chunk):
+                    self.on_audio_data(chunk)
+        except Exception as e:
+            logger.error(f"Error in file replay thread: {str(e)}")
+        finally:
+            data.release()
+            self.is_recording = False
+            self._finished.set()
+            logger.info("File replay finished")
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until the whole file has been replayed or stop() was called
+
+        Args:
+            timeout: Maximum seconds to wait
+
+        Returns:
+            True if replay finished within the timeout
+        """
+        return self._finished.wait(timeout)
+
+    def stop(self) -> None:
+        """Stop replaying and release the mapping"""
+        self.is_recording = False
+        if self._thread:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # A consumer still holds a chunk view; the mapping is freed with it
+                logger.debug("Audio chunks still referenced, leaving mmap to be collected")
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
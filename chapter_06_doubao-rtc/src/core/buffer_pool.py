@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+from collections import deque
+from typing import Dict
+
+import numpy as np
+
+
+class PooledBuffer:
+    """
+    Reusable PCM buffer exposed as a bytearray, a memoryview and an int16 view
+
+    All three views share the same memory, so stages can switch between byte
+    and sample access without copying. Return the buffer with release() once
+    the last consumer is done with it.
+    """
+    __slots__ = ('pool', 'data', 'view', 'samples')
+
+    def __init__(self, pool: 'BufferPool', size: int):
+        self.pool = pool
+        self.data = bytearray(size)
+        self.view = memoryview(self.data)
+        self.samples = np.frombuffer(self.data, dtype=np.int16)
+
+    def release(self) -> None:
+        """Return the buffer to its pool"""
+        self.pool.release(self)
+
+
+class BufferPool:
+    """
+    Fixed-size pool of preallocated PCM buffers
+
+    acquire() and release() only move buffers between a free list and the
+    caller, so a steady-state pipeline allocates no new audio buffers. When the
+    pool runs dry a new buffer is created and counted as a miss.
+    """
+    def __init__(self, buffer_size: int, count: int = 8):
+        """
+        Preallocate the pool
+
+        Args:
+            buffer_size: Size of every buffer in bytes
+            count: Number of buffers to allocate up front
+        """
+        self.buffer_size = buffer_size
+        self._free = deque(PooledBuffer(self, buffer_size) for _ in range(count))
+        self.allocated = count
+        self.misses = 0
+
+    def acquire(self) -> PooledBuffer:
+        """
+        Take a buffer from the pool
+
+        Returns:
+            A buffer of buffer_size bytes; its previous contents are undefined
+        """
+        try:
+            return self._free.pop()
+        except IndexError:
+            self.misses += 1
+            self.allocated += 1
+            return PooledBuffer(self, self.buffer_size)
+
+    def release(self, buffer: PooledBuffer) -> None:
+        """
+        Put a buffer back into the pool
+
+        Args:
+            buffer: Buffer previously returned by acquire()
+        """
+        self._free.append(buffer)
+
+    def get_stats(self) -> Dict:
+        """
+        Get pool counters
+
+        Returns:
+            Dictionary with buffer size, buffers allocated, free and missed
+        """
+        return {
+            'buffer_size': self.buffer_size,
+            'allocated': self.allocated,
+            'free': len(self._free),
+            'misses': self.misses,
+        }
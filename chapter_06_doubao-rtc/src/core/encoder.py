@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+import time
+from typing import Callable, Dict, Optional
+
+from core.framer import AudioFramer
+from core.metrics import Histogram
+from utils.logger import logger
+
+try:
+    import opuslib
+except ImportError:  # optional dependency, only needed for format='opus'
+    opuslib = None
+
+# Frame durations (ms) the Opus encoder accepts
+OPUS_FRAME_MS = (10, 20, 40, 60)
+
+# Encode time buckets in milliseconds
+ENCODE_BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0)
+
+
+class OpusEncoder:
+    """
+    Streaming Opus encoder stage for 16-bit mono PCM
+
+    Re-frames incoming PCM into Opus-sized frames and emits one encoded packet
+    per frame. The libopus encoder instance lives for the whole session, so
+    its prediction and rate-control state carry over between frames.
+    """
+    def __init__(self,
+                 sample_rate: int = 16000,
+                 frame_ms: int = 20,
+                 bitrate: int = 24000,
+                 channels: int = 1):
+        """
+        Initialize the encoder
+
+        Args:
+            sample_rate: PCM sample rate in Hz (8000, 12000, 16000, 24000 or 48000)
+            frame_ms: Opus frame duration in milliseconds (10, 20, 40 or 60)
+            bitrate: Target bitrate in bits per second
+            channels: Number of interleaved channels
+        """
+        if opuslib is None:
+            raise ImportError("Opus encoding requires the 'opuslib' package and libopus: pip install opuslib")
+        if frame_ms not in OPUS_FRAME_MS:
+            raise ValueError(f"Opus frame_ms must be one of {OPUS_FRAME_MS}, got {frame_ms}")
+
+        self.sample_rate = sample_rate
+        self.frame_ms = frame_ms
+        self.frame_samples = sample_rate * frame_ms // 1000
+
+        self._encoder = opuslib.Encoder(sample_rate, channels, opuslib.APPLICATION_VOIP)
+        self._encoder.bitrate = bitrate
+
+        self._framer = AudioFramer(frame_ms=frame_ms, sample_rate=sample_rate, channels=channels)
+        self._framer.set_audio_callback(self._encode_frame)
+
+        self.on_audio_data = None
+
+        self.encode_histogram = Histogram(ENCODE_BUCKETS_MS)
+        self.frames_encoded = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+        logger.info(f"OpusEncoder initialized with sample_rate={sample_rate}, frame_ms={frame_ms}, bitrate={bitrate}")
+
+    def set_audio_callback(self, callback: Callable[[bytes], None]) -> None:
+        """
+        Set callback for encoded packets
+
+        Args:
+            callback: Function to call with each Opus packet
+        """
+        self.on_audio_data = callback
+
+    def process(self, data) -> None:
+        """
+        Feed PCM of any length; complete frames are encoded immediately
+
+        Args:
+            data: Bytes-like 16-bit PCM
+        """
+        self._framer.process(data)
+
+    def __call__(self, data) -> None:
+        self.process(data)
+
+    def flush(self) -> None:
+        """Encode the buffered partial frame padded with silence"""
+        pending = self._framer.get_stats()['pending_bytes']
+        if pending:
+            self._framer.process(bytes(self._framer.frame_bytes - pending))
+
+    def _encode_frame(self, frame: memoryview) -> None:
+        start = time.perf_counter()
+        packet = self._encoder.encode(bytes(frame), self.frame_samples)
+        self.encode_histogram.observe((time.perf_counter() - start) * 1000)
+
+        self.frames_encoded += 1
+        self.bytes_in += len(frame)
+        self.bytes_out += len(packet)
+        if self.on_audio_data:
+            self.on_audio_data(packet)
+
+    def get_stats(self) -> Dict:
+        """
+        Get encode cost and bandwidth counters
+
+        Returns:
+            Dictionary with frame count, PCM/encoded byte totals, the fraction of
+            bandwidth saved and the encode time histogram in milliseconds
+        """
+        return {
+            'frames_encoded': self.frames_encoded,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'bandwidth_saved': 1 - self.bytes_out / self.bytes_in if self.bytes_in else 0.0,
+            'encode_ms': self.encode_histogram.snapshot(),
+        }
+
+
+def create_encoder(format: str, sample_rate: int = 16000, **kwargs) -> Optional[OpusEncoder]:
+    """
+    Create the encoder stage matching the format negotiated in create_task
+
+    Args:
+        format: Audio format passed to create_task
+        sample_rate: PCM sample rate in Hz
+        **kwargs: Extra encoder options such as frame_ms or bitrate
+
+    Returns:
+        An encoder stage, or None for raw PCM
+    """
+    if format == 'pcm':
+        return None
+    if format == 'opus':
+        return OpusEncoder(sample_rate=sample_rate, **kwargs)
+    raise ValueError(f"No streaming encoder available for format: {format}")
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+from typing import Callable, Dict
+
+from utils.logger import logger
+
+MIN_FRAME_MS = 10
+MAX_FRAME_MS = 200
+
+
+def frame_bytes_for(frame_ms: int, sample_rate: int = 16000, sample_width: int = 2, channels: int = 1) -> int:
+    """
+    Size in bytes of a PCM frame of the given duration
+
+    Args:
+        frame_ms: Frame duration in milliseconds
+        sample_rate: Sample rate in Hz
+        sample_width: Bytes per sample
+        channels: Number of interleaved channels
+
+    Returns:
+        Frame size in bytes
+    """
+    return sample_rate * frame_ms // 1000 * sample_width * channels
+
+
+def silence_frame(frame_ms: int, sample_rate: int = 16000, sample_width: int = 2, channels: int = 1) -> bytes:
+    """
+    Build a PCM frame of digital silence
+
+    Args:
+        frame_ms: Frame duration in milliseconds
+        sample_rate: Sample rate in Hz
+        sample_width: Bytes per sample
+        channels: Number of interleaved channels
+
+    Returns:
+        Zero-filled PCM bytes
+    """
+    return bytes(frame_bytes_for(frame_ms, sample_rate, sample_width, channels))
+
+
+class AudioFramer:
+    """
+    Re-chunks arbitrary PCM chunks into frames of exactly N milliseconds
+
+    Whole frames that lie inside an incoming chunk are passed on as memoryview
+    slices of that chunk without copying; only bytes that straddle a chunk
+    boundary are copied, once, into a preallocated staging frame.
+
+    Emitted frames are only valid for the duration of the callback. Consumers
+    that keep a frame must copy it.
+    """
+    def __init__(self,
+                 frame_ms: int = 40,
+                 sample_rate: int = 16000,
+                 sample_width: int = 2,
+                 channels: int = 1):
+        """
+        Initialize the framer
+
+        Args:
+            frame_ms: Output frame duration in milliseconds (10-200)
+            sample_rate: Sample rate in Hz
+            sample_width: Bytes per sample
+            channels: Number of interleaved channels
+        """
+        if not MIN_FRAME_MS <= frame_ms <= MAX_FRAME_MS:
+            raise ValueError(f"frame_ms must be between {MIN_FRAME_MS} and {MAX_FRAME_MS}, got {frame_ms}")
+
+        self.frame_ms = frame_ms
+        self.frame_bytes = frame_bytes_for(frame_ms, sample_rate, sample_width, channels)
+
+        self._staging = bytearray(self.frame_bytes)
+        self._staging_view = memoryview(self._staging)
+        self._fill = 0
+
+        self.on_audio_data = None
+        self.frames_out = 0
+        self.bytes_copied = 0
+
+        logger.info(f"AudioFramer initialized with frame_ms={frame_ms}, frame_bytes={self.frame_bytes}")
+
+    def set_audio_callback(self, callback: Callable[[memoryview], None]) -> None:
+        """
+        Set callback for fixed-size frames
+
+        Args:
+            callback: Function to call with each frame
+        """
+        self.on_audio_data = callback
+
+    def process(self, data) -> None:
+        """
+        Split one chunk into frames, carrying the remainder to the next call
+
+        Args:
+            data: Bytes-like PCM chunk of any length
+        """
+        view = memoryview(data).cast('B')
+        size = len(view)
+        pos = 0
+
+        # Complete the frame started by the previous chunk
+        if self._fill:
+            take = min(self.frame_bytes - self._fill, size)
+            self._staging_view[self._fill:self._fill + take] = view[:take]
+            self._fill += take
+            self.bytes_copied += take
+            pos = take
+            if self._fill == self.frame_bytes:
+                self._fill = 0
+                self._emit(self._staging_view)
+
+        # Whole frames straight from the caller's buffer
+        while size - pos >= self.frame_bytes:
+            self._emit(view[pos:pos + self.frame_bytes])
+            pos += self.frame_bytes
+
+        # Stage the tail for the next chunk
+        rest = size - pos
+        if rest:
+            self._staging_view[:rest] = view[pos:]
+            self._fill = rest
+            self.bytes_copied += rest
+
+    def __call__(self, data) -> None:
+        self.process(data)
+
+    def flush(self) -> None:
+        """Emit the buffered partial frame, if any, e.g. before closing the stream"""
+        if self._fill:
+            fill = self._fill
+            self._fill = 0
+            self._emit(self._staging_view[:fill])
+
+    def _emit(self, frame: memoryview) -> None:
+        self.frames_out += 1
+        if self.on_audio_data:
+            self.on_audio_data(frame)
+
+    def get_stats(self) -> Dict:
+        """
+        Get framer counters
+
+        Returns:
+            Dictionary with frame size, frames emitted and bytes copied
+        """
+        return {
+            'frame_ms': self.frame_ms,
+            'frame_bytes': self.frame_bytes,
+            'frames_out': self.frames_out,
+            'bytes_copied': self.bytes_copied,
+            'pending_bytes': self._fill,
+        }
@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+import bisect
+from typing import Dict, List, Sequence
+
+# Default bucket upper bounds in milliseconds for timing jitter
+JITTER_BUCKETS_MS = (0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 50.0, 100.0)
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram that is cheap to update from a hot path
+
+    Observing a value costs one bisect and a few integer updates; nothing is
+    allocated until a snapshot is requested.
+    """
+    def __init__(self, buckets: Sequence[float] = JITTER_BUCKETS_MS):
+        """
+        Initialize the histogram
+
+        Args:
+            buckets: Sorted upper bounds of the finite buckets. Values above the
+                last bound fall into an implicit +Inf bucket.
+        """
+        self.buckets = tuple(buckets)
+        self.reset()
+
+    def reset(self) -> None:
+        """Clear all observations"""
+        self.counts: List[int] = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        """
+        Record one observation
+
+        Args:
+            value: Observed value, in the same unit as the buckets
+        """
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def snapshot(self) -> Dict:
+        """
+        Get a copy of the histogram state
+
+        Returns:
+            Dictionary with count, sum, min, max, mean and per-bucket counts
+            keyed by upper bound ('+Inf' for the overflow bucket)
+        """
+        labels = [str(bound) for bound in self.buckets] + ['+Inf']
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'min': 0.0 if self.count == 0 else self.min,
+            'max': self.max,
+            'mean': self.sum / self.count if self.count else 0.0,
+            'buckets': dict(zip(labels, list(self.counts))),
+        }
+
+
+# Bucket upper bounds in milliseconds for chunk intervals and callback time
+INTERVAL_BUCKETS_MS = (1.0, 5.0, 10.0, 20.0, 40.0, 60.0, 80.0, 100.0, 150.0, 250.0, 500.0, 1000.0)
+CALLBACK_BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 25.0, 50.0, 100.0)
+
+
+class CaptureMetrics:
+    """
+    Health counters for the audio capture path
+
+    Updated inline by AudioCapture with plain integer increments and histogram
+    observations; nothing is aggregated or formatted until snapshot() is called.
+    """
+    def __init__(self):
+        self.frames_captured = 0
+        self.chunks_captured = 0
+        self.input_overflows = 0
+        self.interval_histogram = Histogram(INTERVAL_BUCKETS_MS)
+        self.callback_histogram = Histogram(CALLBACK_BUCKETS_MS)
+        self.peak_fill = 0
+
+    def snapshot(self) -> Dict:
+        """
+        Get a copy of all capture counters
+
+        Returns:
+            Dictionary with frame/chunk/overflow counts, the read-to-read interval
+            and on_audio_data time histograms (ms) and the peak buffer fill
+        """
+        return {
+            'frames_captured': self.frames_captured,
+            'chunks_captured': self.chunks_captured,
+            'input_overflows': self.input_overflows,
+            'interval_ms': self.interval_histogram.snapshot(),
+            'callback_ms': self.callback_histogram.snapshot(),
+            'peak_fill': self.peak_fill,
+        }
+
+
+# Bucket upper bounds in milliseconds for connection set-up phases
+CONNECT_BUCKETS_MS = (5.0, 10.0, 25.0, 50.0, 100.0, 200.0, 300.0, 500.0, 1000.0, 2000.0, 5000.0)
+CONNECT_PHASES = ('dns', 'tcp', 'tls', 'upgrade', 'start_response', 'total')
+
+
+class ConnectMetrics:
+    """
+    Per-phase timing of WebSocket session set-up
+
+    Phases are DNS lookup, TCP connect, TLS handshake, WebSocket upgrade and
+    the wait for the server's transcription-started acknowledgement; `total`
+    spans all of them. A transport only reports the phases it can observe.
+    """
+    def __init__(self):
+        self.histograms = {phase: Histogram(CONNECT_BUCKETS_MS) for phase in CONNECT_PHASES}
+        self.attempts = 0
+        self.failures = 0
+        self.last: Dict[str, float] = {}
+
+    def observe(self, phases: Dict[str, float]) -> None:
+        """
+        Record one completed connect
+
+        Args:
+            phases: Milliseconds per phase name
+        """
+        for phase, value in phases.items():
+            self.histograms[phase].observe(value)
+        self.last = dict(phases)
+
+    def snapshot(self) -> Dict:
+        """
+        Get a copy of the connect counters
+
+        Returns:
+            Dictionary with attempt/failure counts, the phases of the last
+            connect and one histogram (ms) per phase
+        """
+        return {
+            'attempts': self.attempts,
+            'failures': self.failures,
+            'last_ms': dict(self.last),
+            'phases_ms': {phase: histogram.snapshot() for phase, histogram in self.histograms.items()},
+        }
+
+
+# Bucket upper bounds in milliseconds for the time from a dropped connection
+# until the resumed session is streaming again
+RECOVERY_BUCKETS_MS = (100.0, 250.0, 500.0, 1000.0, 2000.0, 3000.0, 5000.0, 10000.0, 30000.0)
+
+
+class ReconnectMetrics:
+    """
+    Counters for automatic reconnection
+
+    A drop is a live connection closing without stop_streaming(); it either
+    ends in a recovery, whose duration is observed, or in giving up.
+    """
+    def __init__(self):
+        self.drops = 0
+        self.recoveries = 0
+        self.give_ups = 0
+        self.replayed_ms = 0.0
+        self.lost_ms = 0.0
+        self.duplicates_suppressed = 0
+        self.recovery_histogram = Histogram(RECOVERY_BUCKETS_MS)
+
+    def snapshot(self) -> Dict:
+        """
+        Get a copy of the reconnect counters
+
+        Returns:
+            Dictionary with drop/recovery/give-up counts, audio replayed (ms),
+            audio lost to outages longer than the buffers (ms), suppressed
+            duplicate results and the recovery time histogram (ms)
+        """
+        return {
+            'drops': self.drops,
+            'recoveries': self.recoveries,
+            'give_ups': self.give_ups,
+            'replayed_ms': self.replayed_ms,
+            'lost_ms': self.lost_ms,
+            'duplicates_suppressed': self.duplicates_suppressed,
+            'recovery_ms': self.recovery_histogram.snapshot(),
+        }
+
+
+# Bucket upper bounds in milliseconds for control-plane API round trips
+CONTROL_BUCKETS_MS = (10.0, 25.0, 50.0, 100.0, 200.0, 300.0, 500.0, 1000.0, 2000.0, 5000.0)
+
+
+class ControlPlaneMetrics:
+    """
+    Timing of control-plane API calls and of the connections they run on
+
+    Each operation (CreateTask, EndTask, ...) gets its own round-trip
+    histogram. Connection counters show how often a call paid for a new
+    TCP + TLS handshake instead of reusing a pooled connection.
+    """
+    def __init__(self):
+        self.histograms: Dict[str, Histogram] = {}
+        self.calls: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        self.connect_histogram = Histogram(CONNECT_BUCKETS_MS)
+        self.connections_opened = 0
+        self.connections_reused = 0
+        self.connections_expired = 0
+        self.stale_retries = 0
+
+    def observe(self, operation: str, ms: float, ok: bool = True) -> None:
+        """
+        Record one API call
+
+        Args:
+            operation: Operation name
+            ms: Round-trip time including any connection set-up
+            ok: Whether the call succeeded
+        """
+        histogram = self.histograms.get(operation)
+        if histogram is None:
+            histogram = self.histograms[operation] = Histogram(CONTROL_BUCKETS_MS)
+        histogram.observe(ms)
+        self.calls[operation] = self.calls.get(operation, 0) + 1
+        if not ok:
+            self.errors[operation] = self.errors.get(operation, 0) + 1
+
+    def snapshot(self) -> Dict:
+        """
+        Get a copy of the control-plane counters
+
+        Returns:
+            Dictionary with per-operation call/error counts and round-trip
+            histograms (ms), connections opened/reused/expired, retries on
+            stale connections and the connect (TCP + TLS) time histogram (ms)
+        """
+        return {
+            'calls': dict(self.calls),
+            'errors': dict(self.errors),
+            'operations_ms': {operation: histogram.snapshot() for operation, histogram in self.histograms.items()},
+            'connections_opened': self.connections_opened,
+            'connections_reused': self.connections_reused,
+            'connections_expired': self.connections_expired,
+            'stale_retries': self.stale_retries,
+            'connect_ms': self.connect_histogram.snapshot(),
+        }
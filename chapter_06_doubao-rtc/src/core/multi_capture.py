@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+import functools
+import queue
+import threading
+from typing import Callable, Dict, List, Optional, Union
+
+import pyaudio
+
+from core.audio_capture import AudioCapture, MODE_CALLBACK
+from core.framer import AudioFramer
+from core.tingwu_sdk.nls import TingwuNlsSDK
+from utils.logger import logger
+
+
+class Station:
+    """One microphone and the transcription session it feeds"""
+    def __init__(self, station_id: str, device: Union[int, str, None], sdk: TingwuNlsSDK,
+                 capture: AudioCapture, framer: AudioFramer):
+        self.station_id = station_id
+        self.device = device
+        self.sdk = sdk
+        self.capture = capture
+        self.framer = framer
+
+
+class MultiCaptureManager:
+    """
+    Runs several microphones concurrently, one Tingwu session per microphone
+
+    All devices share one PyAudio instance and capture in callback mode into a
+    single shared queue, drained by one dispatch thread that feeds each
+    station's own TingwuNlsSDK session. Results are reported with the id of
+    the station they came from.
+    """
+    def __init__(self,
+                 access_key_id: str,
+                 access_key_secret: str,
+                 app_key: str,
+                 sample_rate: int = 16000,
+                 chunk_size: int = 1024,
+                 frame_ms: int = 40,
+                 native_format: bool = False,
+                 queue_chunks: int = 256):
+        """
+        Initialize the manager
+
+        Args:
+            access_key_id: Alibaba Cloud Access Key ID
+            access_key_secret: Alibaba Cloud Access Key Secret
+            app_key: Tingwu App Key
+            sample_rate: Sample rate sent to Tingwu
+            chunk_size: Capture frames per buffer
+            frame_ms: Upstream frame duration in milliseconds
+            native_format: Capture each device at its native format and resample
+            queue_chunks: Capacity of the shared capture queue across all devices
+        """
+        self.access_key_id = access_key_id
+        self.access_key_secret = access_key_secret
+        self.app_key = app_key
+        self.sample_rate = sample_rate
+        self.chunk_size = chunk_size
+        self.frame_ms = frame_ms
+        self.native_format = native_format
+
+        self.stations: Dict[str, Station] = {}
+        self._pyaudio = None
+        self._queue = queue.Queue(maxsize=queue_chunks)
+        self._dispatch_thread = None
+        self.is_running = False
+
+        # Station-tagged callbacks: first argument is always the station id
+        self.on_result = None
+        self.on_sentence_end = None
+        self.on_completed = None
+        self.on_error = None
+        self.on_connection_open = None
+        self.on_connection_close = None
+
+        logger.info(f"MultiCaptureManager initialized with sample_rate={sample_rate}, frame_ms={frame_ms}")
+
+    def set_callbacks(self,
+                      on_result: Optional[Callable[[str, str, bool, float], None]] = None,
+                      on_sentence_end: Optional[Callable[[str, Dict], None]] = None,
+                      on_completed: Optional[Callable[[str, Dict], None]] = None,
+                      on_error: Optional[Callable[[str, object], None]] = None,
+                      on_connection_open: Optional[Callable[[str], None]] = None,
+                      on_connection_close: Optional[Callable[[str], None]] = None) -> None:
+        """
+        Set station-tagged callbacks
+
+        Each callback receives the station id followed by the arguments of the
+        matching TingwuNlsSDK callback.
+        """
+        self.on_result = on_result
+        self.on_sentence_end = on_sentence_end
+        self.on_completed = on_completed
+        self.on_error = on_error
+        self.on_connection_open = on_connection_open
+        self.on_connection_close = on_connection_close
+
+    def add_station(self, station_id: str, device: Union[int, str, None] = None) -> Station:
+        """
+        Register a microphone and create its transcription session
+
+        Args:
+            station_id: Id used to tag this station's results
+            device: Input device index or name; None for the default device
+
+        Returns:
+            The new station
+        """
+        if station_id in self.stations:
+            raise ValueError(f"Station already registered: {station_id}")
+        if self._pyaudio is None:
+            self._pyaudio = pyaudio.PyAudio()
+
+        sdk = TingwuNlsSDK(self.access_key_id, self.access_key_secret, self.app_key)
+        sdk.set_callbacks(
+            on_result=functools.partial(self._tagged, 'on_result', station_id),
+            on_sentence_end=functools.partial(self._tagged, 'on_sentence_end', station_id),
+            on_completed=functools.partial(self._tagged, 'on_completed', station_id),
+            on_error=functools.partial(self._tagged, 'on_error', station_id),
+            on_connection_open=functools.partial(self._tagged, 'on_connection_open', station_id),
+            on_connection_close=functools.partial(self._tagged, 'on_connection_close', station_id),
+        )
+
+        capture = AudioCapture(
+            rate=self.sample_rate,
+            chunk_size=self.chunk_size,
+            mode=MODE_CALLBACK,
+            native_format=self.native_format,
+            device=device,
+            pyaudio_instance=self._pyaudio,
+            shared_queue=self._queue,
+        )
+        framer = AudioFramer(frame_ms=self.frame_ms, sample_rate=self.sample_rate)
+        framer.set_audio_callback(sdk.send_audio_data)
+        capture.set_audio_callback(framer.process)
+
+        station = Station(station_id, device, sdk, capture, framer)
+        self.stations[station_id] = station
+        logger.info(f"Station {station_id} registered on device {device!r}")
+        return station
+
+    def _tagged(self, name: str, station_id: str, *args) -> None:
+        callback = getattr(self, name)
+        if callback:
+            callback(station_id, *args)
+
+    def _dispatch_thread_func(self) -> None:
+        """Dispatch thread function that feeds every station from the shared queue"""
+        logger.info("Multi-capture dispatch thread started")
+        while self.is_running or not self._queue.empty():
+            try:
+                capture, data = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            try:
+                capture.dispatch(data)
+            except Exception as e:
+                logger.error(f"Error dispatching audio from {capture.device_name}: {str(e)}")
+        logger.info("Multi-capture dispatch thread stopped")
+
+    def start(self, source_language: str = 'cn') -> List[str]:
+        """
+        Create a task and open a session for every station, then start capture
+
+        Args:
+            source_language: Source language for all sessions
+
+        Returns:
+            Ids of the stations that started successfully
+        """
+        self.is_running = True
+        self._dispatch_thread = threading.Thread(target=self._dispatch_thread_func)
+        self._dispatch_thread.daemon = True
+        self._dispatch_thread.start()
+
+        started = []
+        for station in self.stations.values():
+            try:
+                station.sdk.create_task(source_language=source_language, sample_rate=self.sample_rate)
+                if not station.sdk.start_streaming():
+                    raise Exception("Failed to start streaming")
+                station.capture.start()
+                started.append(station.station_id)
+                logger.info(f"Station {station.station_id} streaming from {station.capture.device_name}")
+            except Exception as e:
+                logger.error(f"Station {station.station_id} failed to start: {str(e)}")
+                self._tagged('on_error', station.station_id, str(e))
+        return started
+
+    def stop(self) -> None:
+        """Stop capture on every station, flush and close their sessions"""
+        for station in self.stations.values():
+            station.capture.stop()
+
+        self.is_running = False
+        if self._dispatch_thread:
+            self._dispatch_thread.join(timeout=2.0)
+            self._dispatch_thread = None
+
+        for station in self.stations.values():
+            station.framer.flush()
+            if station.sdk.transcriber:
+                station.sdk.stop_streaming()
+
+        if self._pyaudio:
+            self._pyaudio.terminate()
+            self._pyaudio = None
+        logger.info("All stations stopped")
+
+    def get_stats(self) -> Dict[str, Dict]:
+        """
+        Get per-station capture and latency statistics
+
+        Returns:
+            Dictionary keyed by station id
+        """
+        return {
+            station_id: {
+                'device': station.capture.device_name,
+                'is_streaming': station.sdk.is_streaming,
+                'queue_drops': station.capture.queue_drops,
+                'jitter_ms': station.capture.get_jitter_stats(),
+                'latency': station.sdk.get_latency_stats(),
+            }
+            for station_id, station in self.stations.items()
+        }
+
+    def get_combined_latency(self, window: Optional[float] = None) -> Dict:
+        """
+        Latency distribution of all stations together
+
+        Args:
+            window: Only the last `window` seconds (None for the whole run)
+
+        Returns:
+            QuantileSketch.snapshot() of the merged per-station sketches (ms)
+        """
+        combined = None
+        for station in self.stations.values():
+            sketch = station.sdk.get_latency_sketch(window)
+            if combined is None:
+                combined = sketch
+            else:
+                combined.merge(sketch)
+        return combined.snapshot() if combined else {}
@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+Prometheus / OpenMetrics text rendering of the pipeline's counters
+
+Nothing here runs on the audio path: collectors read the counters and
+histograms the components already maintain (get_stats() / snapshot()) and
+format them only when a scrape arrives. Millisecond histograms are exported
+in seconds, as Prometheus convention expects.
+"""
+
+import math
+from typing import Callable, Dict, List, Optional
+
+from utils.logger import logger
+
+CONTENT_TYPE_PROMETHEUS = 'text/plain; version=0.0.4; charset=utf-8'
+CONTENT_TYPE_OPENMETRICS = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+# Bucket upper bounds in milliseconds for the exported result latency histogram
+RESULT_LATENCY_BUCKETS_MS = (100.0, 200.0, 300.0, 500.0, 750.0, 1000.0, 1500.0, 2000.0, 3000.0, 5000.0, 10000.0)
+
+
+def _format_value(value) -> str:
+    if value is None:
+        return 'NaN'
+    value = float(value)
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(value) if not value.is_integer() else str(int(value))
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Optional[Dict]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+def _collector_name(collector) -> str:
+    # functools.partial objects carry the wrapped function in .func
+    func = getattr(collector, 'func', collector)
+    return getattr(func, '__qualname__', None) or repr(collector)
+
+
+class MetricsWriter:
+    """
+    Collects metric families for one scrape
+
+    Samples of the same family may be added from several places (e.g. one
+    per label set); HELP and TYPE are written once per family.
+    """
+    def __init__(self, prefix: str = ''):
+        self.prefix = prefix
+        self._families: Dict[str, Dict] = {}
+
+    def _family(self, name: str, kind: str, help: str) -> List[str]:
+        name = self.prefix + name
+        family = self._families.get(name)
+        if family is None:
+            family = self._families[name] = {'type': kind, 'help': help, 'samples': []}
+        return family['samples']
+
+    def gauge(self, name: str, help: str, value, labels: Optional[Dict] = None) -> None:
+        """Add a gauge sample"""
+        self._family(name, 'gauge', help).append(f"{self.prefix}{name}{_format_labels(labels)} {_format_value(value)}")
+
+    def counter(self, name: str, help: str, value, labels: Optional[Dict] = None) -> None:
+        """Add a counter sample; `name` is the family name without the _total suffix"""
+        self._family(name, 'counter', help).append(f"{self.prefix}{name}_total{_format_labels(labels)} {_format_value(value)}")
+
+    def histogram(self, name: str, help: str, snapshot: Dict, scale: float = 0.001,
+                  labels: Optional[Dict] = None) -> None:
+        """
+        Add a histogram from a Histogram.snapshot()
+
+        Args:
+            name: Family name
+            help: Description
+            snapshot: Dictionary with per-bucket (non-cumulative) counts keyed by
+                upper bound, plus count and sum
+            scale: Factor from the snapshot's unit to the exported one
+                (default: milliseconds to seconds)
+            labels: Extra labels
+        """
+        samples = self._family(name, 'histogram', help)
+        labels = dict(labels or {})
+        cumulative = 0
+        for bound, count in snapshot['buckets'].items():
+            cumulative += count
+            le = '+Inf' if bound == '+Inf' else _format_value(float(bound) * scale)
+            samples.append(f"{self.prefix}{name}_bucket{_format_labels({**labels, 'le': le})} {cumulative}")
+        samples.append(f"{self.prefix}{name}_count{_format_labels(labels)} {snapshot['count']}")
+        samples.append(f"{self.prefix}{name}_sum{_format_labels(labels)} {_format_value(snapshot['sum'] * scale)}")
+
+    def summary(self, name: str, help: str, snapshot: Dict, scale: float = 0.001,
+                labels: Optional[Dict] = None) -> None:
+        """
+        Add a summary from a QuantileSketch.snapshot()
+
+        Args:
+            name: Family name
+            help: Description
+            snapshot: Dictionary with count, sum and p50/p95/p99/p999 entries
+            scale: Factor from the snapshot's unit to the exported one
+            labels: Extra labels
+        """
+        samples = self._family(name, 'summary', help)
+        labels = dict(labels or {})
+        for key, quantile in (('p50', '0.5'), ('p95', '0.95'), ('p99', '0.99'), ('p999', '0.999')):
+            if key in snapshot:
+                value = snapshot[key] * scale if snapshot['count'] else None
+                samples.append(f"{self.prefix}{name}{_format_labels({**labels, 'quantile': quantile})} {_format_value(value)}")
+        samples.append(f"{self.prefix}{name}_count{_format_labels(labels)} {snapshot['count']}")
+        samples.append(f"{self.prefix}{name}_sum{_format_labels(labels)} {_format_value(snapshot['sum'] * scale)}")
+
+    def render(self, openmetrics: bool = False) -> str:
+        """
+        Format every family
+
+        Args:
+            openmetrics: OpenMetrics 1.0 instead of the Prometheus 0.0.4 text format
+
+        Returns:
+            Exposition text
+        """
+        lines = []
+        for name, family in self._families.items():
+            # Prometheus text names the counter family with its _total suffix
+            type_name = name + '_total' if family['type'] == 'counter' and not openmetrics else name
+            lines.append(f"# HELP {type_name} {family['help']}")
+            lines.append(f"# TYPE {type_name} {family['type']}")
+            lines.extend(family['samples'])
+        if openmetrics:
+            lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsRegistry:
+    """
+    Collectors run at scrape time
+
+    A collector is a callable receiving the MetricsWriter of the scrape; a
+    collector that raises is logged, counted and skipped so one broken source
+    does not hide the others.
+    """
+    def __init__(self, prefix: str = 'mita_'):
+        self.prefix = prefix
+        self._collectors: List[Callable[[MetricsWriter], None]] = []
+        self.scrape_errors = 0
+
+    def register(self, collector: Callable[[MetricsWriter], None]) -> None:
+        """Add a collector"""
+        self._collectors.append(collector)
+
+    def unregister(self, collector: Callable[[MetricsWriter], None]) -> None:
+        """Remove a collector added with register()"""
+        if collector in self._collectors:
+            self._collectors.remove(collector)
+
+    def render(self, openmetrics: bool = False) -> str:
+        """
+        Run every collector and format the result
+
+        Args:
+            openmetrics: OpenMetrics 1.0 instead of the Prometheus 0.0.4 text format
+
+        Returns:
+            Exposition text
+        """
+        writer = MetricsWriter(self.prefix)
+        for collector in list(self._collectors):
+            try:
+                collector(writer)
+            except Exception as e:
+                self.scrape_errors += 1
+                logger.warning(f"Metrics collector {_collector_name(collector)} failed: {str(e)}")
+        writer.counter('metrics_scrape_errors', 'Collectors that failed while rendering /metrics', self.scrape_errors)
+        return writer.render(openmetrics)
+
+
+def collect_capture(writer: MetricsWriter, capture) -> None:
+    """
+    Add AudioCapture health counters
+
+    Args:
+        writer: Scrape writer
+        capture: AudioCapture instance
+    """
+    metrics = capture.get_metrics()
+    writer.counter('capture_chunks', 'Audio chunks delivered by the input device', metrics['chunks_captured'])
+    writer.counter('capture_frames', 'Audio frames delivered by the input device', metrics['frames_captured'])
+    writer.counter('capture_input_overflows', 'Input overflows (device flag in callback mode, read backlog estimate in blocking mode)', metrics['input_overflows'])
+    writer.counter('capture_queue_drops', 'Chunks dropped because the capture queue was full', capture.queue_drops)
+    writer.gauge('capture_peak_fill', 'Peak capture buffer fill seen by the consumer', metrics['peak_fill'])
+    writer.histogram('capture_interval_seconds', 'Time between consecutive capture chunks', metrics['interval_ms'])
+    writer.histogram('capture_callback_seconds', 'Time spent in the audio callback (VAD, framing, encoding, enqueue)',
+                     metrics['callback_ms'])
+    buffer_stats = capture.get_buffer_stats()
+    if buffer_stats:
+        writer.counter('capture_ring_overruns', 'Writes that did not fit the capture ring buffer', buffer_stats['overruns'])
+        writer.counter('capture_ring_underruns', 'Reads that timed out waiting for the capture ring buffer',
+                       buffer_stats['underruns'])
+
+
+def collect_sdk(writer: MetricsWriter, sdk) -> None:
+    """
+    Add the counters of a TingwuSDK or TingwuNlsSDK instance
+
+    Sections the SDK does not provide (e.g. latency on the WebSocket SDK) are
+    left out.
+
+    Args:
+        writer: Scrape writer
+        sdk: SDK instance
+    """
+    writer.gauge('tingwu_streaming', 'Whether the transcription session is streaming', int(bool(sdk.is_streaming)))
+    writer.gauge('tingwu_connected', 'Whether the transcription connection is open', int(bool(sdk.is_connected)))
+
+    queue = sdk.get_send_queue_stats()
+    writer.gauge('send_queue_depth', 'Audio frames waiting in the outbound queue', queue['depth'])
+    writer.gauge('send_queue_capacity', 'Capacity of the outbound queue in frames', queue['capacity'])
+    writer.gauge('send_queue_peak_depth', 'Peak depth of the outbound queue', queue['peak_depth'])
+    writer.counter('send_queue_frames_sent', 'Audio frames written to the connection', queue['frames_sent'])
+    writer.counter('send_queue_bytes_sent', 'Audio bytes written to the connection', queue['bytes_sent'])
+    writer.counter('send_queue_frames_dropped', 'Audio frames dropped by the queue policy', queue['frames_dropped'])
+    writer.counter('send_queue_send_errors', 'Failed writes of queued audio', queue['send_errors'])
+    writer.histogram('send_queue_latency_seconds', 'Time from enqueue to wire for outbound audio frames', queue['latency_ms'])
+
+    connect = sdk.get_connect_stats()
+    writer.counter('tingwu_connect_attempts', 'Transcription connection attempts', connect['attempts'])
+    writer.counter('tingwu_connect_failures', 'Failed transcription connection attempts', connect['failures'])
+    for phase, snapshot in connect['phases_ms'].items():
+        if snapshot['count']:
+            writer.histogram('tingwu_connect_seconds', 'Transcription connection set-up time per phase', snapshot,
+                             labels={'phase': phase})
+
+    control = sdk.get_control_stats()
+    if control:
+        for operation, snapshot in control['operations_ms'].items():
+            writer.histogram('tingwu_control_request_seconds', 'Control-plane API round trip per operation', snapshot,
+                             labels={'operation': operation})
+        writer.counter('tingwu_control_connections_opened', 'Control-plane connections opened (TCP + TLS handshakes)',
+                       control['connections_opened'])
+        writer.counter('tingwu_control_connections_reused', 'Control-plane calls served on a pooled connection',
+                       control['connections_reused'])
+
+    if hasattr(sdk, 'latency_sketch'):
+        writer.histogram('tingwu_result_latency_seconds', 'Speech end to final result latency',
+                         sdk.get_latency_sketch().histogram(RESULT_LATENCY_BUCKETS_MS))
+        snapshot = sdk.latency_sketch.snapshot()
+        for label, window in snapshot['windows'].items():
+            writer.summary('tingwu_result_latency_window_seconds', 'Speech end to final result latency over a sliding window',
+                           window, labels={'window': label})
+
+    if hasattr(sdk, 'get_reconnect_stats'):
+        reconnect = sdk.get_reconnect_stats()
+        writer.counter('tingwu_connection_drops', 'Live connections that dropped', reconnect['drops'])
+        writer.counter('tingwu_connection_recoveries', 'Dropped connections resumed', reconnect['recoveries'])
+        writer.counter('tingwu_reconnect_lost_audio_seconds', 'Audio lost to outages longer than the reconnect buffers',
+                       reconnect['lost_ms'] / 1000.0)
+        writer.histogram('tingwu_recovery_seconds', 'Time from a dropped connection to streaming again',
+                         reconnect['recovery_ms'])
@@ -0,0 +1,26 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+from typing import Callable, Sequence
+
+
+def build_pipeline(stages: Sequence, sink: Callable) -> Callable:
+    """
+    Chain audio processing stages in front of a sink
+
+    Every stage follows the AudioCapture callback contract: it exposes
+    set_audio_callback() and a process() method taking one chunk. None entries
+    are skipped so optional stages can be passed inline.
+
+    Args:
+        stages: Stages in processing order, e.g. [vad_gate, framer]
+        sink: Final consumer, e.g. sdk.send_audio_data
+
+    Returns:
+        Callable to hand to AudioCapture.set_audio_callback
+    """
+    target = sink
+    for stage in reversed([stage for stage in stages if stage is not None]):
+        stage.set_audio_callback(target)
+        target = stage.process
+    return target
@@ -0,0 +1,314 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+import math
+import threading
+import time
+from typing import Callable, Dict, Optional, Sequence
+
+import numpy as np
+
+# Quantiles reported by snapshot(), keyed p50, p95, p99, p999
+QUANTILES = (0.5, 0.95, 0.99, 0.999)
+
+# Sliding windows in seconds kept by WindowedQuantileSketch by default
+DEFAULT_WINDOWS = (60.0, 900.0)
+
+
+def quantile_label(q: float) -> str:
+    """Key for a quantile in snapshots, e.g. 0.999 -> 'p999'"""
+    return 'p' + f"{q * 100:g}".replace('.', '')
+
+
+def window_label(seconds: float) -> str:
+    """Key for a window in snapshots, e.g. 900 -> '15m'"""
+    if seconds % 60 == 0:
+        return f"{int(seconds // 60)}m"
+    return f"{seconds:g}s"
+
+
+class QuantileSketch:
+    """
+    Fixed-memory log-linear histogram for streaming quantiles
+
+    Bucket i (i >= 1) covers (min_value * gamma**(i-1), min_value * gamma**i]
+    with gamma = (1 + accuracy) / (1 - accuracy), so any quantile is reported
+    within `accuracy` relative error no matter how many values were observed.
+    Values at or below min_value share bucket 0 and values above max_value
+    the last bucket. Sketches with the same layout merge by adding counts.
+    """
+    def __init__(self, accuracy: float = 0.01, min_value: float = 0.1, max_value: float = 600000.0):
+        """
+        Preallocate the buckets
+
+        Args:
+            accuracy: Relative error bound of reported quantiles
+            min_value: Smallest value resolved (in the unit of the observations)
+            max_value: Largest value resolved
+        """
+        if not 0.0 < accuracy < 1.0:
+            raise ValueError("accuracy must be between 0 and 1")
+        if not 0.0 < min_value < max_value:
+            raise ValueError("min_value must be positive and below max_value")
+
+        self.accuracy = accuracy
+        self.min_value = min_value
+        self.max_value = max_value
+        self.gamma = (1.0 + accuracy) / (1.0 - accuracy)
+        self._inv_log_gamma = 1.0 / math.log(self.gamma)
+        self.size = int(math.ceil(math.log(max_value / min_value) * self._inv_log_gamma)) + 1
+        self.counts = np.zeros(self.size, dtype=np.int64)
+        self.count = 0
+        self.sum = 0.0
+        self.min = float('inf')
+        self.max = float('-inf')
+
+    def index(self, value: float) -> int:
+        """Bucket holding `value`"""
+        if value <= self.min_value:
+            return 0
+        return min(self.size - 1, int(math.ceil(math.log(value / self.min_value) * self._inv_log_gamma)))
+
+    def _record(self, index: int, value: float) -> None:
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def observe(self, value: float) -> None:
+        """
+        Record one observation
+
+        Args:
+            value: Observed value
+        """
+        self._record(self.index(value), value)
+
+    def _value_at(self, index: int) -> float:
+        """Value reported for a bucket: within `accuracy` of both its bounds"""
+        if index == 0:
+            return self.min_value
+        return self.min_value * 2.0 * self.gamma ** index / (self.gamma + 1.0)
+
+    def quantiles(self, qs: Sequence[float] = QUANTILES) -> Dict[float, float]:
+        """
+        Estimate several quantiles in one pass over the buckets
+
+        Args:
+            qs: Quantiles between 0 and 1
+
+        Returns:
+            Dictionary mapping each quantile to its estimate (0.0 when empty)
+        """
+        if self.count == 0:
+            return {q: 0.0 for q in qs}
+        cumulative = np.cumsum(self.counts)
+        result = {}
+        for q in qs:
+            index = int(np.searchsorted(cumulative, q * (self.count - 1), side='right'))
+            # Exact extremes are known; never report beyond them
+            result[q] = min(self.max, max(self.min, self._value_at(index)))
+        return result
+
+    def quantile(self, q: float) -> float:
+        """Estimate one quantile (0 <= q <= 1)"""
+        return self.quantiles((q,))[q]
+
+    def empty_copy(self) -> 'QuantileSketch':
+        """A new, empty sketch with the same bucket layout"""
+        return QuantileSketch(self.accuracy, self.min_value, self.max_value)
+
+    def copy(self) -> 'QuantileSketch':
+        """An independent copy, e.g. to merge or report later"""
+        other = self.empty_copy()
+        other.merge(self)
+        return other
+
+    def merge(self, other: 'QuantileSketch') -> None:
+        """
+        Add another sketch's observations to this one
+
+        Args:
+            other: Sketch with the same accuracy and value range
+        """
+        if (other.size, other.gamma, other.min_value) != (self.size, self.gamma, self.min_value):
+            raise ValueError("Cannot merge sketches with different bucket layouts")
+        self.counts += other.counts
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def reset(self) -> None:
+        """Clear all observations"""
+        self.counts[:] = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = float('inf')
+        self.max = float('-inf')
+
+    def histogram(self, bounds: Sequence[float]) -> Dict:
+        """
+        Re-bucket the observations onto fixed upper bounds
+
+        Each bound is resolved to the sketch bucket holding it, so counts are
+        exact up to `accuracy` around each bound.
+
+        Args:
+            bounds: Ascending bucket upper bounds
+
+        Returns:
+            Dictionary shaped like Histogram.snapshot(): count, sum and
+            per-bucket (non-cumulative) counts keyed by bound plus '+Inf'
+        """
+        cumulative = np.cumsum(self.counts)
+        buckets = {}
+        previous = 0
+        for bound in bounds:
+            below = int(cumulative[self.index(bound)])
+            buckets[str(bound)] = below - previous
+            previous = below
+        buckets['+Inf'] = self.count - previous
+        return {'count': self.count, 'sum': self.sum, 'buckets': buckets}
+
+    def snapshot(self, qs: Sequence[float] = QUANTILES) -> Dict:
+        """
+        Get a summary of the sketch
+
+        Returns:
+            Dictionary with count, sum, min, max, mean and one entry per
+            quantile (p50, p95, p99, p999)
+        """
+        stats = {
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min if self.count else 0.0,
+            'max': self.max if self.count else 0.0,
+            'mean': self.sum / self.count if self.count else 0.0,
+        }
+        for q, value in self.quantiles(qs).items():
+            stats[quantile_label(q)] = value
+        return stats
+
+
+class WindowedQuantileSketch:
+    """
+    QuantileSketch over the whole run plus sliding time windows
+
+    Every observation also lands in a ring of per-slot bucket counts, each
+    slot covering slot_seconds. A window is answered by summing the slots it
+    spans, so it is accurate to within one slot and memory is fixed by the
+    longest window: the ring never grows, however long the process runs.
+    """
+    def __init__(self,
+                 windows: Sequence[float] = DEFAULT_WINDOWS,
+                 slot_seconds: float = 10.0,
+                 accuracy: float = 0.01,
+                 min_value: float = 0.1,
+                 max_value: float = 600000.0,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Preallocate the ring
+
+        Args:
+            windows: Window lengths in seconds reported by snapshot()
+            slot_seconds: Time resolution of the windows
+            accuracy: Relative error bound of reported quantiles
+            min_value: Smallest value resolved
+            max_value: Largest value resolved
+            clock: Time source in seconds
+        """
+        if not windows:
+            raise ValueError("At least one window is required")
+        if slot_seconds <= 0:
+            raise ValueError("slot_seconds must be positive")
+
+        self.windows = tuple(sorted(windows))
+        self.slot_seconds = slot_seconds
+        self.clock = clock
+        self.total = QuantileSketch(accuracy, min_value, max_value)
+
+        self.slots = int(math.ceil(self.windows[-1] / slot_seconds))
+        # One row of bucket counts per slot; 32 bits are plenty for one slot
+        self._counts = np.zeros((self.slots, self.total.size), dtype=np.int32)
+        self._slot_ids = np.full(self.slots, -1, dtype=np.int64)
+        self._sums = np.zeros(self.slots)
+        self._mins = np.full(self.slots, np.inf)
+        self._maxes = np.full(self.slots, -np.inf)
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, now: Optional[float] = None) -> None:
+        """
+        Record one observation
+
+        Args:
+            value: Observed value
+            now: Observation time (default: the clock)
+        """
+        slot_id = int((self.clock() if now is None else now) // self.slot_seconds)
+        row = slot_id % self.slots
+        index = self.total.index(value)
+        with self._lock:
+            if self._slot_ids[row] != slot_id:
+                # The slot last held data one full ring ago: start it afresh
+                self._counts[row] = 0
+                self._slot_ids[row] = slot_id
+                self._sums[row] = 0.0
+                self._mins[row] = np.inf
+                self._maxes[row] = -np.inf
+            self._counts[row, index] += 1
+            self._sums[row] += value
+            if value < self._mins[row]:
+                self._mins[row] = value
+            if value > self._maxes[row]:
+                self._maxes[row] = value
+            self.total._record(index, value)
+
+    def window(self, seconds: float, now: Optional[float] = None) -> QuantileSketch:
+        """
+        Merge the slots of the last `seconds` into a standalone sketch
+
+        Args:
+            seconds: Window length; at most the longest configured window
+            now: End of the window (default: the clock)
+
+        Returns:
+            A QuantileSketch that can be queried or merged with others
+        """
+        current = int((self.clock() if now is None else now) // self.slot_seconds)
+        spanned = min(self.slots, int(math.ceil(seconds / self.slot_seconds)))
+        sketch = self.total.empty_copy()
+        with self._lock:
+            rows = (self._slot_ids > current - spanned) & (self._slot_ids <= current)
+            if rows.any():
+                sketch.counts += self._counts[rows].sum(axis=0, dtype=np.int64)
+                sketch.count = int(sketch.counts.sum())
+                sketch.sum = float(self._sums[rows].sum())
+                sketch.min = float(self._mins[rows].min())
+                sketch.max = float(self._maxes[rows].max())
+        return sketch
+
+    def reset(self) -> None:
+        """Clear all observations"""
+        with self._lock:
+            self.total.reset()
+            self._counts[:] = 0
+            self._slot_ids[:] = -1
+
+    def snapshot(self, qs: Sequence[float] = QUANTILES, now: Optional[float] = None) -> Dict:
+        """
+        Get a summary over the whole run and each window
+
+        Returns:
+            QuantileSketch.snapshot() of the whole run, plus 'windows' mapping
+            each window label ('1m', '15m', ...) to the same summary
+        """
+        now = self.clock() if now is None else now
+        with self._lock:
+            stats = self.total.snapshot(qs)
+        stats['windows'] = {window_label(seconds): self.window(seconds, now).snapshot(qs)
+                            for seconds in self.windows}
+        return stats
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+from typing import List
+
+import numpy as np
+
+
+class PCMReplayWindow:
+    """
+    Rolling window of the most recent 16-bit PCM sent upstream
+
+    Audio is addressed by its absolute sample offset in the session, counted
+    from the first sample ever sent, so a range can be looked up again after
+    a reconnect. Storage is preallocated; appending only copies into the ring.
+    """
+    def __init__(self, window_ms: int, sample_rate: int = 16000):
+        """
+        Preallocate the window
+
+        Args:
+            window_ms: Amount of audio kept, in milliseconds
+            sample_rate: Sample rate in Hz
+        """
+        if window_ms <= 0:
+            raise ValueError("window_ms must be positive")
+
+        self.sample_rate = sample_rate
+        self.capacity = sample_rate * window_ms // 1000  # in samples
+        self._buffer = np.zeros(self.capacity, dtype=np.int16)
+        self.end = 0  # absolute offset one past the newest sample
+
+    @property
+    def start(self) -> int:
+        """Absolute offset of the oldest sample still held"""
+        return max(0, self.end - self.capacity)
+
+    def samples_to_ms(self, samples: int) -> float:
+        return samples * 1000.0 / self.sample_rate
+
+    def ms_to_samples(self, ms: float) -> int:
+        return int(ms * self.sample_rate / 1000)
+
+    def append(self, data) -> None:
+        """
+        Record PCM that is about to be sent
+
+        Args:
+            data: Bytes-like object holding int16 samples
+        """
+        samples = np.frombuffer(data, dtype=np.int16)
+        count = samples.size
+        if count > self.capacity:
+            samples = samples[count - self.capacity:]
+        kept = samples.size
+
+        start = (self.end + count - kept) % self.capacity
+        first = min(kept, self.capacity - start)
+        self._buffer[start:start + first] = samples[:first]
+        if first < kept:
+            self._buffer[:kept - first] = samples[first:]
+        self.end += count
+
+    def read_from(self, offset: int, chunk_samples: int) -> List[bytes]:
+        """
+        Copy out everything from `offset` to the newest sample
+
+        Args:
+            offset: Absolute sample offset to start at; clamped to the window
+            chunk_samples: Size of the returned chunks in samples (the last
+                one may be shorter)
+
+        Returns:
+            PCM chunks in order
+        """
+        chunks = []
+        position = max(offset, self.start)
+        while position < self.end:
+            count = min(chunk_samples, self.end - position)
+            start = position % self.capacity
+            first = min(count, self.capacity - start)
+            if first == count:
+                chunks.append(self._buffer[start:start + count].tobytes())
+            else:
+                chunks.append(self._buffer[start:].tobytes() + self._buffer[:count - first].tobytes())
+            position += count
+        return chunks
+
+    def reset(self) -> None:
+        """Forget all audio and restart offsets at zero"""
+        self.end = 0
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+from math import gcd
+
+import numpy as np
+
+
+class PolyphaseResampler:
+    """
+    Streaming polyphase resampler with channel downmix for 16-bit PCM
+
+    Converts interleaved int16 audio captured at a device's native rate and
+    channel count into mono int16 at the target rate. Filter history and the
+    output phase are carried across calls, so chunk boundaries are seamless.
+    """
+    def __init__(self,
+                 in_rate: int,
+                 out_rate: int = 16000,
+                 in_channels: int = 1,
+                 taps_per_phase: int = 32,
+                 kaiser_beta: float = 8.0):
+        """
+        Design the anti-aliasing filter bank
+
+        Args:
+            in_rate: Input sample rate in Hz
+            out_rate: Output sample rate in Hz
+            in_channels: Number of interleaved input channels to downmix
+            taps_per_phase: FIR length per polyphase branch
+            kaiser_beta: Kaiser window shape parameter
+        """
+        self.in_rate = in_rate
+        self.out_rate = out_rate
+        self.in_channels = in_channels
+
+        g = gcd(in_rate, out_rate)
+        self.up = out_rate // g
+        self.down = in_rate // g
+        self.taps = taps_per_phase
+
+        # Prototype low-pass at the upsampled rate, cut off below the lower Nyquist
+        length = self.up * taps_per_phase
+        cutoff = 0.45 / max(self.up, self.down)  # cycles per upsampled sample
+        n = np.arange(length) - (length - 1) / 2
+        prototype = 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(length, kaiser_beta)
+        prototype *= self.up / prototype.sum()
+
+        # bank[p, k] = h[p + k * up]; each output uses one row against the input history
+        self._bank = prototype.reshape(taps_per_phase, self.up).T.astype(np.float32)
+        self._tap_offsets = np.arange(taps_per_phase)
+
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget filter history, e.g. when a new stream starts"""
+        self._history = np.zeros(self.taps - 1, dtype=np.float32)
+        self._in_count = 0   # input samples consumed so far
+        self._out_count = 0  # index of the next output sample
+
+    def downmix(self, data) -> np.ndarray:
+        """
+        Average interleaved channels into mono
+
+        Args:
+            data: Bytes-like interleaved int16 PCM
+
+        Returns:
+            Mono float32 samples
+        """
+        samples = np.frombuffer(data, dtype=np.int16)
+        if self.in_channels == 1:
+            return samples.astype(np.float32)
+        frames = samples[:samples.size - samples.size % self.in_channels].reshape(-1, self.in_channels)
+        return frames.mean(axis=1, dtype=np.float32)
+
+    def process(self, data) -> bytes:
+        """
+        Convert one chunk
+
+        Args:
+            data: Bytes-like interleaved int16 PCM at the input rate
+
+        Returns:
+            Mono int16 PCM bytes at the output rate
+        """
+        mono = self.downmix(data)
+        if self.up == self.down:
+            return np.clip(np.rint(mono), -32768, 32767).astype(np.int16).tobytes()
+
+        first_input = self._in_count - (self.taps - 1)  # global index of extended[0]
+        extended = np.concatenate((self._history, mono))
+        self._in_count += mono.size
+
+        # Every output whose newest input sample has now arrived
+        last_out = (self._in_count * self.up - 1) // self.down
+        j = np.arange(self._out_count, last_out + 1, dtype=np.int64)
+        self._out_count = last_out + 1
+        self._history = extended[extended.size - (self.taps - 1):]
+        if j.size == 0:
+            return b''
+
+        position = j * self.down
+        base = position // self.up - first_input
+        phase = position % self.up
+        window = extended[base[:, None] - self._tap_offsets[None, :]]
+        out = np.einsum('ij,ij->i', window, self._bank[phase])
+        return np.clip(np.rint(out), -32768, 32767).astype(np.int16).tobytes()
+
+    def __call__(self, data) -> bytes:
+        return self.process(data)
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+import threading
+from typing import Optional
+
+import numpy as np
+
+
+class PCMRingBuffer:
+    """
+    Fixed-capacity single-producer/single-consumer ring buffer for 16-bit PCM
+
+    The capture thread is the only writer and the sender thread is the only
+    reader. Each side advances its own position counter, so neither side takes
+    a lock on the hot path and the producer never waits for the consumer.
+    """
+    def __init__(self, capacity_frames: int, channels: int = 1):
+        """
+        Preallocate the ring storage
+
+        Args:
+            capacity_frames: Number of audio frames the buffer can hold
+            channels: Number of interleaved channels per frame
+        """
+        if capacity_frames <= 0:
+            raise ValueError("capacity_frames must be positive")
+
+        self.channels = channels
+        self.capacity = capacity_frames * channels  # in samples
+        self._buffer = np.zeros(self.capacity, dtype=np.int16)
+
+        # Monotonic sample counters; only the owning side ever advances them
+        self._write_pos = 0
+        self._read_pos = 0
+        self._data_ready = threading.Event()
+
+        self.overruns = 0          # writes that did not fit completely
+        self.overrun_samples = 0   # samples dropped because the buffer was full
+        self.underruns = 0         # reads that timed out waiting for data
+
+    def available(self) -> int:
+        """Number of samples ready to be read"""
+        return self._write_pos - self._read_pos
+
+    def free(self) -> int:
+        """Number of samples that can be written without overrun"""
+        return self.capacity - (self._write_pos - self._read_pos)
+
+    def write(self, data) -> int:
+        """
+        Copy PCM samples into the buffer (producer side)
+
+        Samples that do not fit are dropped and counted as an overrun instead
+        of blocking the caller.
+
+        Args:
+            data: Bytes-like object holding interleaved int16 samples
+
+        Returns:
+            Number of samples actually written
+        """
+        samples = np.frombuffer(data, dtype=np.int16)
+        count = samples.size
+        free = self.free()
+        if count > free:
+            self.overruns += 1
+            self.overrun_samples += count - free
+            samples = samples[:free]
+            count = free
+        if count == 0:
+            return 0
+
+        start = self._write_pos % self.capacity
+        first = min(count, self.capacity - start)
+        self._buffer[start:start + first] = samples[:first]
+        if first < count:
+            self._buffer[:count - first] = samples[first:]
+
+        # Publish only after the copy so the reader never sees partial data
+        self._write_pos += count
+        self._data_ready.set()
+        return count
+
+    def read(self, count: int, timeout: Optional[float] = None) -> Optional[bytes]:
+        """
+        Read exactly `count` samples (consumer side)
+
+        Args:
+            count: Number of samples to read
+            timeout: Maximum seconds to wait for enough data
+
+        Returns:
+            PCM bytes, or None if not enough data arrived in time
+        """
+        if not self._wait_for(count, timeout):
+            return None
+        return self._consume(count)
+
+    def read_into(self, out: np.ndarray, timeout: Optional[float] = None) -> int:
+        """
+        Fill a caller-provided int16 array without allocating (consumer side)
+
+        Args:
+            out: Destination array; exactly out.size samples are read
+            timeout: Maximum seconds to wait for enough data
+
+        Returns:
+            Number of samples copied, or 0 if not enough data arrived in time
+        """
+        count = out.size
+        if not self._wait_for(count, timeout):
+            return 0
+        start = self._read_pos % self.capacity
+        first = min(count, self.capacity - start)
+        out[:first] = self._buffer[start:start + first]
+        if first < count:
+            out[first:] = self._buffer[:count - first]
+        self._read_pos += count
+        return count
+
+    def _wait_for(self, count: int, timeout: Optional[float]) -> bool:
+        """Wait until `count` samples are available; counts an underrun on timeout"""
+        if self.available() < count:
+            self._data_ready.clear()
+            if self.available() < count:
+                if not self._data_ready.wait(timeout):
+                    self.underruns += 1
+                    return False
+                if self.available() < count:
+                    return False
+        return True
+
+    def read_available(self) -> bytes:
+        """Read every sample currently buffered, possibly returning empty bytes"""
+        return self._consume(self.available())
+
+    def interrupt(self) -> None:
+        """Wake a reader blocked in read() so it can re-check its exit condition"""
+        self._data_ready.set()
+
+    def _consume(self, count: int) -> bytes:
+        start = self._read_pos % self.capacity
+        first = min(count, self.capacity - start)
+        if first == count:
+            data = self._buffer[start:start + count].tobytes()
+        else:
+            data = self._buffer[start:].tobytes() + self._buffer[:count - first].tobytes()
+        self._read_pos += count
+        return data
+
+    def get_stats(self) -> dict:
+        """
+        Get buffer counters
+
+        Returns:
+            Dictionary with capacity, fill level, overrun and underrun counters
+        """
+        return {
+            'capacity_samples': self.capacity,
+            'fill_samples': self.available(),
+            'overruns': self.overruns,
+            'overrun_samples': self.overrun_samples,
+            'underruns': self.underruns,
+        }
@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from core.metrics import Histogram
+from core.tracing import tracer
+from utils.logger import logger
+
+POLICIES = ('block', 'drop_oldest', 'skip_silence')
+
+# Bucket upper bounds in milliseconds for the time a frame waits in the queue
+QUEUE_LATENCY_BUCKETS_MS = (1.0, 5.0, 10.0, 20.0, 50.0, 100.0, 200.0, 500.0, 1000.0, 2000.0, 5000.0)
+
+
+class AudioSendQueue:
+    """
+    Bounded outbound audio queue drained by its own sender thread
+
+    The capture side only enqueues; a dedicated thread performs the socket
+    writes, so a congested uplink shows up as queue depth instead of stalling
+    the caller. What happens when the queue is full is set by the policy:
+
+    - block: the caller waits for room (up to block_timeout, then the frame is dropped)
+    - drop_oldest: the oldest queued frame is dropped
+    - skip_silence: the oldest silent frame is dropped, falling back to the
+      oldest frame when everything queued is speech (PCM only)
+    """
+    def __init__(self,
+                 send: Callable[[bytes], None],
+                 max_frames: int = 50,
+                 policy: str = 'drop_oldest',
+                 block_timeout: Optional[float] = None,
+                 silence_threshold: float = 200.0,
+                 name: str = 'audio-send'):
+        """
+        Initialize the queue
+
+        Args:
+            send: Function writing one frame to the wire; called on the sender thread
+            max_frames: Queue capacity in frames
+            policy: One of POLICIES
+            block_timeout: Longest a caller waits under the block policy (None waits indefinitely)
+            silence_threshold: RMS amplitude below which a 16-bit PCM frame counts as
+                silence for the skip_silence policy
+            name: Name of the sender thread
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown send queue policy: {policy}")
+        if max_frames <= 0:
+            raise ValueError("max_frames must be positive")
+
+        self.send = send
+        self.max_frames = max_frames
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.silence_threshold = silence_threshold
+        self.name = name
+
+        # Entries are [data, enqueue time, is_silent]
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._in_flight = False
+        self.is_running = False
+
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.frames_dropped = 0
+        self.bytes_dropped = 0
+        self.silent_dropped = 0
+        self.send_errors = 0
+        self.peak_depth = 0
+        self.latency_histogram = Histogram(QUEUE_LATENCY_BUCKETS_MS)
+
+    def start(self) -> None:
+        """Start the sender thread"""
+        if self.is_running:
+            return
+        self.is_running = True
+        self._thread = threading.Thread(target=self._sender_thread_func, name=self.name)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the sender thread; frames still queued are discarded"""
+        with self._cond:
+            self.is_running = False
+            self._cond.notify_all()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2)
+        self._thread = None
+        self.clear()
+
+    def depth(self) -> int:
+        """Number of frames waiting to be sent"""
+        return len(self._queue)
+
+    def _is_silent(self, data: bytes) -> bool:
+        samples = np.frombuffer(data, dtype=np.int16).astype(np.float32)
+        if samples.size == 0:
+            return True
+        # Mean square against the squared threshold avoids the square root
+        power = np.dot(samples, samples) / samples.size
+        return power < self.silence_threshold * self.silence_threshold
+
+    def _drop(self, entry) -> None:
+        self.frames_dropped += 1
+        self.bytes_dropped += len(entry[0])
+        if entry[2]:
+            self.silent_dropped += 1
+
+    def _make_room(self) -> None:
+        """Drop one frame according to the policy (caller holds the lock)"""
+        if self.policy == 'skip_silence':
+            for index, entry in enumerate(self._queue):
+                if entry[2]:
+                    del self._queue[index]
+                    self._drop(entry)
+                    return
+        self._drop(self._queue.popleft())
+
+    def put(self, data) -> bool:
+        """
+        Queue one frame for sending
+
+        The frame is copied if it is a view, since upstream stages reuse their
+        buffers once the callback returns.
+
+        Args:
+            data: Encoded audio frame
+
+        Returns:
+            False if the frame was dropped instead of queued (also counted
+            when the sender is not running)
+        """
+        if not isinstance(data, bytes):
+            data = bytes(data)
+        silent = self.policy == 'skip_silence' and len(data) % 2 == 0 and self._is_silent(data)
+        entry = [data, time.perf_counter(), silent]
+
+        with self._cond:
+            if not self.is_running:
+                self._drop(entry)
+                return False
+            if len(self._queue) >= self.max_frames:
+                if self.policy == 'block':
+                    if not self._cond.wait_for(lambda: len(self._queue) < self.max_frames or not self.is_running,
+                                               self.block_timeout) or not self.is_running:
+                        self._drop(entry)
+                        return False
+                else:
+                    self._make_room()
+            self._queue.append(entry)
+            if len(self._queue) > self.peak_depth:
+                self.peak_depth = len(self._queue)
+            self._cond.notify_all()
+        return True
+
+    def drain(self) -> List[bytes]:
+        """
+        Remove and return every queued frame without sending it
+
+        Returns:
+            Frames in queue order
+        """
+        with self._cond:
+            frames = [entry[0] for entry in self._queue]
+            self._queue.clear()
+            self._cond.notify_all()
+        return frames
+
+    def clear(self) -> None:
+        """Discard every queued frame"""
+        self.drain()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until every queued frame has been handed to the wire
+
+        Args:
+            timeout: Maximum seconds to wait
+
+        Returns:
+            True if the queue emptied in time
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: not (self._queue or self._in_flight) or not self.is_running, timeout)
+
+    def _sender_thread_func(self) -> None:
+        """Sender thread function that writes queued frames in order"""
+        logger.debug(f"{self.name} thread started")
+        while True:
+            with self._cond:
+                while self.is_running and not self._queue:
+                    self._cond.wait()
+                if not self.is_running:
+                    break
+                data, enqueued_at, _ = self._queue.popleft()
+                depth = len(self._queue)
+                self._in_flight = True
+                self._cond.notify_all()
+
+            try:
+                send_start = time.perf_counter()
+                self.send(data)
+                send_end = time.perf_counter()
+                self.frames_sent += 1
+                self.bytes_sent += len(data)
+                self.latency_histogram.observe((send_end - enqueued_at) * 1000.0)
+                if tracer.enabled:
+                    tracer.complete('queue_wait', 'send', enqueued_at * 1e6, (send_start - enqueued_at) * 1e6)
+                    tracer.complete('ws_send', 'send', send_start * 1e6, (send_end - send_start) * 1e6, {'bytes': len(data)})
+                    tracer.counter(f'{self.name} depth', {'depth': depth}, 'send')
+            except Exception as e:
+                self.send_errors += 1
+                logger.error(f"Error sending audio data: {str(e)}")
+            finally:
+                with self._cond:
+                    self._in_flight = False
+                    self._cond.notify_all()
+        logger.debug(f"{self.name} thread stopped")
+
+    def get_stats(self) -> Dict:
+        """
+        Get queue counters
+
+        Returns:
+            Dictionary with policy, current and peak depth, sent/dropped counts
+            and the enqueue-to-wire latency histogram (ms)
+        """
+        return {
+            'policy': self.policy,
+            'depth': self.depth(),
+            'capacity': self.max_frames,
+            'peak_depth': self.peak_depth,
+            'frames_sent': self.frames_sent,
+            'bytes_sent': self.bytes_sent,
+            'frames_dropped': self.frames_dropped,
+            'bytes_dropped': self.bytes_dropped,
+            'silent_dropped': self.silent_dropped,
+            'send_errors': self.send_errors,
+            'latency_ms': self.latency_histogram.snapshot(),
+        }
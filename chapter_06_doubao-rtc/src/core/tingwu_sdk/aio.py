@@ -0,0 +1,437 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+import asyncio
+import socket
+import ssl
+import time
+import urllib.parse
+from typing import Dict, Optional
+
+import websockets
+from websockets.asyncio.client import ClientConnection
+from websockets.protocol import State
+
+from core.framer import silence_frame
+from core.tingwu_sdk.protocol import (
+    HEADERS, STATE_CONNECTING, STATE_STARTED, STATE_STREAMING, STATE_DRAINING, STATE_CLOSED,
+    start_transcription_message, stop_transcription_message
+)
+from core.tingwu_sdk.ws import TingwuSDK
+from utils.logger import logger
+
+
+class _TimedConnection(ClientConnection):
+    """ClientConnection that notes when the transport (incl. TLS) became ready"""
+    transport_ready = 0.0
+
+    def connection_made(self, transport) -> None:
+        # asyncio only calls this once the TLS handshake has completed
+        self.transport_ready = time.perf_counter()
+        super().connection_made(transport)
+
+
+class AsyncTingwuSDK(TingwuSDK):
+    """
+    asyncio transport for the Tingwu real-time API
+
+    Same create_task / start_streaming / send_audio_data / stop_streaming
+    surface as TingwuSDK, but every session is a pair of tasks on one event
+    loop instead of a run_forever thread, so a process can hold many
+    concurrent sessions. Message handling and callbacks are shared with
+    TingwuSDK and run on the event loop.
+
+    send_audio_data() may be called from any thread (e.g. the capture
+    thread); coroutines on the loop can use send_audio() for backpressure.
+    Audio queued while the session is still connecting waits in the send
+    queue (oldest dropped when full) until the server acknowledges the start.
+    """
+    def __init__(self, access_key_id: str, access_key_secret: str, app_key: str,
+                 frame_ms: int = 30, send_queue_chunks: int = 64, endpoint: Optional[str] = None):
+        """
+        Initialize the SDK with credentials
+
+        Args:
+            access_key_id: Alibaba Cloud Access Key ID
+            access_key_secret: Alibaba Cloud Access Key Secret
+            app_key: Tingwu App Key from console
+            frame_ms: Duration of the audio frames sent upstream
+            send_queue_chunks: Frames buffered per session before new audio is dropped
+            endpoint: Control-plane endpoint URL (default: the Tingwu API)
+        """
+        # 断线重连由调用方（如 SessionManager）负责，这里不启用回放重连
+        super().__init__(access_key_id, access_key_secret, app_key, frame_ms=frame_ms, reconnect_attempts=0,
+                         endpoint=endpoint)
+        self.send_queue_chunks = send_queue_chunks
+
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.connection = None
+        self._send_queue: Optional[asyncio.Queue] = None
+        self._sender = None
+        self._receiver = None
+        self.queue_drops = 0
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.connected_at = None
+        self._ready_async: Optional[asyncio.Event] = None
+        self._closed_async: Optional[asyncio.Event] = None
+        self._completed_async: Optional[asyncio.Event] = None
+
+    async def create_task(self, **kwargs) -> Dict:
+        """
+        Create a Tingwu real-time transcription task without blocking the loop
+
+        Accepts the same keyword arguments as TingwuSDK.create_task; the HTTP
+        call runs in the loop's default executor on the pooled control-plane
+        connection.
+        """
+        if self.control_client is None:
+            self._init_client()
+        body = self._task_body(**kwargs)
+        logger.info(f"Creating Tingwu task with format={body['Input']['Format']}, sample_rate={body['Input']['SampleRate']}")
+        try:
+            result = await self.control_client.create_task_async(body)
+        except Exception as e:
+            logger.error(f"Error creating task: {str(e)}")
+            raise
+        return self._accept_task(result, body)
+
+    async def start_streaming(self, timeout: float = 15) -> None:
+        """
+        Open the WebSocket, send the StartTranscription handshake and start the
+        send/receive tasks
+
+        Args:
+            timeout: Seconds to wait for the connection to be established
+        """
+        if not self.task_id:
+            raise Exception("Task ID is required. Please create a task first.")
+
+        if self.is_streaming:
+            logger.warning("WebSocket is already streaming")
+            return
+
+        if not self.ws_url:
+            raise Exception("WebSocket URL is required. Please set it or create a task first.")
+
+        logger.info(f"Starting WebSocket connection to: {self.ws_url}")
+
+        # 进入 connecting 状态后即可接收音频，握手完成前缓存在发送队列中
+        self.loop = asyncio.get_running_loop()
+        self._send_queue = asyncio.Queue(maxsize=self.send_queue_chunks)
+        if self.audio_format == 'pcm':
+            self._send_queue.put_nowait(silence_frame(self.frame_ms, self.sample_rate))
+        self._set_state(STATE_CONNECTING)
+        self.is_streaming = True
+
+        self.is_ready = False
+        self._open_done.clear()
+        self._ready_async = asyncio.Event()
+        self._closed_async = asyncio.Event()
+        self._completed_async = asyncio.Event()
+        self._phases = {}
+        self._connect_start = self._phase_mark = time.perf_counter()
+        self.connect_metrics.attempts += 1
+
+        try:
+            self.connection = await asyncio.wait_for(self._connect(), timeout)
+        except BaseException as e:
+            self.connect_metrics.failures += 1
+            self.is_streaming = False
+            self._set_state(STATE_CLOSED)
+            if isinstance(e, asyncio.TimeoutError):
+                logger.error(f"WebSocket connection failed to establish within {timeout} seconds")
+                raise Exception(f"WebSocket connection failed to establish within {timeout} seconds")
+            logger.error(f"WebSocket connection failed: {str(e)}")
+            raise
+
+        self.is_connected = True
+        self._closed.clear()
+        self._open_done.set()
+        self.connected_at = time.time()
+        logger.info("WebSocket connection established")
+
+        init_json = start_transcription_message(self.task_id, self.audio_format, self.sample_rate)
+        logger.info(f"Sending initialization JSON: {init_json}")
+        await self.connection.send(init_json)
+
+        self._receiver = asyncio.create_task(self._receive_loop())
+        self._sender = asyncio.create_task(self._send_loop())
+
+        if self.on_connection_open:
+            self.on_connection_open()
+
+    async def _connect(self) -> ClientConnection:
+        """
+        Resolve, connect and upgrade step by step so each phase can be timed
+
+        Returns:
+            The open WebSocket connection
+        """
+        loop = asyncio.get_running_loop()
+        url = urllib.parse.urlparse(self.ws_url)
+        secure = url.scheme == 'wss'
+        port = url.port or (443 if secure else 80)
+
+        infos = await loop.getaddrinfo(url.hostname, port, type=socket.SOCK_STREAM)
+        self._mark_phase('dns')
+
+        error = None
+        for family, sock_type, proto, _, address in infos:
+            sock = socket.socket(family, sock_type, proto)
+            sock.setblocking(False)
+            try:
+                await loop.sock_connect(sock, address)
+                break
+            except OSError as e:
+                sock.close()
+                error = e
+        else:
+            raise error or OSError(f"Could not connect to {url.hostname}:{port}")
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._mark_phase('tcp')
+
+        # 与线程版保持一致：不验证服务器证书
+        tls = {}
+        if secure:
+            ssl_context = ssl.create_default_context()
+            ssl_context.check_hostname = False
+            ssl_context.verify_mode = ssl.CERT_NONE
+            tls = {'ssl': ssl_context, 'server_hostname': url.hostname}
+
+        connection = await websockets.connect(
+            self.ws_url,
+            sock=sock,
+            proxy=None,
+            additional_headers=HEADERS,
+            compression=None,  # PCM/Opus 音频几乎不可压缩，关闭 permessage-deflate 节省 CPU
+            ping_interval=10,
+            ping_timeout=5,
+            create_connection=_TimedConnection,
+            **tls
+        )
+        if secure:
+            self._phases['tls'] = (connection.transport_ready - self._phase_mark) * 1000.0
+            self._phase_mark = connection.transport_ready
+        self._mark_phase('upgrade')
+        return connection
+
+    def _flush_pending(self) -> None:
+        # 缓存的音频就在发送队列里，由发送任务在确认后依次发出
+        pass
+
+    def _mark_ready(self) -> None:
+        super()._mark_ready()
+        if self._ready_async is not None:
+            self._ready_async.set()
+
+    def _mark_completed(self) -> None:
+        super()._mark_completed()
+        if self._completed_async is not None:
+            self._completed_async.set()
+
+    def _mark_closed(self) -> None:
+        super()._mark_closed()
+        if self._ready_async is not None:
+            self._ready_async.set()
+            self._completed_async.set()
+            self._closed_async.set()
+
+    async def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until the server has acknowledged the transcription start
+
+        Args:
+            timeout: Maximum seconds to wait
+
+        Returns:
+            True if the session is ready, False on timeout or if the connection closed
+        """
+        if self._ready_async is None:
+            return False
+        try:
+            await asyncio.wait_for(self._ready_async.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return self.is_ready
+
+    async def wait_closed(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until the connection is closed
+
+        Args:
+            timeout: Maximum seconds to wait
+
+        Returns:
+            True if the connection is closed
+        """
+        if self._closed_async is None:
+            return True
+        try:
+            await asyncio.wait_for(self._closed_async.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def send_audio_data(self, audio_data: bytes) -> None:
+        """
+        Queue audio data for sending; safe to call from any thread
+
+        The data is copied, so pooled buffers may be reused once this returns.
+        When the session's send queue is full the frame is dropped and counted.
+
+        Args:
+            audio_data: Audio data in bytes (should match the format specified in create_task)
+        """
+        if self.state not in (STATE_CONNECTING, STATE_STARTED, STATE_STREAMING):
+            logger.error("WebSocket not connected")
+            return
+        self.loop.call_soon_threadsafe(self._enqueue, bytes(audio_data))
+
+    async def send_audio(self, audio_data: bytes) -> None:
+        """
+        Queue audio data from a coroutine, waiting while the send queue is full
+
+        Args:
+            audio_data: Audio data in bytes
+        """
+        if self.state not in (STATE_CONNECTING, STATE_STARTED, STATE_STREAMING):
+            logger.error("WebSocket not connected")
+            return
+        await self._send_queue.put(bytes(audio_data))
+
+    def _enqueue(self, data: bytes) -> None:
+        if self.state not in (STATE_CONNECTING, STATE_STARTED, STATE_STREAMING):
+            return
+        if self.state == STATE_CONNECTING and self._send_queue.full():
+            # 握手完成前保留最新的音频
+            self._send_queue.get_nowait()
+            self.pre_ready_drops += 1
+        try:
+            self._send_queue.put_nowait(data)
+        except asyncio.QueueFull:
+            self.queue_drops += 1
+
+    async def _send_loop(self) -> None:
+        """Sender task: waits for the server's acknowledgement, then writes queued
+        audio to the socket until the end-of-stream marker"""
+        try:
+            await self._ready_async.wait()
+            if not self.is_ready:
+                return
+            # Frames queued before the acknowledgement go out first (state started)
+            backlog = self._send_queue.qsize()
+            while True:
+                if backlog == 0 and self.state == STATE_STARTED:
+                    self._set_state(STATE_STREAMING)
+                data = await self._send_queue.get()
+                if data is None:
+                    break
+                await self.connection.send(data)
+                self.frames_sent += 1
+                self.bytes_sent += len(data)
+                backlog = max(0, backlog - 1)
+        except websockets.exceptions.ConnectionClosed:
+            logger.warning("WebSocket closed while sending audio data")
+        except Exception as e:
+            logger.error(f"Error sending audio data: {str(e)}")
+            if self.on_error:
+                self.on_error(e)
+
+    async def _finish_sending(self) -> None:
+        """Queue the end-of-stream marker behind the buffered audio and wait for
+        the sender to write it all"""
+        if not self._sender.done():
+            await self._send_queue.put(None)
+        await asyncio.wait({self._sender})
+
+    async def _receive_loop(self) -> None:
+        """Receiver task: feeds server messages into the shared message handler"""
+        try:
+            async for message in self.connection:
+                self._on_ws_message(self.connection, message)
+        except websockets.exceptions.ConnectionClosedError as e:
+            self._on_ws_error(self.connection, e)
+        finally:
+            self._on_ws_close(self.connection, self.connection.close_code, self.connection.close_reason)
+
+    async def stop_streaming(self, timeout: float = 5) -> None:
+        """
+        Send the queued audio, end the transcription and close the WebSocket
+
+        Args:
+            timeout: Seconds to wait for queued audio to drain, and again for
+                the server to confirm the end of the transcription
+        """
+        if not self.connection or not self.is_connected:
+            return
+
+        logger.info("Stopping WebSocket streaming")
+        was_ready = self.is_ready
+        self._set_state(STATE_DRAINING)
+        self.is_streaming = False
+        if self._sender is not None:
+            if not was_ready:
+                # 服务端尚未确认，缓存的音频不再发送
+                self._sender.cancel()
+                while not self._send_queue.empty():
+                    self._send_queue.get_nowait()
+            else:
+                try:
+                    # 结束标记排在已缓存音频之后，发送任务发完后自行退出
+                    await asyncio.wait_for(self._finish_sending(), timeout)
+                except asyncio.TimeoutError:
+                    logger.warning(f"Audio queue not drained within {timeout} seconds")
+                    self._sender.cancel()
+            await asyncio.gather(self._sender, return_exceptions=True)
+
+        try:
+            if was_ready and self.connection.state is State.OPEN:
+                await self.connection.send(stop_transcription_message(self.task_id))
+                try:
+                    await asyncio.wait_for(self._completed_async.wait(), timeout)
+                except asyncio.TimeoutError:
+                    logger.warning(f"Transcription not completed within {timeout} seconds")
+            await self.connection.close()
+            await self._receiver
+            logger.info("WebSocket streaming stopped successfully")
+        except Exception as e:
+            logger.error(f"Error stopping WebSocket streaming: {str(e)}")
+            if self.on_error:
+                self.on_error(e)
+        finally:
+            self.is_connected = False
+            if self.state != STATE_CLOSED:
+                self._set_state(STATE_CLOSED)
+
+    def get_stats(self) -> Dict:
+        """
+        Get transport counters for this session
+
+        Returns:
+            Dictionary with connection state, queue depth and sent/dropped counts
+        """
+        return {
+            'task_id': self.task_id,
+            'is_connected': self.is_connected,
+            'is_streaming': self.is_streaming,
+            'state': self.state,
+            'connected_at': self.connected_at,
+            'queue_depth': self._send_queue.qsize() if self._send_queue else 0,
+            'queue_drops': self.queue_drops,
+            'pre_ready_drops': self.pre_ready_drops,
+            'frames_sent': self.frames_sent,
+            'bytes_sent': self.bytes_sent,
+            'connect_ms': dict(self.connect_metrics.last),
+        }
+
+    async def end_task(self) -> Dict:
+        """
+        End the current task, closing the WebSocket if it is still open
+
+        Returns:
+            Dictionary containing the local end-of-task status
+        """
+        if self.connection and self.is_connected:
+            await self.stop_streaming()
+        return TingwuSDK.end_task(self)
@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+Keep-alive client for the Tingwu control-plane API
+
+Requests are signed with aliyunsdkcore's ROA signer, as AcsClient does, but
+sent over a small pool of persistent HTTPS connections instead of a fresh
+connection per call, so a process creating tasks all day pays the TCP and
+TLS handshakes once per pooled connection rather than once per task.
+"""
+
+import asyncio
+import functools
+import http.client
+import json
+import ssl
+import threading
+import time
+import urllib.parse
+from collections import deque
+from typing import Dict, Optional
+
+from aliyunsdkcore.acs_exception.exceptions import ServerException
+from aliyunsdkcore.request import RoaRequest
+
+from core.metrics import ControlPlaneMetrics
+from utils.logger import logger
+
+TINGWU_DOMAIN = 'tingwu.cn-beijing.aliyuncs.com'
+TINGWU_API_VERSION = '2023-09-30'
+TASKS_URI = '/openapi/tingwu/v2/tasks'
+
+# A pooled connection the server closed while it sat idle fails with one of
+# these on its next request
+STALE_ERRORS = (ConnectionResetError, BrokenPipeError, ConnectionAbortedError, http.client.BadStatusLine)
+
+
+class ControlPlaneClient:
+    """
+    Signed CreateTask / EndTask / GetTaskInfo calls over pooled HTTPS connections
+
+    Safe to share between threads and SDK instances: each call borrows an
+    idle connection (or opens one) and returns it afterwards. Connections
+    idle for longer than idle_timeout are closed instead of reused, and a
+    call that finds its reused connection closed by the server is retried
+    once on a new one. The *_async methods run the same calls in the event
+    loop's default executor.
+    """
+    def __init__(self,
+                 access_key_id: str,
+                 access_key_secret: str,
+                 region_id: str = 'cn-beijing',
+                 domain: str = TINGWU_DOMAIN,
+                 port: int = 443,
+                 pool_size: int = 2,
+                 timeout: float = 10.0,
+                 idle_timeout: float = 50.0,
+                 ssl_context: Optional[ssl.SSLContext] = None,
+                 use_tls: bool = True):
+        """
+        Initialize the client; no connection is opened until the first call
+
+        Args:
+            access_key_id: Alibaba Cloud Access Key ID
+            access_key_secret: Alibaba Cloud Access Key Secret
+            region_id: Region used for signing
+            domain: API host name
+            port: API port
+            pool_size: Idle connections kept for reuse
+            timeout: Socket timeout in seconds for connect and each request
+            idle_timeout: Seconds after which an idle connection is no longer reused;
+                keep it below the server's keep-alive timeout
+            ssl_context: TLS context (default: system trust store)
+            use_tls: Plain HTTP when False, e.g. against a local emulator
+        """
+        if pool_size <= 0:
+            raise ValueError("pool_size must be positive")
+
+        self.access_key_id = access_key_id
+        self.access_key_secret = access_key_secret
+        self.region_id = region_id
+        self.domain = domain
+        self.port = port
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.use_tls = use_tls
+        self.ssl_context = (ssl_context or ssl.create_default_context()) if use_tls else None
+
+        # Entries are (connection, time it was returned), most recent last
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self.metrics = ControlPlaneMetrics()
+
+    @classmethod
+    def from_endpoint(cls, access_key_id: str, access_key_secret: str, endpoint: Optional[str] = None,
+                      **kwargs) -> 'ControlPlaneClient':
+        """
+        Create a client for an endpoint URL
+
+        Args:
+            access_key_id: Alibaba Cloud Access Key ID
+            access_key_secret: Alibaba Cloud Access Key Secret
+            endpoint: 'https://host[:port]' or 'http://host[:port]' (default: the
+                Tingwu API), e.g. 'http://127.0.0.1:8766' for a local emulator
+            **kwargs: Other ControlPlaneClient arguments
+
+        Returns:
+            ControlPlaneClient
+        """
+        if not endpoint:
+            return cls(access_key_id, access_key_secret, **kwargs)
+        url = urllib.parse.urlparse(endpoint if '://' in endpoint else 'https://' + endpoint)
+        if url.scheme not in ('http', 'https') or not url.hostname:
+            raise ValueError(f"Unsupported control-plane endpoint: {endpoint}")
+        use_tls = url.scheme == 'https'
+        return cls(access_key_id, access_key_secret, domain=url.hostname, port=url.port or (443 if use_tls else 80),
+                   use_tls=use_tls, **kwargs)
+
+    def _acquire(self, fresh: bool = False):
+        """
+        Borrow a pooled connection, or open a new one
+
+        Args:
+            fresh: Skip the pool and always open a new connection
+
+        Returns:
+            (connection, whether it was reused)
+        """
+        now = time.monotonic()
+        with self._lock:
+            while self._idle and not fresh:
+                conn, returned_at = self._idle.pop()
+                if now - returned_at < self.idle_timeout:
+                    self.metrics.connections_reused += 1
+                    return conn, True
+                conn.close()
+                self.metrics.connections_expired += 1
+
+        if self.use_tls:
+            conn = http.client.HTTPSConnection(self.domain, self.port, timeout=self.timeout, context=self.ssl_context)
+        else:
+            conn = http.client.HTTPConnection(self.domain, self.port, timeout=self.timeout)
+        start = time.perf_counter()
+        conn.connect()
+        self.metrics.connect_histogram.observe((time.perf_counter() - start) * 1000.0)
+        self.metrics.connections_opened += 1
+        logger.debug(f"Control-plane connection opened to {self.domain}:{self.port}")
+        return conn, False
+
+    def _release(self, conn) -> None:
+        """Return a connection to the pool, closing it if the pool is full"""
+        with self._lock:
+            if len(self._idle) < self.pool_size:
+                self._idle.append((conn, time.monotonic()))
+                return
+        conn.close()
+
+    def _send(self, method: str, path: str, content: Optional[bytes], headers: Dict):
+        """Send one request on a pooled connection; returns (status, body)"""
+        for attempt in range(2):
+            conn, reused = self._acquire(fresh=attempt > 0)
+            try:
+                conn.request(method, path, body=content, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+            except STALE_ERRORS:
+                conn.close()
+                if reused and attempt == 0:
+                    self.metrics.stale_retries += 1
+                    logger.debug("Pooled control-plane connection was closed by the server, retrying")
+                    continue
+                raise
+            except Exception:
+                conn.close()
+                raise
+
+            if response.will_close:
+                conn.close()
+            else:
+                self._release(conn)
+            return response.status, data
+
+    def request(self, operation: str, method: str, uri: str, query: Optional[Dict] = None,
+                body: Optional[Dict] = None, action: Optional[str] = None) -> Dict:
+        """
+        Sign and send one control-plane request
+
+        Args:
+            operation: Name the call is timed under
+            method: HTTP method
+            uri: Request path without the query string
+            query: Query parameters
+            body: JSON request body
+            action: API action for the signature (default: operation)
+
+        Returns:
+            The decoded JSON response
+
+        Raises:
+            ServerException: If the service answers with an HTTP error
+        """
+        request = RoaRequest('tingwu', TINGWU_API_VERSION, action or operation, method=method, uri_pattern=uri)
+        request.set_accept_format('JSON')
+        for key, value in (query or {}).items():
+            request.add_query_param(key, value)
+        content = None
+        if body is not None:
+            content = json.dumps(body).encode('utf-8')
+            request.add_header('Content-Type', 'application/json')
+            request.set_content(content)
+        headers = request.get_signed_header(self.region_id, self.access_key_id, self.access_key_secret)
+        path = request.get_url(self.region_id)
+
+        start = time.perf_counter()
+        try:
+            status, data = self._send(method, path, content, headers)
+        except Exception:
+            self.metrics.observe(operation, (time.perf_counter() - start) * 1000.0, ok=False)
+            raise
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+
+        try:
+            result = json.loads(data) if data else {}
+        except ValueError:
+            result = {'Message': data.decode('utf-8', 'replace')}
+        if status >= 400:
+            self.metrics.observe(operation, elapsed_ms, ok=False)
+            raise ServerException(result.get('Code', f'HTTP{status}'), result.get('Message', ''),
+                                  status, result.get('RequestId'))
+        self.metrics.observe(operation, elapsed_ms)
+        logger.debug(f"{operation} completed in {elapsed_ms:.1f} ms")
+        return result
+
+    def create_task(self, body: Dict) -> Dict:
+        """
+        Create a real-time task
+
+        Args:
+            body: CreateTask request body (AppKey, Input, Parameters)
+
+        Returns:
+            The API response; Data holds TaskId and MeetingJoinUrl
+        """
+        return self.request('CreateTask', 'PUT', TASKS_URI, query={'type': 'realtime'}, body=body)
+
+    def end_task(self, app_key: str, task_id: str) -> Dict:
+        """
+        Stop a real-time task
+
+        Args:
+            app_key: Tingwu App Key the task was created with
+            task_id: Task to stop
+
+        Returns:
+            The API response
+        """
+        return self.request('EndTask', 'PUT', TASKS_URI, query={'type': 'realtime', 'operation': 'stop'},
+                            body={'AppKey': app_key, 'Input': {'TaskId': task_id}}, action='CreateTask')
+
+    def get_task_info(self, task_id: str) -> Dict:
+        """
+        Query a task's status
+
+        Args:
+            task_id: Task to query
+
+        Returns:
+            The API response; Data holds TaskStatus and the result URLs
+        """
+        return self.request('GetTaskInfo', 'GET', f'{TASKS_URI}/{task_id}')
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(func, *args))
+
+    async def create_task_async(self, body: Dict) -> Dict:
+        """create_task without blocking the event loop"""
+        return await self._run(self.create_task, body)
+
+    async def end_task_async(self, app_key: str, task_id: str) -> Dict:
+        """end_task without blocking the event loop"""
+        return await self._run(self.end_task, app_key, task_id)
+
+    async def get_task_info_async(self, task_id: str) -> Dict:
+        """get_task_info without blocking the event loop"""
+        return await self._run(self.get_task_info, task_id)
+
+    def close(self) -> None:
+        """Close every idle connection; later calls open new ones"""
+        with self._lock:
+            while self._idle:
+                self._idle.pop()[0].close()
+
+    def get_stats(self) -> Dict:
+        """
+        Get control-plane counters
+
+        Returns:
+            Dictionary as returned by ControlPlaneMetrics.snapshot(), plus the
+            number of idle pooled connections
+        """
+        stats = self.metrics.snapshot()
+        stats['idle_connections'] = len(self._idle)
+        return stats
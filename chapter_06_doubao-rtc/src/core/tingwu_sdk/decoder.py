@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+Decoding of Tingwu real-time server events into typed objects
+
+Each message is parsed once with the fastest JSON backend available and
+turned into a ServerEvent, or a TranscriptionResult for the high-rate result
+messages, through a table keyed by the header name.
+"""
+
+import json
+from typing import Callable, Dict, Optional
+
+try:
+    import orjson
+except ImportError:  # optional dependency, falls back to ujson or the standard library
+    orjson = None
+
+try:
+    import ujson
+except ImportError:  # optional dependency
+    ujson = None
+
+if orjson is not None:
+    loads = orjson.loads
+    JSON_BACKEND = 'orjson'
+elif ujson is not None:
+    loads = ujson.loads
+    JSON_BACKEND = 'ujson'
+else:
+    loads = json.loads
+    JSON_BACKEND = 'json'
+
+# Result messages: partial hypotheses and the final text of a sentence
+RESULT_NAMES = ('TranscriptionResultChanged', 'SentenceEnd')
+
+
+class ServerEvent:
+    """A server message other than a transcription result"""
+    __slots__ = ('namespace', 'name', 'status', 'message', 'payload')
+
+    def __init__(self, namespace: str, name: str, status: int, message: str, payload: Dict):
+        self.namespace = namespace
+        self.name = name
+        self.status = status
+        self.message = message
+        self.payload = payload
+
+    def __repr__(self) -> str:
+        return f"ServerEvent({self.namespace}.{self.name}, status={self.status})"
+
+
+class TranscriptionResult(ServerEvent):
+    """A partial or final transcription result"""
+    __slots__ = ('text', 'is_final', 'confidence', 'index', 'time_ms', 'begin_time_ms')
+
+    def __init__(self, namespace: str, name: str, status: int, message: str, payload: Dict):
+        super().__init__(namespace, name, status, message, payload)
+        self.text = payload.get('result')
+        self.is_final = name == 'SentenceEnd' or payload.get('is_final', False)
+        self.confidence = payload.get('confidence', 0)
+        self.index = payload.get('index')
+        # Offsets in ms on the connection's audio timeline
+        self.time_ms = payload.get('time')
+        self.begin_time_ms = payload.get('begin_time')
+
+    def __repr__(self) -> str:
+        return f"TranscriptionResult({self.name}, index={self.index}, final={self.is_final}, text={self.text!r})"
+
+
+# Event class per header name; everything else becomes a plain ServerEvent
+EVENT_TYPES: Dict[str, Callable[..., ServerEvent]] = {name: TranscriptionResult for name in RESULT_NAMES}
+
+
+def decode_message(message) -> Optional[ServerEvent]:
+    """
+    Parse one text frame from the server
+
+    Args:
+        message: JSON text (str or bytes)
+
+    Returns:
+        The typed event, or None if the message has no header
+
+    Raises:
+        ValueError: If the message is not valid JSON
+    """
+    data = loads(message)
+    header = data.get('header') if isinstance(data, dict) else None
+    if header is None:
+        return None
+    name = header.get('name', '')
+    return EVENT_TYPES.get(name, ServerEvent)(header.get('namespace', ''), name, header.get('status', 0),
+                                             header.get('message', ''), data.get('payload') or {})
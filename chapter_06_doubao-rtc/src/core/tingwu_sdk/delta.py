@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+Incremental encoding of partial transcription results
+
+Every partial the service sends repeats the whole sentence so far. A
+ResultDelta describes only what changed against the previous partial of the
+same sentence: how many leading characters are kept, and the text that
+replaces everything after them. Applying the deltas in order rebuilds the
+full text.
+"""
+
+import json
+from typing import Dict, Optional
+
+
+def common_prefix_length(a: str, b: str) -> int:
+    """Number of leading characters two strings share"""
+    if b.startswith(a):
+        return len(a)  # the common case: the recogniser only appended text
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+class ResultDelta:
+    """Change of one sentence's text against its previous partial"""
+    __slots__ = ('index', 'keep', 'removed', 'text', 'is_final')
+
+    def __init__(self, index, keep: int, removed: int, text: str, is_final: bool):
+        self.index = index        # sentence index from the service
+        self.keep = keep          # characters of the previous text that stay
+        self.removed = removed    # characters of the previous text replaced after `keep`
+        self.text = text          # new text following the kept prefix
+        self.is_final = is_final
+
+    def apply(self, previous: str) -> str:
+        """
+        Rebuild the sentence text from the previous one
+
+        Args:
+            previous: Text of the same sentence before this delta ('' for a new sentence)
+
+        Returns:
+            The updated text
+        """
+        return previous[:self.keep] + self.text
+
+    def to_dict(self) -> Dict:
+        return {'type': 'result_delta', 'index': self.index, 'keep': self.keep,
+                'text': self.text, 'final': self.is_final}
+
+    def to_json(self) -> str:
+        """Compact JSON for forwarding to display clients"""
+        return json.dumps(self.to_dict(), ensure_ascii=False, separators=(',', ':'))
+
+    def __repr__(self) -> str:
+        return f"ResultDelta(index={self.index}, keep={self.keep}, removed={self.removed}, text={self.text!r}, final={self.is_final})"
+
+
+class ResultDeltaTracker:
+    """
+    Turns the stream of full-text results into deltas
+
+    Keeps the text of the sentence in progress; a result with a different
+    sentence index starts again from empty text.
+    """
+    def __init__(self):
+        self._index = None
+        self._text = ''
+        self.results = 0
+        self.unchanged = 0
+        self.chars_in = 0
+        self.chars_out = 0
+
+    def update(self, index, text: str, is_final: bool) -> Optional[ResultDelta]:
+        """
+        Diff a result against the previous partial of the same sentence
+
+        Args:
+            index: Sentence index of the result (None if the service gave none)
+            text: Full text of the sentence so far
+            is_final: Whether this is the sentence's final text
+
+        Returns:
+            The delta, or None for a partial identical to the previous one
+        """
+        previous = self._text if index == self._index else ''
+        keep = common_prefix_length(previous, text)
+        self.results += 1
+        self.chars_in += len(text)
+        if not is_final and keep == len(previous) == len(text):
+            self.unchanged += 1
+            return None
+
+        self._index = index
+        self._text = '' if is_final else text
+        self.chars_out += len(text) - keep
+        return ResultDelta(index, keep, len(previous) - keep, text[keep:], is_final)
+
+    def reset(self) -> None:
+        """Forget the sentence in progress"""
+        self._index = None
+        self._text = ''
+
+    def get_stats(self) -> Dict:
+        """
+        Get delta counters
+
+        Returns:
+            Dictionary with result count, unchanged partials skipped and the
+            characters received vs. forwarded
+        """
+        return {
+            'results': self.results,
+            'unchanged': self.unchanged,
+            'chars_in': self.chars_in,
+            'chars_out': self.chars_out,
+            'saved': 1.0 - self.chars_out / self.chars_in if self.chars_in else 0.0,
+        }
@@ -0,0 +1,514 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+Local stand-in for the Tingwu real-time service
+
+Serves the two endpoints the SDKs talk to, so sessions can be exercised
+without the cloud (CI, load tests, reproducible benchmarks):
+
+    HTTP       CreateTask / EndTask / GetTaskInfo on /openapi/tingwu/v2/tasks,
+               answering with a MeetingJoinUrl that points at the emulator
+    WebSocket  the real-time meeting protocol: StartTranscription ->
+               TranscriptionStarted, binary audio in, SentenceBegin /
+               TranscriptionResultChanged / SentenceEnd out, StopTranscription
+               -> TranscriptionCompleted, and TaskFailed
+
+Results are scripted on the audio timeline: sentences of sentence_ms audio
+separated by gap_ms, with a partial every partial_interval_ms. Each message
+leaves latency_ms (+/- jitter_ms) after the audio that triggered it arrived.
+loss_rate models a lost TCP segment: the message is held back by
+retransmit_ms and everything queued behind it waits too. Sessions can be
+dropped after disconnect_after_s and tasks failed at start with fail_rate.
+Signatures are not checked.
+
+Run standalone from the src directory:
+    python -m core.tingwu_sdk.emulator [--http-port 8766] [--ws-port 8767]
+
+then point an SDK at it with endpoint='http://127.0.0.1:8766'.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+import urllib.parse
+import uuid
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Sequence
+
+import websockets
+
+from core.tingwu_sdk.control import TASKS_URI
+from core.tingwu_sdk.protocol import NAMESPACE, STATUS_OK
+from utils.logger import logger
+
+WS_PATH = '/api/ws/v1'
+
+# Header status of a TaskFailed sent by the emulator
+STATUS_TASK_FAILED = 40000004
+
+# Sentences the emulator "recognizes", in turn
+TEXTS = (
+    '今天下午三点在二号会议室讨论下个季度的预算安排',
+    '请大家提前准备好各自部门的数据',
+    '会议结束后我会把纪要发到群里',
+    '如果有问题可以随时联系我',
+)
+
+
+class _EmulatedSession:
+    """State of one WebSocket connection"""
+    def __init__(self, emulator: 'TingwuEmulator', connection, task: Dict, rng: random.Random):
+        self.emulator = emulator
+        self.connection = connection
+        self.task = task
+        self.rng = rng
+        self.loop = asyncio.get_running_loop()
+        self.outbox = asyncio.Queue()
+        self.header_task_id = task['task_id']
+        self.audio_format = task['format']
+        self.sample_rate = task['sample_rate']
+        self.started = False
+
+        # Audio timeline (ms) and the sentence being recognized
+        self.offset_ms = 0.0
+        self.index = 0
+        self.sentence = None  # (begin_ms, end_ms, text) while a sentence is open
+        self.next_begin_ms = emulator.gap_ms
+        self.next_partial_ms = 0.0
+        self._last_due = 0.0
+
+    async def run(self) -> None:
+        sender = asyncio.create_task(self._send_loop())
+        timer = None
+        if self.emulator.disconnect_after_s:
+            timer = asyncio.create_task(self._disconnect_later(self.emulator.disconnect_after_s))
+        try:
+            async for message in self.connection:
+                if isinstance(message, str):
+                    self._on_text(message)
+                elif self.started:
+                    self._on_audio(message)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            tasks = [task for task in (sender, timer) if task]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _schedule(self, name: str, payload: Dict, status: int = STATUS_OK, status_text: str = 'Gateway:SUCCESS:Success.') -> None:
+        """Queue a message for delivery after the emulated server latency"""
+        emulator = self.emulator
+        delay_ms = max(0.0, emulator.latency_ms + self.rng.uniform(-emulator.jitter_ms, emulator.jitter_ms))
+        # Messages share one ordered stream: a late one holds back those behind it
+        due = max(self.loop.time() + delay_ms / 1000.0, self._last_due)
+        if emulator.loss_rate and self.rng.random() < emulator.loss_rate:
+            due += emulator.retransmit_ms / 1000.0
+            emulator.stats['retransmits'] += 1
+        self._last_due = due
+        message = json.dumps({
+            'header': {'namespace': NAMESPACE, 'name': name, 'status': status, 'status_text': status_text,
+                       'message_id': uuid.uuid4().hex, 'task_id': self.header_task_id},
+            'payload': payload,
+        }, ensure_ascii=False)
+        self.outbox.put_nowait((due, message))
+
+    async def _send_loop(self) -> None:
+        try:
+            while True:
+                due, message = await self.outbox.get()
+                delay = due - self.loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if message is None:
+                    await self.connection.close()
+                    return
+                await self.connection.send(message)
+                self.emulator.stats['messages_sent'] += 1
+        except websockets.ConnectionClosed:
+            pass
+
+    async def _disconnect_later(self, seconds: float) -> None:
+        await asyncio.sleep(seconds)
+        self.emulator.stats['forced_disconnects'] += 1
+        logger.info(f"Emulator dropping session of task {self.task['task_id']}")
+        if self.emulator.disconnect_abrupt:
+            self.connection.transport.abort()  # the client sees 1006, as on a network failure
+        else:
+            await self.connection.close(1011, 'Emulated server disconnect')
+
+    def _on_text(self, message: str) -> None:
+        try:
+            data = json.loads(message)
+            header = data['header']
+        except (ValueError, KeyError, TypeError):
+            logger.warning(f"Emulator received an invalid message: {message[:200]}")
+            return
+        name = header.get('name')
+        payload = data.get('payload') or {}
+
+        if name == 'StartTranscription':
+            self.header_task_id = header.get('task_id') or payload.get('task_id') or self.header_task_id
+            self.audio_format = payload.get('format', self.audio_format)
+            self.sample_rate = payload.get('sample_rate', self.sample_rate)
+            if self.emulator.fail_rate and self.rng.random() < self.emulator.fail_rate:
+                self.emulator.stats['tasks_failed'] += 1
+                self._schedule('TaskFailed', {}, STATUS_TASK_FAILED, 'Emulator:FAILED:Injected task failure.')
+                # The service closes the connection after a TaskFailed
+                self.outbox.put_nowait((self._last_due, None))
+                return
+            self.started = True
+            self.task['status'] = 'ONGOING'
+            self._schedule('TranscriptionStarted', {'session_id': uuid.uuid4().hex})
+        elif name == 'StopTranscription':
+            if self.sentence is not None:
+                # The last sentence ends where the audio ends
+                begin_ms, _, text = self.sentence
+                self._sentence_end(begin_ms, self.offset_ms, text)
+            self.started = False
+            self._schedule('TranscriptionCompleted', {})
+
+    def _on_audio(self, data: bytes) -> None:
+        self.emulator.stats['audio_bytes'] += len(data)
+        if self.audio_format == 'pcm':
+            duration_ms = len(data) * 1000.0 / (2 * self.sample_rate)
+        else:
+            # Compressed frames carry no length we can read cheaply
+            duration_ms = self.emulator.frame_ms
+        self._advance(duration_ms)
+
+    def _advance(self, duration_ms: float) -> None:
+        """Emit every event whose offset the audio has now passed"""
+        emulator = self.emulator
+        self.offset_ms += duration_ms
+        end = self.offset_ms
+        while True:
+            if self.sentence is None:
+                if end < self.next_begin_ms:
+                    return
+                self.index += 1
+                begin_ms = self.next_begin_ms
+                self.sentence = (begin_ms, begin_ms + emulator.sentence_ms, self.rng.choice(emulator.texts))
+                self.next_partial_ms = begin_ms + emulator.partial_interval_ms
+                self._schedule('SentenceBegin', {'index': self.index, 'time': int(begin_ms)})
+
+            begin_ms, end_ms, text = self.sentence
+            while self.next_partial_ms < min(end, end_ms):
+                shown = max(1, round(len(text) * (self.next_partial_ms - begin_ms) / emulator.sentence_ms))
+                self._schedule('TranscriptionResultChanged', {
+                    'index': self.index, 'time': int(self.next_partial_ms), 'begin_time': int(begin_ms),
+                    'result': text[:shown], 'confidence': 0.0, 'words': [], 'status': 0})
+                self.next_partial_ms += emulator.partial_interval_ms
+            if end < end_ms:
+                return
+            self._sentence_end(begin_ms, end_ms, text)
+
+    def _sentence_end(self, begin_ms: float, end_ms: float, text: str) -> None:
+        self._schedule('SentenceEnd', {
+            'index': self.index, 'time': int(end_ms), 'begin_time': int(begin_ms),
+            'result': text, 'confidence': 0.95, 'words': [], 'status': 0, 'stash_result': {}})
+        self.emulator.stats['sentences'] += 1
+        self.sentence = None
+        self.next_begin_ms = end_ms + self.emulator.gap_ms
+
+
+class TingwuEmulator:
+    """
+    Control-plane HTTP server plus real-time WebSocket server on background threads
+
+    The WebSocket side runs on one asyncio loop, so a single emulator holds
+    hundreds of concurrent sessions. Use as a context manager or call
+    start()/stop(); ports 0 pick free ports, read back from http_port/ws_port.
+    """
+    def __init__(self,
+                 host: str = '127.0.0.1',
+                 http_port: int = 8766,
+                 ws_port: int = 8767,
+                 sentence_ms: float = 3000.0,
+                 gap_ms: float = 500.0,
+                 partial_interval_ms: float = 200.0,
+                 latency_ms: float = 150.0,
+                 jitter_ms: float = 30.0,
+                 loss_rate: float = 0.0,
+                 retransmit_ms: float = 200.0,
+                 disconnect_after_s: Optional[float] = None,
+                 disconnect_abrupt: bool = True,
+                 fail_rate: float = 0.0,
+                 create_latency_ms: float = 0.0,
+                 frame_ms: float = 20.0,
+                 texts: Sequence[str] = TEXTS,
+                 seed: Optional[int] = None):
+        """
+        Configure the emulator; nothing listens until start()
+
+        Args:
+            host: Interface to listen on
+            http_port: Control-plane port (0 for any free port)
+            ws_port: WebSocket port (0 for any free port)
+            sentence_ms: Audio per emulated sentence
+            gap_ms: Audio between sentences (and before the first)
+            partial_interval_ms: Audio between TranscriptionResultChanged messages
+            latency_ms: Delay from the triggering audio to each message
+            jitter_ms: Uniform +/- variation of latency_ms
+            loss_rate: Probability that a message is delayed by a retransmission
+            retransmit_ms: Extra delay of such a message (and those queued behind it)
+            disconnect_after_s: Drop every session this long after it connected
+            disconnect_abrupt: Abort the TCP connection (client sees 1006) instead
+                of closing with code 1011
+            fail_rate: Probability that StartTranscription is answered with TaskFailed
+            create_latency_ms: Processing time of each control-plane call
+            frame_ms: Duration assumed per binary message for compressed formats
+            texts: Sentences returned as results
+            seed: Random seed for reproducible jitter, loss and texts
+        """
+        self.host = host
+        self.http_port = http_port
+        self.ws_port = ws_port
+        self.sentence_ms = sentence_ms
+        self.gap_ms = gap_ms
+        self.partial_interval_ms = partial_interval_ms
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.loss_rate = loss_rate
+        self.retransmit_ms = retransmit_ms
+        self.disconnect_after_s = disconnect_after_s
+        self.disconnect_abrupt = disconnect_abrupt
+        self.fail_rate = fail_rate
+        self.create_latency_ms = create_latency_ms
+        self.frame_ms = frame_ms
+        self.texts = tuple(texts)
+        self.seed = seed
+
+        # token (mc query parameter of the join URL) -> task
+        self.tasks: Dict[str, Dict] = {}
+        self._tasks_lock = threading.Lock()
+        self._sessions_started = 0
+        self.stats = {
+            'tasks_created': 0, 'tasks_failed': 0, 'sessions_total': 0, 'sessions_active': 0,
+            'audio_bytes': 0, 'messages_sent': 0, 'sentences': 0, 'retransmits': 0, 'forced_disconnects': 0,
+        }
+
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._ws_server = None
+        self._ws_thread = None
+        self._http_server = None
+        self._http_thread = None
+
+    @property
+    def endpoint(self) -> str:
+        """Control-plane endpoint URL to pass to the SDKs"""
+        return f"http://{self.host}:{self.http_port}"
+
+    def start(self) -> 'TingwuEmulator':
+        """
+        Start both servers and wait until they listen
+
+        Returns:
+            self
+        """
+        self._http_server = ThreadingHTTPServer((self.host, self.http_port), self._http_handler())
+        self._http_server.daemon_threads = True
+        self.http_port = self._http_server.server_address[1]
+        self._http_thread = threading.Thread(target=self._http_server.serve_forever, name='tingwu-emulator-http',
+                                             daemon=True)
+        self._http_thread.start()
+
+        # The server is started on its own loop thread, so start() also works
+        # from a coroutine (e.g. a test driving AsyncTingwuSDK)
+        self.loop = asyncio.new_event_loop()
+        self._ws_thread = threading.Thread(target=self.loop.run_forever, name='tingwu-emulator-ws', daemon=True)
+        self._ws_thread.start()
+        self._ws_server = asyncio.run_coroutine_threadsafe(self._serve(), self.loop).result(10)
+        self.ws_port = self._ws_server.sockets[0].getsockname()[1]
+
+        logger.info(f"Tingwu emulator listening: control plane {self.endpoint}, "
+                    f"WebSocket ws://{self.host}:{self.ws_port}{WS_PATH}")
+        return self
+
+    async def _serve(self):
+        return await websockets.serve(self._handle, self.host, self.ws_port, process_request=self._check_token,
+                                      compression=None)
+
+    def stop(self) -> None:
+        """Close every session and both servers"""
+        if self._http_server is not None:
+            self._http_server.shutdown()
+            self._http_server.server_close()
+            self._http_server = None
+        if self.loop is not None:
+            async def close():
+                self._ws_server.close()
+                await self._ws_server.wait_closed()
+
+            asyncio.run_coroutine_threadsafe(close(), self.loop).result(10)
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._ws_thread.join(timeout=5)
+            self.loop.close()
+            self.loop = None
+        logger.info("Tingwu emulator stopped")
+
+    def __enter__(self) -> 'TingwuEmulator':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def get_stats(self) -> Dict:
+        """
+        Get emulator counters
+
+        Returns:
+            Dictionary with tasks created/failed, sessions (total and active),
+            audio bytes received, messages and sentences sent, injected
+            retransmissions and forced disconnects
+        """
+        return dict(self.stats)
+
+    # ---- control plane ----
+
+    def create_task(self, body: Dict) -> Dict:
+        """Register a task and return the CreateTask response"""
+        task_input = body.get('Input') or {}
+        token = uuid.uuid4().hex
+        task = {
+            'task_id': uuid.uuid4().hex,
+            'format': task_input.get('Format', 'pcm'),
+            'sample_rate': task_input.get('SampleRate', 16000),
+            'status': 'NEW',
+        }
+        with self._tasks_lock:
+            self.tasks[token] = task
+            self.stats['tasks_created'] += 1
+        join_url = f"ws://{self.host}:{self.ws_port}{WS_PATH}?mc={token}"
+        return {'Code': '0', 'Message': 'success', 'RequestId': uuid.uuid4().hex,
+                'Data': {'TaskId': task['task_id'], 'TaskKey': task_input.get('TaskKey'), 'MeetingJoinUrl': join_url}}
+
+    def _find_task(self, task_id: str) -> Optional[Dict]:
+        with self._tasks_lock:
+            return next((task for task in self.tasks.values() if task['task_id'] == task_id), None)
+
+    def _http_handler(self):
+        emulator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, as the pooled client expects
+
+            def _reply(self, status: int, body: Dict) -> None:
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json;charset=utf-8')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _error(self, status: int, code: str, message: str) -> None:
+                self._reply(status, {'Code': code, 'Message': message, 'RequestId': uuid.uuid4().hex})
+
+            def _read_body(self) -> Dict:
+                length = int(self.headers.get('Content-Length') or 0)
+                return json.loads(self.rfile.read(length)) if length else {}
+
+            def do_PUT(self):
+                url = urllib.parse.urlparse(self.path)
+                query = urllib.parse.parse_qs(url.query)
+                body = self._read_body()
+                if emulator.create_latency_ms:
+                    time.sleep(emulator.create_latency_ms / 1000.0)
+                if url.path != TASKS_URI or query.get('type') != ['realtime']:
+                    return self._error(404, 'InvalidApi.NotFound', f'Unknown API: {self.command} {url.path}')
+                if not body.get('AppKey'):
+                    return self._error(400, 'BRK.InvalidAppKey', 'AppKey is required')
+                if query.get('operation') == ['stop']:
+                    task = emulator._find_task((body.get('Input') or {}).get('TaskId', ''))
+                    if task is None:
+                        return self._error(404, 'BRK.TaskNotFound', 'Task not found')
+                    task['status'] = 'COMPLETED'
+                    return self._reply(200, {'Code': '0', 'Message': 'success', 'RequestId': uuid.uuid4().hex,
+                                             'Data': {'TaskId': task['task_id'], 'TaskStatus': 'COMPLETED'}})
+                self._reply(200, emulator.create_task(body))
+
+            def do_GET(self):
+                path = urllib.parse.urlparse(self.path).path
+                task = emulator._find_task(path[len(TASKS_URI) + 1:]) if path.startswith(TASKS_URI + '/') else None
+                if task is None:
+                    return self._error(404, 'BRK.TaskNotFound', 'Task not found')
+                self._reply(200, {'Code': '0', 'Message': 'success', 'RequestId': uuid.uuid4().hex,
+                                  'Data': {'TaskId': task['task_id'], 'TaskStatus': task['status']}})
+
+            def log_message(self, format, *args):
+                logger.debug(f"Emulator HTTP: {format % args}")
+
+        return Handler
+
+    # ---- real-time WebSocket ----
+
+    def _check_token(self, connection, request):
+        """Refuse the handshake for unknown join URLs, as the service does"""
+        # The NLS SDK adds a second, fixed Sec-WebSocket-Key/Version after the
+        # generated ones; the service uses the first, websockets would refuse both
+        for name in ('Sec-WebSocket-Key', 'Sec-WebSocket-Version'):
+            values = request.headers.get_all(name)
+            if len(values) > 1:
+                del request.headers[name]
+                request.headers[name] = values[0]
+        url = urllib.parse.urlparse(request.path)
+        token = urllib.parse.parse_qs(url.query).get('mc', [None])[0]
+        if url.path != WS_PATH or token not in self.tasks:
+            return connection.respond(HTTPStatus.FORBIDDEN, 'Invalid meeting join URL\n')
+        return None
+
+    async def _handle(self, connection) -> None:
+        token = urllib.parse.parse_qs(urllib.parse.urlparse(connection.request.path).query)['mc'][0]
+        self._sessions_started += 1
+        rng = random.Random(None if self.seed is None else self.seed + self._sessions_started)
+        self.stats['sessions_total'] += 1
+        self.stats['sessions_active'] += 1
+        try:
+            await _EmulatedSession(self, connection, self.tasks[token], rng).run()
+        finally:
+            self.stats['sessions_active'] -= 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Tingwu real-time service")
+    parser.add_argument('--host', default='127.0.0.1', help='Interface to listen on')
+    parser.add_argument('--http-port', type=int, default=8766, help='Control-plane (CreateTask) port')
+    parser.add_argument('--ws-port', type=int, default=8767, help='Real-time WebSocket port')
+    parser.add_argument('--sentence-ms', type=float, default=3000.0, help='Audio per emulated sentence')
+    parser.add_argument('--gap-ms', type=float, default=500.0, help='Audio between sentences')
+    parser.add_argument('--partial-interval-ms', type=float, default=200.0, help='Audio between partial results')
+    parser.add_argument('--latency-ms', type=float, default=150.0, help='Server latency of each message')
+    parser.add_argument('--jitter-ms', type=float, default=30.0, help='+/- variation of the latency')
+    parser.add_argument('--loss-rate', type=float, default=0.0, help='Probability a message needs a retransmission')
+    parser.add_argument('--retransmit-ms', type=float, default=200.0, help='Delay added by a retransmission')
+    parser.add_argument('--disconnect-after', type=float, default=None, help='Drop sessions after this many seconds')
+    parser.add_argument('--clean-disconnect', action='store_true', help='Close dropped sessions with 1011 instead of aborting')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='Probability StartTranscription fails with TaskFailed')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed')
+    args = parser.parse_args()
+
+    emulator = TingwuEmulator(args.host, args.http_port, args.ws_port,
+                              sentence_ms=args.sentence_ms, gap_ms=args.gap_ms,
+                              partial_interval_ms=args.partial_interval_ms,
+                              latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                              loss_rate=args.loss_rate, retransmit_ms=args.retransmit_ms,
+                              disconnect_after_s=args.disconnect_after, disconnect_abrupt=not args.clean_disconnect,
+                              fail_rate=args.fail_rate, seed=args.seed)
+    with emulator:
+        print(f"Control plane: {emulator.endpoint}  (pass as endpoint= / --endpoint)")
+        print(f"WebSocket:     ws://{emulator.host}:{emulator.ws_port}{WS_PATH}")
+        try:
+            while True:
+                time.sleep(10)
+                print(f"Emulator: {emulator.get_stats()}")
+        except KeyboardInterrupt:
+            print("\nStopping...")
+
+
+if __name__ == '__main__':
+    main()
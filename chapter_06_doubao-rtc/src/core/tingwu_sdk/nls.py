@@ -6,15 +6,21 @@
 基于 alibaba-nls-python-sdk 中的 NlsSpeechTranscriber 类
 """
 
+import threading
 import time
 import json
 import urllib.parse
 from typing import Dict, Optional, Callable, List
 
 import nls
-from aliyunsdkcore.client import AcsClient
-from aliyunsdkcore.request import CommonRequest
 
+from core.audio_clock import AudioOffsetClock
+from core.metrics import ConnectMetrics
+from core.quantile import WindowedQuantileSketch
+from core.send_queue import AudioSendQueue
+from core.tingwu_sdk.control import ControlPlaneClient
+from core.tingwu_sdk.delta import ResultDeltaTracker
+from core.tracing import tracer
 from utils.logger import Logger
 
 logger = Logger().logger
@@ -22,7 +28,9 @@ logger = Logger().logger
 class TingwuNlsSDK:
     """通义听悟SDK基于阿里云官方NLS SDK的实现"""
     
-    def __init__(self, access_key_id: str, access_key_secret: str, app_key: str):
+    def __init__(self, access_key_id: str, access_key_secret: str, app_key: str,
+                 send_queue_frames: int = 50, send_policy: str = 'drop_oldest', frame_ms: int = 20,
+                 endpoint: Optional[str] = None):
         """
         初始化通义听悟SDK
         
@@ -30,13 +38,23 @@ class TingwuNlsSDK:
             access_key_id: 阿里云AccessKey ID
             access_key_secret: 阿里云AccessKey Secret
             app_key: 通义听悟 AppKey
+            send_queue_frames: 上行音频队列容量（帧）
+            send_policy: 队列满时的处理策略：'block'、'drop_oldest' 或 'skip_silence'
+            frame_ms: 压缩格式（如opus）每帧的时长，用于推算音频偏移；PCM按字节数计算
+            endpoint: 管控接口地址（默认通义听悟线上接口），如本地模拟服务 'http://127.0.0.1:8766'
         """
         self.access_key_id = access_key_id
         self.access_key_secret = access_key_secret
         self.app_key = app_key
+        self.endpoint = endpoint
+        self.frame_ms = frame_ms
+        
+        # 任务协商的音频格式，由 create_task 填写
+        self.audio_format = 'pcm'
+        self.sample_rate = 16000
         
         # 初始化相关变量
-        self.acs_client = None
+        self.control_client = None
         self.transcriber = None
         self.task_id = None
         self.ws_url = None
@@ -51,18 +69,27 @@ class TingwuNlsSDK:
         self.on_error = None
         self.on_connection_open = None
         self.on_connection_close = None
+        self.on_result_delta = None  # 增量结果回调，参数为 ResultDelta
+        self._delta = ResultDeltaTracker()
+        self.current_index = None  # 正在回调的结果所属的句子序号
+        self._awaiting_partial = None  # 追踪中等待第一个中间结果的句子
         
         # 添加延迟数据监控
-        self.audio_timestamps = {}  # 存储音频块ID和时间戳
-        self.latency_stats = {
-            'count': 0,
-            'total_latency': 0,
-            'min_latency': float('inf'),
-            'max_latency': 0,
-            'latencies': []  # 存储所有延迟值用于计算百分位数
-        }
+        # 音频偏移（毫秒）-> 发送时间，按服务端结果中的时间偏移查找，内存固定
+        self.audio_clock = AudioOffsetClock()
+        # 延迟分布（毫秒）：固定内存的分位数草图，另含最近1分钟和15分钟窗口
+        self.latency_sketch = WindowedQuantileSketch(windows=(60.0, 900.0))
         self.audio_chunk_counter = 0  # 音频块计数器
-        self.audio_start_time = None  # 记录第一个音频块的时间
+        
+        # 建连耗时：从 start_streaming 到服务端确认开始转写（NLS SDK 只能观察到总耗时）
+        self.connect_metrics = ConnectMetrics()
+        self._connect_start = None
+        
+        # 上行音频队列，由独立线程调用 send_audio，避免阻塞采集线程
+        self._send_queue = AudioSendQueue(self._send_queued, max_frames=send_queue_frames,
+                                          policy=send_policy, name='tingwu-nls-send')
+        # 收到 TranscriptionStarted（或连接结束）后才允许发送线程写出音频
+        self._started = threading.Event()
         
         self._init_client()
         
@@ -73,13 +100,9 @@ class TingwuNlsSDK:
         logger.info("Tingwu NLS SDK initialized")
     
     def _init_client(self):
-        # 初始化ACS客户端
-        self.acs_client = AcsClient(
-            ak=self.access_key_id,
-            secret=self.access_key_secret,
-            region_id='cn-beijing'
-        )
-        logger.info(f"ACS client initialized: {{'access_key_id': '{self.access_key_id}', 'access_key_secret': '{self.access_key_secret[:5]}...', 'app_key': '{self.app_key}'}}")
+        # 初始化管控接口客户端，复用长连接创建任务
+        self.control_client = ControlPlaneClient.from_endpoint(self.access_key_id, self.access_key_secret, self.endpoint)
+        logger.info(f"Control-plane client initialized: {{'access_key_id': '{self.access_key_id}', 'access_key_secret': '{self.access_key_secret[:5]}...', 'app_key': '{self.app_key}'}}")
     
     def set_callbacks(self, 
                       on_result: Optional[Callable[[str, bool, float], None]] = None,
@@ -88,7 +111,8 @@ class TingwuNlsSDK:
                       on_completed: Optional[Callable[[Dict], None]] = None,
                       on_error: Optional[Callable[[str], None]] = None,
                       on_connection_open: Optional[Callable[[], None]] = None,
-                      on_connection_close: Optional[Callable[[], None]] = None):
+                      on_connection_close: Optional[Callable[[], None]] = None,
+                      on_result_delta: Optional[Callable] = None):
         """
         设置回调函数
         
@@ -100,6 +124,7 @@ class TingwuNlsSDK:
             on_error: 错误回调
             on_connection_open: 连接打开回调
             on_connection_close: 连接关闭回调
+            on_result_delta: 增量结果回调，只传递相对上一条中间结果变化的部分 (ResultDelta)
         """
         self.on_result = on_result
         self.on_sentence_begin = on_sentence_begin
@@ -108,6 +133,7 @@ class TingwuNlsSDK:
         self.on_error = on_error
         self.on_connection_open = on_connection_open
         self.on_connection_close = on_connection_close
+        self.on_result_delta = on_result_delta
         logger.debug("Callbacks set")
     
     def create_task(self, source_language: str = "cn", format: str = "pcm", sample_rate: int = 16000, output_level: int = 2, enable_translation: bool = False, target_languages: List[str] = None) -> Dict:
@@ -127,18 +153,6 @@ class TingwuNlsSDK:
         """
         logger.info(f"Creating Tingwu task with source_language={source_language}, format={format}, sample_rate={sample_rate}")
         
-        # 创建CommonRequest对象
-        request = self._create_common_request(
-            domain='tingwu.cn-beijing.aliyuncs.com',
-            version='2023-09-30',
-            protocol_type='https',
-            method='PUT',  # 使用PUT而不是POST
-            uri='/openapi/tingwu/v2/tasks'  # 使用v2 API
-        )
-        
-        # 添加查询参数
-        request.add_query_param('type', 'realtime')
-        
         # 设置请求体 - 与原始实现保持一致的结构
         body = {
             'AppKey': self.app_key,
@@ -164,17 +178,17 @@ class TingwuNlsSDK:
                 'TargetLanguages': target_languages
             }
         
-        request.set_content(json.dumps(body).encode('utf-8'))
-        
         try:
-            response = self.acs_client.do_action_with_exception(request)
-            result = json.loads(response)
+            # PUT /openapi/tingwu/v2/tasks?type=realtime，经连接池发送
+            result = self.control_client.create_task(body)
             logger.info(f"create task result: {result}")
             
             # 验证响应格式
             if 'Code' in result and result['Code'] == '0' and 'Data' in result and 'TaskId' in result['Data'] and 'MeetingJoinUrl' in result['Data']:
                 self.task_id = result['Data']['TaskId']
                 self.ws_url = result['Data']['MeetingJoinUrl']
+                self.audio_format = format
+                self.sample_rate = sample_rate
                 logger.info(f"Task created successfully. TaskId: {self.task_id}")
                 return result
             else:
@@ -182,9 +196,23 @@ class TingwuNlsSDK:
                 raise Exception(f"Failed to create task: {result}")
         except Exception as e:
             logger.error(f"Error creating task: {str(e)}")
-            logger.debug(f"Request details: domain='tingwu.cn-beijing.aliyuncs.com', version='2023-09-30', uri='/openapi/tingwu/v2/tasks'")
+            logger.debug(f"Request details: domain='{self.control_client.domain}', uri='/openapi/tingwu/v2/tasks'")
             raise
     
+    def use_task(self, task) -> None:
+        """
+        使用预先创建的任务（例如从 TaskPool 取出），代替 create_task
+        
+        Args:
+            task: 含 task_id、ws_url、audio_format 与 sample_rate 属性的对象
+        """
+        self.task_id = task.task_id
+        self.ws_url = task.ws_url
+        # 音频时长与延迟统计按任务的格式和采样率计算
+        self.audio_format = task.audio_format
+        self.sample_rate = task.sample_rate
+        logger.info(f"Using pre-created task. TaskId: {self.task_id}")
+    
     def start_streaming(self, enable_intermediate_result: bool = True, 
                       enable_punctuation_prediction: bool = True,
                       enable_inverse_text_normalization: bool = True) -> bool:
@@ -205,6 +233,10 @@ class TingwuNlsSDK:
             
         logger.info(f"Starting WebSocket connection to: {self.ws_url}")
         
+        self._delta.reset()
+        # 新连接的音频时间轴从0开始
+        self.audio_clock.reset()
+        
         try:
             # 从 WebSocket URL 中提取token
             url_parts = urllib.parse.urlparse(self.ws_url)
@@ -231,12 +263,21 @@ class TingwuNlsSDK:
             )
             
             # 其他参数在start方法中设置
+            self.connect_metrics.attempts += 1
+            self._connect_start = time.perf_counter()
+            # 上行队列先于转写器启动：on_start 可能在 start() 返回前触发，音频随即到达
+            self._started.clear()
+            self._send_queue.start()
             self.transcriber.start()
             self.is_streaming = True
             logger.info("WebSocket stream started successfully\n---")
             return True
                 
         except Exception as e:
+            self.connect_metrics.failures += 1
+            self._connect_start = None
+            self._started.set()
+            self._send_queue.stop()
             logger.error(f"Error starting streaming: {str(e)}")
             import traceback
             logger.error(f"Stack trace: {traceback.format_exc()}")
@@ -244,7 +285,7 @@ class TingwuNlsSDK:
     
     def send_audio_data(self, audio_data: bytes) -> bool:
         """
-        发送音频数据到转写服务
+        发送音频数据到转写服务（放入上行队列后立即返回）
         
         Args:
             audio_data: PCM格式的音频数据
@@ -260,31 +301,73 @@ class TingwuNlsSDK:
             logger.warning("Not streaming, but trying to send audio data anyway")
         
         try:
-            # 记录当前时间戳
-            current_time = time.time()
-            
-            # 如果是第一个音频块，记录起始时间
-            if self.audio_start_time is None:
-                self.audio_start_time = current_time
-            
-            # 为当前音频块分配ID并记录时间戳
             chunk_id = self.audio_chunk_counter
-            self.audio_timestamps[chunk_id] = current_time
             self.audio_chunk_counter += 1
             
             # 每100个音频块记录一次统计信息
             if chunk_id % 100 == 0 and chunk_id > 0:
-                logger.debug(f"Sent {chunk_id} audio chunks, current latency stats: "
-                           f"avg={self.get_average_latency():.2f}ms, "
-                           f"min={self.latency_stats['min_latency']:.2f}ms, "
-                           f"max={self.latency_stats['max_latency']:.2f}ms")
+                sketch = self.latency_sketch.total
+                if sketch.count:
+                    logger.debug(f"Sent {chunk_id} audio chunks, current latency stats: "
+                               f"avg={self.get_average_latency():.2f}ms, "
+                               f"min={sketch.min:.2f}ms, "
+                               f"max={sketch.max:.2f}ms")
             
-            # 发送音频数据
-            self.transcriber.send_audio(audio_data)
-            return True
+            # 放入上行队列，由发送线程写入连接；返回 False 表示按策略丢弃
+            return self._send_queue.put(audio_data)
         except Exception as e:
             logger.error(f"Error sending audio data: {str(e)}")
             return False
+    
+    def _send_queued(self, audio_data: bytes) -> None:
+        """发送线程：把一帧音频写入转写连接，并记录这段音频的发送时间"""
+        # NlsRealtimeMeeting.send_audio 在开始确认前会静默丢弃音频，这里先等待确认
+        self._started.wait()
+        sent_at = time.time()
+        self.transcriber.send_audio(audio_data)
+        # 按实际写出的音频推进时间轴，被队列丢弃的帧不占服务端的偏移
+        if self.audio_format == 'pcm':
+            duration_ms = len(audio_data) * 1000.0 / (2 * self.sample_rate)
+        else:
+            duration_ms = self.frame_ms
+        self.audio_clock.advance(duration_ms, sent_at)
+    
+    def get_delta_stats(self) -> Dict:
+        """
+        获取增量结果统计
+        
+        Returns:
+            包含结果数、跳过的重复中间结果以及收到/转发字符数的字典
+        """
+        return self._delta.get_stats()
+    
+    def get_send_queue_stats(self) -> Dict:
+        """
+        获取上行音频队列统计
+        
+        Returns:
+            包含队列深度、丢弃字节数和入队到发送延迟直方图（毫秒）的字典
+        """
+        return self._send_queue.get_stats()
+
+    def get_connect_stats(self) -> Dict:
+        """
+        获取建连耗时统计
+        
+        Returns:
+            包含尝试/失败次数和建连总耗时直方图（毫秒，total）的字典
+        """
+        return self.connect_metrics.snapshot()
+
+    def get_control_stats(self) -> Dict:
+        """
+        获取管控接口（CreateTask 等）调用耗时和连接复用统计
+        
+        Returns:
+            包含各操作往返耗时直方图（毫秒）、新建/复用连接数的字典
+        """
+        return self.control_client.get_stats()
+
     def stop_streaming(self) -> bool:
         """
         停止WebSocket流式转写
@@ -299,7 +382,14 @@ class TingwuNlsSDK:
             return False
         
         try:
-            # 停止转写
+            if not self._started.is_set():
+                # 尚未收到开始确认，缓存的音频不再发送
+                self._send_queue.clear()
+                self._started.set()
+            # 先发完队列中的音频，再停止转写
+            if not self._send_queue.flush(5):
+                logger.warning("Send queue not drained within 5 seconds")
+            self._send_queue.stop()
             self.transcriber.stop()
             self.transcriber.shutdown()
             self.is_streaming = False
@@ -338,56 +428,49 @@ class TingwuNlsSDK:
         """
         获取延迟统计信息
         
-        Returns:
-            包含延迟统计数据的字典
-        """
-        # 确保至少有一个延迟样本
-        if self.latency_stats['count'] == 0:
-            return {
-                'count': 0,
-                'average_ms': 0,
-                'min_ms': 0,
-                'max_ms': 0
-            }
+        分位数来自固定内存的分位数草图（相对误差约1%），调用开销与会话时长无关
         
-        # 计算百分位数（如果有足够样本）
+        Returns:
+            包含延迟统计数据的字典；windows 中为最近1分钟（'1m'）和15分钟（'15m'）的同类统计
+        """
+        snapshot = self.latency_sketch.snapshot()
+        stats = self._latency_summary(snapshot)
+        stats['windows'] = {label: self._latency_summary(window)
+                            for label, window in snapshot['windows'].items()}
+        return stats
+    
+    @staticmethod
+    def _latency_summary(snapshot: Dict) -> Dict:
+        """把分位数草图的快照转换为以毫秒为单位的统计字典"""
         stats = {
-            'count': self.latency_stats['count'],
-            'average_ms': self.get_average_latency(),
-            'min_ms': float('inf') if self.latency_stats['min_latency'] == float('inf') else self.latency_stats['min_latency'] * 1000,
-            'max_ms': self.latency_stats['max_latency'] * 1000
+            'count': snapshot['count'],
+            'average_ms': snapshot['mean'],
+            'min_ms': snapshot['min'],
+            'max_ms': snapshot['max']
         }
         
         # 计算百分位数（如果有足够的样本）
-        if len(self.latency_stats['latencies']) >= 10:
-            latencies_sorted = sorted(self.latency_stats['latencies'])
-            stats['p50_ms'] = self._get_percentile(latencies_sorted, 50) * 1000
-            stats['p95_ms'] = self._get_percentile(latencies_sorted, 95) * 1000
-            stats['p99_ms'] = self._get_percentile(latencies_sorted, 99) * 1000
+        if snapshot['count'] >= 10:
+            stats['p50_ms'] = snapshot['p50']
+            stats['p95_ms'] = snapshot['p95']
+            stats['p99_ms'] = snapshot['p99']
+            stats['p999_ms'] = snapshot['p999']
         
         return stats
     
-    def _get_percentile(self, sorted_data: List[float], percentile: int) -> float:
+    def get_latency_sketch(self, window: Optional[float] = None):
         """
-        计算百分位数
+        获取延迟分位数草图的副本，可与其他会话的草图合并 (QuantileSketch.merge)
         
         Args:
-            sorted_data: 已排序的数据列表
-            percentile: 百分位数（0-100）
+            window: 窗口长度（秒），None 表示整个会话
             
         Returns:
-            指定百分位数的值
+            QuantileSketch 对象（毫秒）
         """
-        if not sorted_data:
-            return 0.0
-        
-        index = (len(sorted_data) - 1) * percentile / 100
-        if index.is_integer():
-            return sorted_data[int(index)]
-        else:
-            lower_idx = int(index)
-            fraction = index - lower_idx
-            return sorted_data[lower_idx] * (1 - fraction) + sorted_data[lower_idx + 1] * fraction
+        if window is None:
+            return self.latency_sketch.total.copy()
+        return self.latency_sketch.window(window)
     
     def get_average_latency(self) -> float:
         """
@@ -396,9 +479,10 @@ class TingwuNlsSDK:
         Returns:
             平均延迟，如果没有数据则返回0
         """
-        if self.latency_stats['count'] == 0:
+        sketch = self.latency_sketch.total
+        if sketch.count == 0:
             return 0
-        return self.latency_stats['total_latency'] * 1000 / self.latency_stats['count']
+        return sketch.sum / sketch.count
         
     def calculate_latency(self, audio_timestamp: float) -> float:
         """
@@ -413,31 +497,22 @@ class TingwuNlsSDK:
         current_time = time.time()
         latency = current_time - audio_timestamp
         
-        # 更新延迟统计信息
-        self.latency_stats['count'] += 1
-        self.latency_stats['total_latency'] += latency
-        self.latency_stats['min_latency'] = min(self.latency_stats['min_latency'], latency)
-        self.latency_stats['max_latency'] = max(self.latency_stats['max_latency'], latency)
-        self.latency_stats['latencies'].append(latency)
+        # 更新延迟统计信息（毫秒）
+        self.latency_sketch.observe(latency * 1000)
         
         return latency
     
-    def get_audio_timestamp(self, begin_time_ms: int) -> float:
+    def get_audio_timestamp(self, offset_ms: float) -> Optional[float]:
         """
-        根据音频相对开始时间（毫秒）计算绝对时间戳
+        根据音频偏移（毫秒，服务端结果中的 begin_time / time）查找该段音频的发送时间
         
         Args:
-            begin_time_ms: 音频相对开始时间（毫秒）
+            offset_ms: 本次连接音频时间轴上的偏移（毫秒）
             
         Returns:
-            绝对时间戳（秒）
+            发送时间戳（秒），偏移尚未发送或已超出记录窗口时返回 None
         """
-        if self.audio_start_time is None:
-            logger.warning("No audio start time available")
-            return time.time() - (begin_time_ms / 1000.0)
-            
-        # 根据音频开始时间和相对开始时间计算绝对时间戳
-        return self.audio_start_time + (begin_time_ms / 1000.0)
+        return self.audio_clock.lookup(offset_ms)
     
     def get_task_info(self) -> Dict:
         """
@@ -469,7 +544,11 @@ class TingwuNlsSDK:
     def _on_transcription_start(self, message, *args):
         """转写开始回调"""
         logger.info(f"Transcription started: {message}")
+        if self._connect_start is not None:
+            self.connect_metrics.observe({'total': (time.perf_counter() - self._connect_start) * 1000})
+            self._connect_start = None
         self.is_connected = True
+        self._started.set()
         if self.on_connection_open:
             self.on_connection_open()
     
@@ -486,6 +565,12 @@ class TingwuNlsSDK:
                 return
         else:
             message_obj = message
+        
+        if tracer.enabled:
+            # 一句话的追踪区间：句子开始 -> 最终结果
+            index = message_obj.get('payload', {}).get('index')
+            tracer.begin_async('utterance', index, 'sdk')
+            self._awaiting_partial = index
             
         if self.on_sentence_begin:
             self.on_sentence_begin(message_obj)
@@ -504,8 +589,38 @@ class TingwuNlsSDK:
         else:
             message_obj = message
             
+        # 句末延迟：从句子最后一段音频发出到收到最终结果
+        payload = message_obj.get('payload', {})
+        index = payload.get('index')
+        self.current_index = index
+        latency = None
+        end_ms = payload.get('end_time', payload.get('time'))
+        if end_ms is not None:
+            sent_at = self.get_audio_timestamp(max(0, end_ms - 1))  # 句子最后一毫秒音频
+            if sent_at is not None:
+                latency = self.calculate_latency(sent_at)
+                logger.debug(f"Sentence {index} final after {latency * 1000:.0f} ms")
+        if tracer.enabled:
+            tracer.instant('final', 'sdk', {'index': index, 'time_ms': end_ms,
+                                            'latency_ms': None if latency is None else latency * 1000})
+        
         if self.on_sentence_end:
-            self.on_sentence_end(message_obj)
+            with tracer.span('on_sentence_end', 'sdk', {'index': index}):
+                self.on_sentence_end(message_obj)
+        
+        # 句子的最终文本也作为增量发出，接收端据此结束当前句
+        self._emit_delta(payload, True)
+        if tracer.enabled:
+            tracer.end_async('utterance', index, 'sdk')
+    
+    def _emit_delta(self, payload: Dict, is_final: bool) -> None:
+        """增量模式下计算并上报相对上一条中间结果的变化"""
+        if not self.on_result_delta or not isinstance(payload.get('result'), str):
+            return
+        delta = self._delta.update(payload.get('index'), payload['result'], is_final)
+        if delta:
+            with tracer.span('on_result_delta', 'sdk', {'index': delta.index}):
+                self.on_result_delta(delta)
     
     def _on_result_changed(self, message, *args):
         """转写结果变更回调"""
@@ -525,13 +640,22 @@ class TingwuNlsSDK:
             # 从消息对象中提取有效负载
             payload = message_obj.get('payload', {})
             result_text = payload.get('result', {})
-            is_sentence_end = None
-            begin_time = None
+            is_sentence_end = False
+            begin_time = payload.get('begin_time')
+            index = payload.get('index')
+            self.current_index = index
+            
+            if tracer.enabled and index == self._awaiting_partial:
+                self._awaiting_partial = None
+                tracer.instant('first_partial', 'sdk', {'index': index, 'time_ms': payload.get('time')})
             
             # 调用用户定义的回调
             if self.on_result:
                 # 将相对开始时间（毫秒）传递给回调
-                self.on_result(result_text, is_sentence_end, begin_time)
+                with tracer.span('on_result', 'sdk', {'index': index}):
+                    self.on_result(result_text, is_sentence_end, begin_time)
+            
+            self._emit_delta(payload, False)
 
         except Exception as e:
             logger.error(f"Error processing result: {str(e)}")
@@ -577,30 +701,6 @@ class TingwuNlsSDK:
         logger.info("WebSocket connection closed")
         self.is_connected = False
         self.is_streaming = False
+        self._started.set()
         if self.on_connection_close:
             self.on_connection_close()
-    
-    def _create_common_request(self, domain: str, version: str, protocol_type: str, method: str, uri: str) -> CommonRequest:
-        """
-        创建通用请求对象
-        
-        Args:
-            domain: 域名
-            version: API版本
-            protocol_type: 协议类型
-            method: HTTP方法
-            uri: URI路径
-            
-        Returns:
-            CommonRequest对象
-        """
-        request = CommonRequest()
-        request.set_domain(domain)
-        request.set_version(version)
-        request.set_protocol_type(protocol_type)
-        request.set_method(method)
-        request.set_uri_pattern(uri)
-        request.set_accept_format('json')
-        request.add_header('Content-Type', 'application/json;charset=UTF-8')
-        
-        return request
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+通义听悟实时转写 WebSocket 协议的公共部分，供线程版与 asyncio 版 SDK 共用
+"""
+
+import json
+import time
+
+NAMESPACE = 'SpeechTranscriber'
+STATUS_OK = 20000000
+
+# 服务端确认转写已开始的消息名（实时会议接口使用 TranscriptionStarted）
+STARTED_NAMES = ('TranscriptionStarted', 'StartTranscriptionResponse')
+
+# 会话状态机: connecting → started → streaming → draining → closed
+STATE_IDLE = 'idle'              # 尚未连接
+STATE_CONNECTING = 'connecting'  # 建连并等待服务端确认 StartTranscription，音频先缓存
+STATE_STARTED = 'started'        # 服务端已确认，正在发送缓存的音频
+STATE_STREAMING = 'streaming'    # 音频直接发送
+STATE_DRAINING = 'draining'      # 已发送 StopTranscription，等待最终结果
+STATE_CLOSED = 'closed'          # 连接已关闭
+
+TRANSITIONS = {
+    STATE_IDLE: (STATE_CONNECTING,),
+    STATE_CONNECTING: (STATE_STARTED, STATE_DRAINING, STATE_CLOSED),
+    STATE_STARTED: (STATE_STREAMING, STATE_DRAINING, STATE_CLOSED, STATE_CONNECTING),
+    STATE_STREAMING: (STATE_DRAINING, STATE_CLOSED, STATE_CONNECTING),  # 断线后重连回到 connecting
+    STATE_DRAINING: (STATE_CLOSED,),
+    STATE_CLOSED: (STATE_CONNECTING,),
+}
+
+# 与 websocket-client 版本保持一致的握手头部
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36"
+}
+
+
+def start_transcription_message(task_id: str, audio_format: str, sample_rate: int) -> str:
+    """
+    Build the StartTranscription handshake sent right after the socket opens
+
+    Args:
+        task_id: Task id returned by CreateTask
+        audio_format: Upstream audio format negotiated in CreateTask
+        sample_rate: Upstream sample rate negotiated in CreateTask
+
+    Returns:
+        JSON text message
+    """
+    return json.dumps({
+        "header": {
+            "namespace": NAMESPACE,
+            "name": "StartTranscription",
+            "status": 0,
+            "message_id": str(int(time.time() * 1000))  # 使用当前时间戳作为消息ID
+        },
+        "payload": {
+            "task_id": task_id,
+            "format": audio_format,
+            "sample_rate": sample_rate,
+            "enable_intermediate_result": True,
+            "enable_punctuation_prediction": True,
+            "enable_inverse_text_normalization": True
+        }
+    })
+
+
+def stop_transcription_message(task_id: str) -> str:
+    """
+    Build the StopTranscription message that asks the server to finish the
+    last sentence and reply with TranscriptionCompleted
+
+    Args:
+        task_id: Task id returned by CreateTask
+
+    Returns:
+        JSON text message
+    """
+    return json.dumps({
+        "header": {
+            "namespace": NAMESPACE,
+            "name": "StopTranscription",
+            "status": 0,
+            "message_id": str(int(time.time() * 1000))
+        },
+        "payload": {
+            "task_id": task_id
+        }
+    })
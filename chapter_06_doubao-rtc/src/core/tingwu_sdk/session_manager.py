@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+import asyncio
+import functools
+import threading
+from typing import Callable, Dict, Iterable, List, Optional
+
+from core.tingwu_sdk.aio import AsyncTingwuSDK
+from core.tingwu_sdk.control import ControlPlaneClient
+from utils.logger import logger
+
+
+class SessionManager:
+    """
+    Owns many Tingwu real-time sessions in one process, keyed by session id
+
+    Every session is an AsyncTingwuSDK sharing one pooled control-plane
+    client and one event loop running on a single background thread; log
+    output goes through the shared logger's background writer so no session
+    blocks on log I/O.
+    Sessions are started and stopped in bulk, and their callbacks are
+    reported with the id of the session they came from.
+
+    All public methods are called from ordinary threads; they schedule work
+    on the manager's loop and wait for the result.
+    """
+    def __init__(self,
+                 access_key_id: str,
+                 access_key_secret: str,
+                 app_key: str,
+                 frame_ms: int = 30,
+                 send_queue_chunks: int = 64,
+                 task_pool=None,
+                 endpoint: Optional[str] = None):
+        """
+        Initialize the manager
+
+        Args:
+            access_key_id: Alibaba Cloud Access Key ID
+            access_key_secret: Alibaba Cloud Access Key Secret
+            app_key: Tingwu App Key
+            frame_ms: Upstream frame duration shared by all sessions
+            send_queue_chunks: Per-session send queue capacity in frames
+            task_pool: Optional TaskPool; sessions take a pre-created task from
+                it and only fall back to create_task when it is empty
+            endpoint: Control-plane endpoint URL (default: the Tingwu API)
+        """
+        self.access_key_id = access_key_id
+        self.access_key_secret = access_key_secret
+        self.app_key = app_key
+        self.frame_ms = frame_ms
+        self.send_queue_chunks = send_queue_chunks
+        self.task_pool = task_pool
+
+        self.control_client = ControlPlaneClient.from_endpoint(access_key_id, access_key_secret, endpoint)
+
+        self.sessions: Dict[str, AsyncTingwuSDK] = {}
+        self._task_params: Dict[str, Dict] = {}
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread = None
+        self._owns_log_writer = False
+
+        # Session-tagged callbacks: first argument is always the session id
+        self.on_result = None
+        self.on_completed = None
+        self.on_error = None
+        self.on_connection_open = None
+        self.on_connection_close = None
+
+        logger.info(f"SessionManager initialized with frame_ms={frame_ms}")
+
+    def set_callbacks(self,
+                      on_result: Optional[Callable[[str, str, bool, float], None]] = None,
+                      on_completed: Optional[Callable[[str], None]] = None,
+                      on_error: Optional[Callable[[str, object], None]] = None,
+                      on_connection_open: Optional[Callable[[str], None]] = None,
+                      on_connection_close: Optional[Callable[[str], None]] = None) -> None:
+        """
+        Set session-tagged callbacks
+
+        Each callback receives the session id followed by the arguments of the
+        matching AsyncTingwuSDK callback. They run on the manager's event loop
+        and must not block.
+        """
+        self.on_result = on_result
+        self.on_completed = on_completed
+        self.on_error = on_error
+        self.on_connection_open = on_connection_open
+        self.on_connection_close = on_connection_close
+
+    def open(self) -> None:
+        """Start the shared event loop thread and the background log writer"""
+        if self.loop is not None:
+            return
+        self._owns_log_writer = logger.start_background_writer()
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name='tingwu-sessions')
+        self._thread.daemon = True
+        self._thread.start()
+        logger.info("Session event loop started")
+
+    def close(self) -> None:
+        """Stop every session, then the event loop thread and the log writer"""
+        if self.loop is None:
+            return
+        self.stop_sessions()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
+        self.loop.close()
+        self.loop = None
+        self._thread = None
+        self.control_client.close()
+        logger.info("Session event loop stopped")
+        if self._owns_log_writer:
+            logger.stop_background_writer()
+            self._owns_log_writer = False
+
+    def _run(self, coro, timeout: Optional[float] = None):
+        """Run a coroutine on the manager's loop and wait for its result"""
+        if self.loop is None:
+            self.open()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def add_session(self, session_id: str, **task_params) -> AsyncTingwuSDK:
+        """
+        Register a session; its task is created when the session is started
+
+        Args:
+            session_id: Id used to tag this session's callbacks and stats
+            **task_params: Keyword arguments for create_task (source_language,
+                format, sample_rate, ...)
+
+        Returns:
+            The session's SDK instance
+        """
+        if session_id in self.sessions:
+            raise ValueError(f"Session already registered: {session_id}")
+
+        sdk = AsyncTingwuSDK(self.access_key_id, self.access_key_secret, self.app_key,
+                             frame_ms=self.frame_ms, send_queue_chunks=self.send_queue_chunks)
+        sdk.control_client = self.control_client
+        sdk.on_result = functools.partial(self._on_result, session_id)
+        sdk.on_completed = functools.partial(self._tagged, 'on_completed', session_id)
+        sdk.on_error = functools.partial(self._on_error, session_id)
+        sdk.on_connection_open = functools.partial(self._tagged, 'on_connection_open', session_id)
+        sdk.on_connection_close = functools.partial(self._tagged, 'on_connection_close', session_id)
+
+        self.sessions[session_id] = sdk
+        self._task_params[session_id] = task_params
+        self._counters[session_id] = {'results': 0, 'finals': 0, 'errors': 0}
+        logger.info(f"Session {session_id} registered")
+        return sdk
+
+    def remove_session(self, session_id: str) -> None:
+        """
+        Stop a session if it is streaming and forget it
+
+        Args:
+            session_id: Id of the session to remove
+        """
+        self.stop_sessions([session_id])
+        self.sessions.pop(session_id, None)
+        self._task_params.pop(session_id, None)
+        self._counters.pop(session_id, None)
+
+    def _tagged(self, name: str, session_id: str, *args) -> None:
+        callback = getattr(self, name)
+        if callback:
+            callback(session_id, *args)
+
+    def _on_result(self, session_id: str, result: str, is_final: bool, confidence: float) -> None:
+        counters = self._counters[session_id]
+        counters['results'] += 1
+        if is_final:
+            counters['finals'] += 1
+        self._tagged('on_result', session_id, result, is_final, confidence)
+
+    def _on_error(self, session_id: str, error) -> None:
+        self._counters[session_id]['errors'] += 1
+        logger.error(f"[{session_id}] {error}")
+        self._tagged('on_error', session_id, error)
+
+    async def _start_one(self, session_id: str, timeout: float) -> None:
+        sdk = self.sessions[session_id]
+        if not sdk.task_id:
+            # timeout=0: acquire() must not block the event loop
+            task = self.task_pool.acquire(timeout=0) if self.task_pool else None
+            if task is not None:
+                sdk.use_task(task)
+            else:
+                await sdk.create_task(**self._task_params[session_id])
+        await sdk.start_streaming(timeout=timeout)
+
+    async def _start_many(self, session_ids: List[str], timeout: float) -> List[str]:
+        outcomes = await asyncio.gather(*(self._start_one(session_id, timeout) for session_id in session_ids),
+                                        return_exceptions=True)
+        started = []
+        for session_id, outcome in zip(session_ids, outcomes):
+            if isinstance(outcome, BaseException):
+                logger.error(f"Session {session_id} failed to start: {str(outcome)}")
+                self._on_error(session_id, outcome)
+            else:
+                started.append(session_id)
+        return started
+
+    def start_sessions(self, session_ids: Optional[Iterable[str]] = None, timeout: float = 15) -> List[str]:
+        """
+        Create tasks and connect sessions concurrently
+
+        Args:
+            session_ids: Sessions to start; all registered sessions if None
+            timeout: Per-session connect timeout in seconds
+
+        Returns:
+            Ids of the sessions that started successfully
+        """
+        ids = [session_id for session_id in (session_ids or list(self.sessions))
+               if not self.sessions[session_id].is_streaming]
+        started = self._run(self._start_many(ids, timeout))
+        logger.info(f"Started {len(started)}/{len(ids)} sessions")
+        return started
+
+    def stop_sessions(self, session_ids: Optional[Iterable[str]] = None, timeout: float = 5) -> None:
+        """
+        Drain and close sessions concurrently
+
+        Args:
+            session_ids: Sessions to stop; all registered sessions if None
+            timeout: Per-session drain timeout in seconds
+        """
+        if self.loop is None:
+            return
+        sdks = [self.sessions[session_id] for session_id in (session_ids or list(self.sessions))
+                if session_id in self.sessions]
+
+        async def stop_all():
+            await asyncio.gather(*(sdk.stop_streaming(timeout=timeout) for sdk in sdks), return_exceptions=True)
+
+        self._run(stop_all())
+
+    def send_audio_data(self, session_id: str, audio_data: bytes) -> None:
+        """
+        Queue audio for one session; safe to call from any thread
+
+        Args:
+            session_id: Target session
+            audio_data: Audio data in the session's negotiated format
+        """
+        self.sessions[session_id].send_audio_data(audio_data)
+
+    def get_stats(self) -> Dict[str, Dict]:
+        """
+        Get per-session transport and result counters
+
+        Returns:
+            Dictionary keyed by session id
+        """
+        stats = {}
+        for session_id, sdk in self.sessions.items():
+            stats[session_id] = sdk.get_stats()
+            stats[session_id].update(self._counters[session_id])
+        return stats
+
+    def get_control_stats(self) -> Dict:
+        """
+        Get CreateTask/EndTask timings and connection reuse of the shared
+        control-plane client
+
+        Returns:
+            Dictionary as returned by ControlPlaneClient.get_stats()
+        """
+        return self.control_client.get_stats()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+import inspect
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+from core.metrics import Histogram
+from utils.logger import logger
+
+# Bucket upper bounds in milliseconds for CreateTask round trips
+CREATE_BUCKETS_MS = (50.0, 100.0, 200.0, 300.0, 500.0, 750.0, 1000.0, 2000.0, 5000.0)
+
+
+class PooledTask:
+    """A realtime task created ahead of time, ready to be joined"""
+    __slots__ = ('task_id', 'ws_url', 'audio_format', 'sample_rate', 'created_at')
+
+    def __init__(self, task_id: str, ws_url: str, audio_format: str, sample_rate: int):
+        self.task_id = task_id
+        self.ws_url = ws_url
+        self.audio_format = audio_format
+        self.sample_rate = sample_rate
+        self.created_at = time.monotonic()
+
+    def age(self) -> float:
+        """Seconds since the task was created"""
+        return time.monotonic() - self.created_at
+
+
+class TaskPool:
+    """
+    Keeps K realtime tasks (TaskId + MeetingJoinUrl) created in advance
+
+    A background thread calls CreateTask until `size` unexpired tasks are
+    ready, and again whenever one is handed out or ages past the TTL, so
+    starting a session only costs the WebSocket connect. Tasks are created
+    through a dedicated SDK instance (TingwuSDK or TingwuNlsSDK) and applied
+    to the session's SDK with use_task().
+
+    Tasks that expire, or are still in the pool at stop(), are ended with
+    EndTask through the creator's control-plane client, on the refill thread
+    or in stop() so acquire() never waits on the network.
+    """
+    def __init__(self, creator, size: int = 2, ttl: float = 600.0, retry_interval: float = 5.0, **task_params):
+        """
+        Initialize the pool
+
+        Args:
+            creator: Synchronous SDK instance (TingwuSDK or TingwuNlsSDK) used
+                only to call create_task from the refill thread; an
+                AsyncTingwuSDK does not work, its create_task is a coroutine
+            size: Number of tasks to keep ready
+            ttl: Seconds after which an unused task is ended and replaced; keep
+                it below the validity of the service's join URL
+            retry_interval: Seconds to wait after a failed CreateTask
+            **task_params: Keyword arguments for create_task (source_language,
+                format, sample_rate, ...)
+        """
+        if size <= 0:
+            raise ValueError("size must be positive")
+        if inspect.iscoroutinefunction(creator.create_task):
+            raise TypeError("creator must be a synchronous SDK (TingwuSDK or TingwuNlsSDK)")
+        self.creator = creator
+        self.size = size
+        self.ttl = ttl
+        self.retry_interval = retry_interval
+        self.task_params = task_params
+
+        self._ready = deque()
+        self._abandoned = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self.is_running = False
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.ended = 0
+        self.created = 0
+        self.failures = 0
+        self.create_histogram = Histogram(CREATE_BUCKETS_MS)
+
+        logger.info(f"TaskPool initialized with size={size}, ttl={ttl}s")
+
+    def start(self) -> None:
+        """Start the refill thread"""
+        if self.is_running:
+            return
+        self.is_running = True
+        self._thread = threading.Thread(target=self._refill_thread_func, name='tingwu-task-pool')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the refill thread and end the tasks still in the pool"""
+        with self._cond:
+            self.is_running = False
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        with self._cond:
+            self._abandoned.extend(self._ready)
+            self._ready.clear()
+        self._end_abandoned()
+
+    def _prune(self) -> None:
+        """Move tasks older than the TTL to the abandoned list (caller holds the lock)"""
+        while self._ready and self._ready[0].age() >= self.ttl:
+            task = self._ready.popleft()
+            self._abandoned.append(task)
+            self.expired += 1
+            logger.debug(f"Pooled task {task.task_id} expired")
+
+    def _end_abandoned(self) -> None:
+        """End expired and leftover tasks on the service; failures are only logged"""
+        with self._cond:
+            tasks, self._abandoned = self._abandoned, []
+        for task in tasks:
+            try:
+                self.creator.control_client.end_task(self.creator.app_key, task.task_id)
+                self.ended += 1
+            except Exception as e:
+                logger.warning(f"TaskPool failed to end task {task.task_id}: {str(e)}")
+
+    def acquire(self, timeout: float = 0) -> Optional[PooledTask]:
+        """
+        Take a ready task, waiting up to `timeout` seconds for one if the pool is empty
+
+        A non-zero timeout blocks the calling thread; from an event loop call
+        it with timeout=0 (or through run_in_executor).
+
+        Args:
+            timeout: Seconds to wait; 0 returns immediately
+
+        Returns:
+            A task, or None so the caller can fall back to create_task
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                self._prune()
+                if self._ready:
+                    task = self._ready.pop()  # newest first, the oldest are closest to expiry
+                    self.hits += 1
+                    self._cond.notify_all()
+                    return task
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self.is_running:
+                    self.misses += 1
+                    return None
+                self._cond.wait(remaining)
+
+    def _create_one(self) -> Optional[PooledTask]:
+        start = time.perf_counter()
+        try:
+            result = self.creator.create_task(**self.task_params)
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"TaskPool failed to create task: {str(e)}")
+            return None
+        self.create_histogram.observe((time.perf_counter() - start) * 1000.0)
+        self.created += 1
+        data = result['Data']
+        return PooledTask(data['TaskId'], data['MeetingJoinUrl'],
+                          self.task_params.get('format', 'pcm'), self.task_params.get('sample_rate', 16000))
+
+    def _refill_thread_func(self) -> None:
+        """Refill thread function that keeps `size` fresh tasks ready"""
+        logger.info("Task pool refill thread started")
+        while True:
+            with self._cond:
+                self._prune()
+                while self.is_running and len(self._ready) >= self.size:
+                    # Sleep until a task is taken or the oldest one expires
+                    self._cond.wait(max(0.0, self.ttl - self._ready[0].age()))
+                    self._prune()
+                if not self.is_running:
+                    break
+
+            self._end_abandoned()
+            task = self._create_one()
+            with self._cond:
+                if task is not None:
+                    self._ready.append(task)
+                    self._cond.notify_all()
+                    logger.debug(f"Pooled task {task.task_id} ready ({len(self._ready)}/{self.size})")
+                elif self.is_running:
+                    self._cond.wait(self.retry_interval)
+        logger.info("Task pool refill thread stopped")
+
+    def get_stats(self) -> Dict:
+        """
+        Get pool counters
+
+        Returns:
+            Dictionary with ready count, hit/miss/expiry/end counters and the
+            CreateTask latency histogram (ms)
+        """
+        with self._cond:
+            ready = len(self._ready)
+        return {
+            'ready': ready,
+            'size': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'expired': self.expired,
+            'ended': self.ended,
+            'created': self.created,
+            'failures': self.failures,
+            'create_ms': self.create_histogram.snapshot(),
+        }
@@ -1,19 +1,32 @@
 #!/usr/bin/env python
 # coding=utf-8
 
-import json
 import datetime
+import logging
+import random
+import socket
+import urllib.parse
 import websocket
 import threading
 import time
 import ssl
-import numpy as np
+from collections import deque
 from typing import Dict, List, Optional, Callable
 
-from aliyunsdkcore.client import AcsClient
-from aliyunsdkcore.request import CommonRequest
-from aliyunsdkcore.auth.credentials import AccessKeyCredential
 
+from core.framer import silence_frame
+from core.metrics import ConnectMetrics, ReconnectMetrics
+from core.replay_window import PCMReplayWindow
+from core.send_queue import AudioSendQueue
+from core.tingwu_sdk.control import ControlPlaneClient
+from core.tingwu_sdk.decoder import RESULT_NAMES, ServerEvent, TranscriptionResult, decode_message
+from core.tingwu_sdk.delta import ResultDeltaTracker
+from core.tracing import tracer
+from core.tingwu_sdk.protocol import (
+    HEADERS, NAMESPACE, STARTED_NAMES, STATUS_OK, TRANSITIONS,
+    STATE_IDLE, STATE_CONNECTING, STATE_STARTED, STATE_STREAMING, STATE_DRAINING, STATE_CLOSED,
+    start_transcription_message, stop_transcription_message
+)
 from utils.logger import logger
 
 
@@ -21,7 +34,9 @@ class TingwuSDK:
     """
     SDK for Alibaba Tongyi Tingwu real-time speech-to-text API 
     """
-    def __init__(self, access_key_id: str, access_key_secret: str, app_key: str):
+    def __init__(self, access_key_id: str, access_key_secret: str, app_key: str, frame_ms: int = 30,
+                 pre_ready_ms: int = 3000, reconnect_attempts: int = 5, replay_window_ms: int = 10000,
+                 send_queue_frames: int = 50, send_policy: str = 'drop_oldest', endpoint: Optional[str] = None):
         """
         Initialize the SDK with credentials
         
@@ -29,18 +44,83 @@ class TingwuSDK:
             access_key_id: Alibaba Cloud Access Key ID
             access_key_secret: Alibaba Cloud Access Key Secret
             app_key: Tingwu App Key from console
+            frame_ms: Duration of the audio frames sent upstream, used for the
+                initial silence frame (should match the AudioFramer setting)
+            pre_ready_ms: Audio kept while the session is still connecting; older
+                audio is dropped once the limit is reached
+            reconnect_attempts: Attempts to resume a live session whose connection
+                dropped (0 disables reconnection)
+            replay_window_ms: Sent PCM kept for replay after a reconnect; audio
+                captured during the outage is buffered up to the same length.
+                Resuming is lossless for outages within it, longer ones lose
+                the oldest audio, reported as lost_ms by get_reconnect_stats()
+            send_queue_frames: Capacity of the outbound audio queue in frames
+            send_policy: What to do when the outbound queue is full: 'block',
+                'drop_oldest' or 'skip_silence' (see AudioSendQueue)
+            endpoint: Control-plane endpoint URL (default: the Tingwu API), e.g.
+                'http://127.0.0.1:8766' for a local emulator
         """
         self.access_key_id = access_key_id
         self.access_key_secret = access_key_secret
         self.app_key = app_key
+        self.endpoint = endpoint
+        self.frame_ms = frame_ms
+        self.pre_ready_ms = pre_ready_ms
+        self.reconnect_attempts = reconnect_attempts
+        self.replay_window_ms = replay_window_ms
+        self.reconnect_backoff = 0.5       # 首次重连前的最长等待（秒），之后翻倍
+        self.reconnect_backoff_max = 8.0
+        self.reconnect_timeout = 10.0      # 每次重连等待就绪的时间
         
-        self.acs_client = None
+        # Negotiated audio format, filled in by create_task
+        self.audio_format = 'pcm'
+        self.sample_rate = 16000
+        
+        self.control_client = None  # 可由多个SDK实例共享
         self.task_id = None
         self.ws_url = None
         self.ws_client = None
         
         self.is_streaming = False
         self.is_connected = False
+        self.is_ready = False
+        
+        # 会话状态机，以及握手完成前缓存的音频
+        self.state = STATE_IDLE
+        self._state_lock = threading.Lock()
+        self._pending = deque()
+        self._pending_bytes = 0
+        self.pre_ready_drops = 0
+        self._completed = threading.Event()
+        
+        # 连接状态事件，代替轮询标志位
+        self._open_done = threading.Event()   # 握手完成或失败
+        self._ready = threading.Event()       # 服务端确认开始转写，或连接已关闭
+        self._closed = threading.Event()      # 连接已关闭
+        self._closed.set()
+        
+        # 断线重连：已发送PCM的回放窗口，以及按音频偏移（采样点）去重
+        self._replay = None
+        self._conn_base = 0           # 当前连接时间轴零点对应的绝对偏移
+        self._acked = 0               # 最后一个已确认句子结束的绝对偏移
+        # 重连后服务端的句子序号从1重新开始，按断线前已给出最终结果的句子数偏移
+        self._index_base = 0
+        self._final_index = 0
+        self._reconnecting = False
+        self._dropped_at = 0.0
+        self._stop_reconnect = threading.Event()
+        self._reconnect_thread = None
+        self.reconnect_metrics = ReconnectMetrics()
+        
+        # 上行音频队列：由独立线程写入socket，调用方线程不会被网络阻塞
+        self._outbound = AudioSendQueue(self._send_queued, max_frames=send_queue_frames,
+                                          policy=send_policy, name='tingwu-send')
+        
+        # 建连各阶段耗时
+        self.connect_metrics = ConnectMetrics()
+        self._phases = {}
+        self._connect_start = 0.0
+        self._phase_mark = 0.0
         
         # Callbacks
         self.on_transcription_result = None  # 兼容旧版本的回调
@@ -49,67 +129,33 @@ class TingwuSDK:
         self.on_error = None
         self.on_result = None  # 新的转写结果回调
         self.on_completed = None  # 转写完成回调
+        self.on_result_delta = None  # 增量结果回调，参数为 ResultDelta
+        self._delta = ResultDeltaTracker()
+        self.current_index = None  # 正在回调的结果所属的句子序号
+        self._traced_index = None  # 追踪中尚未结束的句子
         
-        logger.info("Tingwu SDK initialized")
+        # 服务端消息名 -> 处理函数
+        self._handlers = {name: self._handle_started for name in STARTED_NAMES}
+        self._handlers.update({name: self._handle_result for name in RESULT_NAMES})
+        self._handlers['TranscriptionCompleted'] = self._handle_completed
+        self._handlers['TaskFailed'] = self._handle_task_failed
         
-    def _create_common_request(self, domain: str, version: str, protocol_type: str, method: str, uri: str) -> CommonRequest:
-        """
-        Create a common request for Alibaba Cloud API
+        logger.info("Tingwu SDK initialized")
         
-        Args:
-            domain: API domain
-            version: API version
-            protocol_type: Protocol type
-            method: HTTP method
-            uri: URI pattern
-            
-        Returns:
-            A CommonRequest object
-        """
-        request = CommonRequest()
-        request.set_accept_format('json')
-        request.set_domain(domain)
-        request.set_version(version)
-        request.set_protocol_type(protocol_type)
-        request.set_method(method)
-        request.set_uri_pattern(uri)
-        request.add_header('Content-Type', 'application/json')
-        return request
-    
     def _init_client(self) -> None:
-        """Initialize the ACS client with credentials"""
-        credentials = AccessKeyCredential(self.access_key_id, self.access_key_secret)
-        self.acs_client = AcsClient(region_id='cn-beijing', credential=credentials)
+        """Initialize the control-plane client with credentials"""
+        self.control_client = ControlPlaneClient.from_endpoint(self.access_key_id, self.access_key_secret, self.endpoint)
         secrets = {"access_key_id": self.access_key_id, "access_key_secret": self.access_key_secret, "app_key": self.app_key}
-        logger.info(f'ACS client initialized: {secrets}')
+        logger.info(f'Control-plane client initialized: {secrets}')
 
-    def create_task(self, 
-                    source_language: str = 'cn', 
-                    format: str = 'pcm', 
-                    sample_rate: int = 16000,
-                    output_level: int = 2,
-                    enable_translation: bool = False,
-                    target_languages: List[str] = None) -> Dict:
-        """
-        Create a Tingwu real-time transcription task
-        
-        Args:
-            source_language: Source language of audio (cn, en, multilingual, etc.)
-            format: Audio format (pcm, opus, aac, etc.)
-            sample_rate: Audio sample rate (16000 or 8000)
-            output_level: 1 for final results only, 2 for interim results too
-            enable_translation: Whether to enable translation
-            target_languages: List of target languages for translation
-            
-        Returns:
-            Dictionary containing task info including TaskId and MeetingJoinUrl
-        """
-        logger.info(f"Creating Tingwu task with source_language={source_language}, format={format}, sample_rate={sample_rate}")
-        
-        if self.acs_client is None:
-            self._init_client()
-        
-        # Prepare request parameters
+    def _task_body(self,
+                   source_language: str = 'cn',
+                   format: str = 'pcm',
+                   sample_rate: int = 16000,
+                   output_level: int = 2,
+                   enable_translation: bool = False,
+                   target_languages: List[str] = None) -> Dict:
+        """Build the CreateTask request body (arguments as for create_task)"""
         body = {
             'AppKey': self.app_key,
             'Input': {
@@ -133,37 +179,69 @@ class TingwuSDK:
                 'OutputLevel': output_level,
                 'TargetLanguages': target_languages
             }
+        return body
+    
+    def _accept_task(self, result: Dict, body: Dict) -> Dict:
+        """Check a CreateTask response and take over its TaskId and join URL"""
+        if 'Code' in result and result['Code'] == '0' and 'Data' in result and 'TaskId' in result['Data'] and 'MeetingJoinUrl' in result['Data']:
+            self.task_id = result['Data']['TaskId']
+            self.ws_url = result['Data']['MeetingJoinUrl']
+            self.audio_format = body['Input']['Format']
+            self.sample_rate = body['Input']['SampleRate']
+            logger.info(f"Task created successfully. TaskId: {self.task_id}")
+            return result
+        logger.error(f"Failed to create task. Response: {result}")
+        raise Exception(f"Failed to create task: {result}")
+    
+    def create_task(self, 
+                    source_language: str = 'cn', 
+                    format: str = 'pcm', 
+                    sample_rate: int = 16000,
+                    output_level: int = 2,
+                    enable_translation: bool = False,
+                    target_languages: List[str] = None) -> Dict:
+        """
+        Create a Tingwu real-time transcription task
         
-        # Create and send request
-        request = self._create_common_request(
-            domain='tingwu.cn-beijing.aliyuncs.com',
-            version='2023-09-30',
-            protocol_type='https',
-            method='PUT',
-            uri='/openapi/tingwu/v2/tasks'
-        )
-        request.add_query_param('type', 'realtime')
-
+        Args:
+            source_language: Source language of audio (cn, en, multilingual, etc.)
+            format: Audio format (pcm, opus, aac, etc.)
+            sample_rate: Audio sample rate (16000 or 8000)
+            output_level: 1 for final results only, 2 for interim results too
+            enable_translation: Whether to enable translation
+            target_languages: List of target languages for translation
+            
+        Returns:
+            Dictionary containing task info including TaskId and MeetingJoinUrl
+        """
+        logger.info(f"Creating Tingwu task with source_language={source_language}, format={format}, sample_rate={sample_rate}")
+        
+        if self.control_client is None:
+            self._init_client()
         
-        request.set_content(json.dumps(body).encode('utf-8'))
+        body = self._task_body(source_language, format, sample_rate, output_level, enable_translation, target_languages)
         
         try:
-            response = self.acs_client.do_action_with_exception(request)
-            result = json.loads(response)
-            
-            if 'Code' in result and result['Code'] == '0' and 'Data' in result and 'TaskId' in result['Data'] and 'MeetingJoinUrl' in result['Data']:
-                self.task_id = result['Data']['TaskId']
-                self.ws_url = result['Data']['MeetingJoinUrl']
-                logger.info(f"Task created successfully. TaskId: {self.task_id}")
-                return result
-            else:
-                logger.error(f"Failed to create task. Response: {result}")
-                raise Exception(f"Failed to create task: {result}")
-                
+            result = self.control_client.create_task(body)
         except Exception as e:
             logger.error(f"Error creating task: {str(e)}")
-            logger.debug(f"Request details: domain='tingwu.cn-beijing.aliyuncs.com', version='2023-09-30', uri='/openapi/tingwu/v2/tasks'")
+            logger.debug(f"Request details: domain='{self.control_client.domain}', uri='/openapi/tingwu/v2/tasks'")
             raise
+        return self._accept_task(result, body)
+    
+    def use_task(self, task) -> None:
+        """
+        Join a task created ahead of time (e.g. taken from a TaskPool) instead
+        of calling create_task
+        
+        Args:
+            task: Object with task_id, ws_url, audio_format and sample_rate
+        """
+        self.task_id = task.task_id
+        self.ws_url = task.ws_url
+        self.audio_format = task.audio_format
+        self.sample_rate = task.sample_rate
+        logger.info(f"Using pre-created task. TaskId: {self.task_id}")
     
     def end_task(self) -> Dict:
         """
@@ -215,6 +293,7 @@ class TingwuSDK:
         ws_status = {
             "is_connected": self.is_connected,
             "is_streaming": self.is_streaming,
+            "state": self.state,
             "task_id": self.task_id,
             "ws_url": self.ws_url
         }
@@ -229,57 +308,391 @@ class TingwuSDK:
             "Message": "Task info retrieved from local state"
         }
     
+    def _mark_phase(self, phase: str) -> None:
+        """Record the time since the previous phase ended under `phase`"""
+        now = time.perf_counter()
+        self._phases[phase] = (now - self._phase_mark) * 1000.0
+        self._phase_mark = now
+    
+    def _set_state(self, state: str) -> None:
+        """Move the session state machine, logging transitions it does not expect"""
+        if state not in TRANSITIONS[self.state]:
+            logger.warning(f"Unexpected session state change: {self.state} -> {state}")
+        logger.debug(f"Session state: {self.state} -> {state}")
+        self.state = state
+    
+    def _max_pending_bytes(self) -> int:
+        # 断线期间的缓存与回放窗口一样长，窗口内的断线不丢音频
+        limit_ms = max(self.pre_ready_ms, self.replay_window_ms) if self._reconnecting else self.pre_ready_ms
+        return self.sample_rate * 2 * limit_ms // 1000
+    
+    def _buffer_pending(self, data: bytes) -> None:
+        """Keep audio until the server acknowledges the session (caller holds the state lock)"""
+        self._pending.append(data)
+        self._pending_bytes += len(data)
+        while self._pending_bytes > self._max_pending_bytes() and len(self._pending) > 1:
+            dropped = self._pending.popleft()
+            self._pending_bytes -= len(dropped)
+            self.pre_ready_drops += 1
+            if self._reconnecting:
+                if self.audio_format == 'pcm':
+                    self.reconnect_metrics.lost_ms += len(dropped) * 1000.0 / (2 * self.sample_rate)
+                else:
+                    self.reconnect_metrics.lost_ms += self.frame_ms
+    
+    def _send_frame(self, data) -> None:
+        """Send one audio frame, keeping PCM in the replay window first"""
+        if self._replay is not None:
+            self._replay.append(data)
+        self.ws_client.send(data, websocket.ABNF.OPCODE_BINARY)
+    
+    def _send_queued(self, data: bytes) -> None:
+        """Send-queue sender: write one frame, or hand it back if the session is reconnecting"""
+        with self._state_lock:
+            if self.state in (STATE_CONNECTING, STATE_STARTED):
+                # 出队后连接断开，放回缓存最前面，保持顺序
+                self._pending.appendleft(data)
+                self._pending_bytes += len(data)
+                return
+            if self.state != STATE_STREAMING:
+                return
+            try:
+                self._send_frame(data)
+                # 日志记录在debug级别，避免过多输出
+                logger.debug(f"Sent {len(data)} bytes of audio data")
+            except websocket.WebSocketConnectionClosedException:
+                # 帧已进入回放窗口，重连后会重新发送
+                if self._replay is None:
+                    logger.error("Error sending audio data: connection closed")
+            except Exception as e:
+                logger.error(f"Error sending audio data: {str(e)}")
+                if self.on_error:
+                    self.on_error(e)
+    
+    def _flush_pending(self) -> None:
+        """
+        Send the audio buffered before the acknowledgement, then go live
+        
+        The backlog is written outside the state lock so send_audio_data never
+        waits on the network. Audio arriving meanwhile is buffered behind it,
+        since the state stays started, and goes out in the next round. The
+        state only becomes streaming once the buffer is empty.
+        """
+        with self._state_lock:
+            if self.state != STATE_STARTED:
+                return
+            resume = self._reconnecting
+            backlog, self._pending = self._pending, deque()
+            self._pending_bytes = 0
+        while True:
+            try:
+                if resume:
+                    # 回放音频排在断线期间缓存的音频之前
+                    resume = False
+                    self._resume()
+                while backlog:
+                    # 写失败的那一帧已进入回放窗口，不再放回缓存
+                    self._send_frame(backlog.popleft())
+            finally:
+                if backlog:
+                    # 连接断开：尚未发出的音频放回缓存最前面，保持顺序
+                    with self._state_lock:
+                        backlog.extend(self._pending)
+                        self._pending = backlog
+                        self._pending_bytes = sum(len(data) for data in backlog)
+            with self._state_lock:
+                if self.state != STATE_STARTED:
+                    return
+                if not self._pending:
+                    self._set_state(STATE_STREAMING)
+                    return
+                backlog, self._pending = self._pending, deque()
+                self._pending_bytes = 0
+    
+    def _resume(self) -> None:
+        """
+        Replay sent audio on a new connection from the last acknowledged sentence
+        end (called from _flush_pending without the state lock)
+        
+        The new connection's timeline starts with a silence frame followed by
+        the replayed audio; _conn_base maps it back to session offsets so
+        results can be compared with what was already delivered.
+        """
+        if self._replay is not None:
+            silence = silence_frame(self.frame_ms, self.sample_rate)
+            chunk = len(silence) // 2
+            offset = max(self._acked, self._replay.start)
+            if offset > self._acked:
+                lost = self._replay.samples_to_ms(offset - self._acked)
+                self.reconnect_metrics.lost_ms += lost
+                logger.warning(f"Replay window too short, {lost:.0f} ms of audio not replayed")
+            self.ws_client.send(silence, websocket.ABNF.OPCODE_BINARY)
+            for frame in self._replay.read_from(offset, chunk):
+                self.ws_client.send(frame, websocket.ABNF.OPCODE_BINARY)
+            self._conn_base = offset - chunk
+            self.reconnect_metrics.replayed_ms += self._replay.samples_to_ms(self._replay.end - offset)
+        
+        # 新连接的第1句紧接在最后一个最终结果之后
+        self._index_base = self._final_index
+        recovery_ms = (time.perf_counter() - self._dropped_at) * 1000.0
+        self.reconnect_metrics.recoveries += 1
+        self.reconnect_metrics.recovery_histogram.observe(recovery_ms)
+        self._reconnecting = False
+        logger.info(f"Session resumed after {recovery_ms:.0f} ms")
+    
+    def _is_duplicate(self, result: TranscriptionResult) -> bool:
+        """
+        Whether a result only covers audio that already produced a final result;
+        final results advance that boundary
+        
+        Args:
+            result: Decoded result; time_ms is the end of the recognised audio
+                on the current connection's timeline
+        """
+        if self._replay is None or result.time_ms is None:
+            return False
+        end = self._conn_base + self._replay.ms_to_samples(result.time_ms)
+        if end <= self._acked:
+            self.reconnect_metrics.duplicates_suppressed += 1
+            return True
+        if result.is_final:
+            self._acked = end
+        return False
+    
+    def _mark_ready(self) -> None:
+        """Server acknowledged the transcription: close the connect timing and wake waiters"""
+        self._mark_phase('start_response')
+        self._phases['total'] = (self._phase_mark - self._connect_start) * 1000.0
+        self.connect_metrics.observe(self._phases)
+        self.is_ready = True
+        with self._state_lock:
+            if self.state == STATE_CONNECTING:
+                self._set_state(STATE_STARTED)
+        self._flush_pending()
+        self._ready.set()
+    
+    def _mark_completed(self) -> None:
+        """Server finished the last sentence after StopTranscription"""
+        self._completed.set()
+    
+    def _begin_reconnect(self) -> bool:
+        """
+        Start resuming a live session whose connection dropped
+        
+        Returns:
+            False if the session was not live or reconnection is disabled
+        """
+        with self._state_lock:
+            if self.reconnect_attempts <= 0 or self.state not in (STATE_STARTED, STATE_STREAMING):
+                return False
+            # 断线期间的音频先进入缓存，重连成功后排在回放音频之后发送
+            self._set_state(STATE_CONNECTING)
+            self._reconnecting = True
+            self.is_ready = False
+            for data in self._outbound.drain():
+                self._buffer_pending(data)
+        self._dropped_at = time.perf_counter()
+        self.reconnect_metrics.drops += 1
+        self._stop_reconnect.clear()
+        logger.warning("WebSocket connection lost, reconnecting")
+        
+        self._reconnect_thread = threading.Thread(target=self._reconnect_thread_func, name='tingwu-reconnect')
+        self._reconnect_thread.daemon = True
+        self._reconnect_thread.start()
+        return True
+    
+    def _reconnect_thread_func(self) -> None:
+        """Reconnect thread function: retry with jittered exponential backoff"""
+        delay = self.reconnect_backoff
+        for attempt in range(1, self.reconnect_attempts + 1):
+            # 随机抖动，避免大量会话同时重连
+            wait = random.uniform(0, delay)
+            if self._stop_reconnect.wait(wait):
+                break
+            logger.info(f"Reconnect attempt {attempt}/{self.reconnect_attempts} after {wait:.2f}s")
+            try:
+                self._open(self.reconnect_timeout)
+                if self.wait_ready(self.reconnect_timeout):
+                    return
+            except Exception as e:
+                logger.warning(f"Reconnect attempt {attempt} failed: {str(e)}")
+            if self._stop_reconnect.is_set():
+                break
+            self._close_attempt()
+            delay = min(delay * 2, self.reconnect_backoff_max)
+        
+        self._close_attempt()
+        if not self._stop_reconnect.is_set():
+            self.reconnect_metrics.give_ups += 1
+            logger.error(f"Could not resume the session after {self.reconnect_attempts} attempts")
+        with self._state_lock:
+            self._reconnecting = False
+        self.is_streaming = False
+        self._mark_closed()
+        if self.on_connection_close:
+            self.on_connection_close()
+    
+    def _close_attempt(self) -> None:
+        """Close the connection of a failed reconnect attempt"""
+        if self.ws_client:
+            try:
+                self.ws_client.close()
+            except Exception as e:
+                logger.debug(f"Error closing reconnect attempt: {str(e)}")
+        ws_thread = getattr(self, 'ws_thread', None)
+        if ws_thread and ws_thread is not threading.current_thread():
+            ws_thread.join(timeout=2)
+    
+    def _mark_closed(self) -> None:
+        """Connection ended or failed: wake everyone waiting on it"""
+        if not self.is_connected and not self._open_done.is_set():
+            self.connect_metrics.failures += 1
+        self.is_ready = False
+        with self._state_lock:
+            if self.state != STATE_CLOSED:
+                self._set_state(STATE_CLOSED)
+            self._pending.clear()
+            self._pending_bytes = 0
+        self._outbound.clear()
+        self._open_done.set()
+        self._ready.set()
+        self._completed.set()
+        self._closed.set()
+    
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until the server has acknowledged the transcription start
+        
+        Args:
+            timeout: Maximum seconds to wait
+            
+        Returns:
+            True if the session is ready, False on timeout or if the connection closed
+        """
+        return self._ready.wait(timeout) and self.is_ready
+    
+    def wait_closed(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until the connection is closed
+        
+        Args:
+            timeout: Maximum seconds to wait
+            
+        Returns:
+            True if the connection is closed
+        """
+        return self._closed.wait(timeout)
+    
+    def get_reconnect_stats(self) -> Dict:
+        """
+        Get automatic reconnection counters
+        
+        Returns:
+            Dictionary with drops, recoveries, replayed audio and the recovery
+            time histogram (ms)
+        """
+        return self.reconnect_metrics.snapshot()
+    
+    def get_delta_stats(self) -> Dict:
+        """
+        Get delta result counters
+        
+        Returns:
+            Dictionary with result count, unchanged partials skipped and
+            characters received vs. forwarded
+        """
+        return self._delta.get_stats()
+    
+    def get_send_queue_stats(self) -> Dict:
+        """
+        Get outbound audio queue counters
+        
+        Returns:
+            Dictionary with depth, dropped bytes and the enqueue-to-wire latency histogram (ms)
+        """
+        return self._outbound.get_stats()
+    
+    def get_control_stats(self) -> Dict:
+        """
+        Get control-plane call timings and connection reuse
+        
+        Returns:
+            Dictionary as returned by ControlPlaneClient.get_stats() (empty
+            before the first task was created)
+        """
+        return self.control_client.get_stats() if self.control_client else {}
+    
+    def get_connect_stats(self) -> Dict:
+        """
+        Get connection set-up timing
+        
+        Returns:
+            Dictionary with attempts, failures and per-phase histograms (ms)
+        """
+        return self.connect_metrics.snapshot()
+    
+    def _open_socket(self, timeout: float) -> socket.socket:
+        """
+        Resolve, connect and (for wss) TLS-wrap the socket ourselves so each phase
+        can be timed; websocket-client then only performs the upgrade on it
+        
+        Args:
+            timeout: Timeout in seconds for each blocking step
+            
+        Returns:
+            Connected socket ready for the WebSocket handshake
+        """
+        url = urllib.parse.urlparse(self.ws_url)
+        secure = url.scheme == 'wss'
+        port = url.port or (443 if secure else 80)
+        
+        infos = socket.getaddrinfo(url.hostname, port, type=socket.SOCK_STREAM)
+        self._mark_phase('dns')
+        
+        error = None
+        for family, sock_type, proto, _, address in infos:
+            sock = socket.socket(family, sock_type, proto)
+            sock.settimeout(timeout)
+            try:
+                sock.connect(address)
+                break
+            except OSError as e:
+                sock.close()
+                error = e
+        else:
+            raise error or OSError(f"Could not connect to {url.hostname}:{port}")
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._mark_phase('tcp')
+        
+        if secure:
+            # 不验证服务器证书，与原有 sslopt 设置一致
+            context = ssl.create_default_context()
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+            sock = context.wrap_socket(sock, server_hostname=url.hostname)
+            self._mark_phase('tls')
+        
+        sock.settimeout(None)
+        return sock
+    
     def _on_ws_open(self, ws):
         """WebSocket open callback"""
         logger.info("WebSocket connection established")
+        self._mark_phase('upgrade')
         self.is_connected = True
+        self._closed.clear()
+        self._open_done.set()
         
         try:
             # 首先发送JSON握手消息
             # 根据通义听悟API文档，需要发送初始化参数
-            init_message = {
-                "header": {
-                    "namespace": "SpeechTranscriber",
-                    "name": "StartTranscription",
-                    "status": 0,
-                    "message_id": str(int(time.time()*1000))  # 使用当前时间戳作为消息ID
-                },
-                "payload": {
-                    "task_id": self.task_id,
-                    "format": "pcm",
-                    "sample_rate": 16000,
-                    "enable_intermediate_result": True,
-                    "enable_punctuation_prediction": True,
-                    "enable_inverse_text_normalization": True
-                }
-            }
+            init_json = start_transcription_message(self.task_id, self.audio_format, self.sample_rate)
             
-            # 发送初始化JSON消息
-            init_json = json.dumps(init_message)
+            # 发送初始化JSON消息；音频在服务端确认后才发送，这里不再阻塞等待
             logger.info(f"Sending initialization JSON: {init_json}")
             ws.send(init_json)
             logger.info("Sent initialization JSON message")
             
-            # 短暂等待处理初始化消息
-            time.sleep(0.1)
-            
-            # 使用numpy生成空白音频数据 (30ms of silence at 16kHz 16bit mono)
-            # 16kHz, 16bit = 2 bytes per sample, 30ms = 0.03s
-            # 0.03s * 16000 samples/s = 480 samples
-            # 480 samples * 2 bytes/sample = 960 bytes
-            silence_samples = np.zeros(480, dtype=np.int16)  # 16-bit silence (zeros)
-            empty_audio = silence_samples.tobytes()  # 转换为字节流
-            
-            # 记录音频帧长度与格式
-            logger.debug(f"Generated {len(empty_audio)} bytes of silent audio data")
-            
-            # 发送空白音频帧
-            ws.send(empty_audio, websocket.ABNF.OPCODE_BINARY)
-            logger.info("Sent initial empty audio frame")
-            
-            # 延迟一小段时间确保连接稳定
-            time.sleep(0.1)
-            
         except Exception as e:
             logger.error(f"Error during WebSocket initialization: {str(e)}")
             # 添加更详细的错误诊断信息
@@ -293,75 +706,30 @@ class TingwuSDK:
             self.on_connection_open()
     
     def _on_ws_message(self, ws, message):
-        """WebSocket message callback"""
+        """WebSocket message callback: decode once, then dispatch by message name"""
         try:
-            # 尝试解析为JSON，但也处理二进制消息
             try:
-                data = json.loads(message)
-                logger.debug(f"Received message: {data}")
-                
-                # 检查消息头部以确定消息类型
-                if 'header' in data:
-                    header = data['header']
-                    name = header.get('name', '')
-                    namespace = header.get('namespace', '')
-                    status = header.get('status', 0)
-                    
-                    # 根据消息类型处理
-                    if namespace == 'SpeechTranscriber':
-                        # 处理开始转写的响应
-                        if name == 'StartTranscriptionResponse':
-                            if status == 20000000:
-                                logger.info("Transcription started successfully")
-                            else:
-                                logger.error(f"Failed to start transcription: {status} - {header.get('message', 'Unknown error')}")
-                        
-                        # 处理转写结果
-                        elif name == 'TranscriptionResultChanged':
-                            if 'payload' in data and 'result' in data['payload']:
-                                result = data['payload']['result']
-                                is_final = data['payload'].get('is_final', False)
-                                confidence = data['payload'].get('confidence', 0)
-                                
-                                # 打印转写结果
-                                if is_final:
-                                    logger.info(f"Final result: {result} (confidence: {confidence})")
-                                else:
-                                    logger.debug(f"Intermediate result: {result} (confidence: {confidence})")
-                                
-                                # 调用回调函数 - 同时支持新旧两种回调机制
-                                if self.on_result:
-                                    self.on_result(result, is_final, confidence)
-                                    
-                                # 向后兼容旧版回调
-                                if self.on_transcription_result:
-                                    self.on_transcription_result(result)
-                        
-                        # 处理完成事件
-                        elif name == 'TranscriptionCompleted':
-                            logger.info("Transcription completed")
-                            if self.on_completed:
-                                self.on_completed()
-                        
-                        # 处理转写错误
-                        elif name == 'TaskFailed':
-                            error_code = header.get('status', 0)
-                            error_message = header.get('message', 'Unknown error')
-                            logger.error(f"Transcription task failed: {error_code} - {error_message}")
-                            if self.on_error:
-                                self.on_error(Exception(f"Transcription failed: {error_message}"))
-                    
-                    # 处理其他类型的消息
-                    else:
-                        logger.debug(f"Received message from namespace {namespace}: {name}")
-                
-                # 无头部的消息（不常见）
-                else:
-                    logger.warning(f"Received message without header: {data}")
-                    
-            except json.JSONDecodeError:
-                # 处理二进制消息（一般不应该接收到）
-                logger.debug(f"Received binary message of length {len(message)}")
+                event = decode_message(message)
+            except ValueError:
+                # 处理二进制或非JSON消息（一般不应该接收到）
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"Received non-JSON message of length {len(message)}")
+                return
+            
+            # 无头部的消息（不常见）
+            if event is None:
+                logger.warning(f"Received message without header: {message}")
+                return
+            
+            # 只在确实输出调试日志时才格式化消息内容
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Received message: {event.namespace}.{event.name} {event.payload}")
+            
+            if event.namespace != NAMESPACE:
+                return
+            handler = self._handlers.get(event.name)
+            if handler:
+                handler(event)
                 
         except Exception as e:
             logger.error(f"Error processing WebSocket message: {str(e)}")
@@ -372,11 +740,98 @@ class TingwuSDK:
             if self.on_error:
                 self.on_error(e)
     
+    def _handle_started(self, event: ServerEvent) -> None:
+        """处理开始转写的响应"""
+        if event.status == STATUS_OK:
+            logger.info("Transcription started successfully")
+            self._mark_ready()
+        else:
+            logger.error(f"Failed to start transcription: {event.status} - {event.message or 'Unknown error'}")
+            self._ready.set()
+    
+    def _handle_result(self, result: TranscriptionResult) -> None:
+        """处理转写结果（SentenceEnd 为一句话的最终结果）"""
+        if result.text is None:
+            return
+        
+        # 重连回放后，已经给出过最终结果的音频不再重复上报
+        if self._is_duplicate(result):
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Suppressed duplicate result: {result.text}")
+            return
+        
+        # 句子序号换算为整个会话内的序号，增量跟踪和追踪按它区分句子
+        if result.index is not None:
+            result.index += self._index_base
+            if result.is_final:
+                self._final_index = result.index
+        
+        # 打印转写结果
+        if result.is_final:
+            logger.info(f"Final result: {result.text} (confidence: {result.confidence})")
+        elif logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Intermediate result: {result.text} (confidence: {result.confidence})")
+        
+        self.current_index = result.index
+        if tracer.enabled:
+            self._trace_result(result)
+        
+        # 调用回调函数 - 同时支持新旧两种回调机制
+        if self.on_result:
+            with tracer.span('on_result', 'sdk', {'index': result.index}):
+                self.on_result(result.text, result.is_final, result.confidence)
+            
+        # 向后兼容旧版回调
+        if self.on_transcription_result:
+            self.on_transcription_result(result.text)
+        
+        # 增量模式：只上报相对上一条中间结果变化的部分
+        if self.on_result_delta:
+            delta = self._delta.update(result.index, result.text, result.is_final)
+            if delta:
+                with tracer.span('on_result_delta', 'sdk', {'index': result.index}):
+                    self.on_result_delta(delta)
+        
+        if result.is_final and tracer.enabled:
+            tracer.end_async('utterance', result.index, 'sdk')
+            self._traced_index = None
+    
+    def _trace_result(self, result: TranscriptionResult) -> None:
+        """在追踪中标记每句话的第一个中间结果和最终结果"""
+        if result.index != self._traced_index:
+            # 本连接上该句的第一个结果，开始一个 utterance 异步区间
+            self._traced_index = result.index
+            tracer.begin_async('utterance', result.index, 'sdk')
+            tracer.instant('first_partial', 'sdk', {'index': result.index, 'time_ms': result.time_ms})
+        if result.is_final:
+            tracer.instant('final', 'sdk', {'index': result.index, 'time_ms': result.time_ms})
+    
+    def _handle_completed(self, event: ServerEvent) -> None:
+        """处理完成事件"""
+        logger.info("Transcription completed")
+        self._mark_completed()
+        if self.on_completed:
+            self.on_completed()
+    
+    def _handle_task_failed(self, event: ServerEvent) -> None:
+        """处理转写错误"""
+        logger.error(f"Transcription task failed: {event.status} - {event.message or 'Unknown error'}")
+        if self.on_error:
+            self.on_error(Exception(f"Transcription failed: {event.message or 'Unknown error'}"))
+    
     def _on_ws_error(self, ws, error):
         """WebSocket error callback"""
         # 提供详细的错误诊断信息
         logger.error(f"WebSocket error: {str(error)}")
         
+        # 握手阶段出错时立即唤醒 start_streaming，而不是等到超时
+        if not self.is_connected:
+            if self._reconnecting:
+                self._open_done.set()
+                self._ready.set()
+            else:
+                self._mark_closed()
+        
         # 检查常见错误类型并提供更具体的建议
         if isinstance(error, ConnectionRefusedError):
             logger.error("Connection refused. Server may be down or the URL is incorrect.")
@@ -472,13 +927,31 @@ class TingwuSDK:
                 logger.warning(f"Unknown close code: {close_status_code}")
                 
         self.is_connected = False
+        
+        # 重连尝试失败时由重连线程决定下一步；在线会话断开则开始重连
+        if self._reconnecting:
+            self._open_done.set()
+            self._ready.set()
+            return
+        if self._begin_reconnect():
+            return
+        
         self.is_streaming = False
+        self._mark_closed()
         
         if self.on_connection_close:
             self.on_connection_close()
     
-    def start_streaming(self):
-        """Start WebSocket streaming"""
+    def start_streaming(self, connection_timeout: float = 15):
+        """
+        Start WebSocket streaming
+        
+        Returns once the WebSocket is open; use wait_ready() to also wait for the
+        server to acknowledge the transcription start.
+        
+        Args:
+            connection_timeout: Seconds to wait for the connection to open
+        """
         if not self.task_id:
             raise Exception("Task ID is required. Please create a task first.")
         
@@ -494,102 +967,198 @@ class TingwuSDK:
         
         logger.info(f"Starting WebSocket connection to: {self.ws_url}")
         
+        # 进入 connecting 状态；握手完成前的音频先进入缓存，PCM 以一帧空白音频开头
+        with self._state_lock:
+            self._set_state(STATE_CONNECTING)
+            self._pending.clear()
+            self._pending_bytes = 0
+            if self.audio_format == 'pcm':
+                self._buffer_pending(silence_frame(self.frame_ms, self.sample_rate))
+        self._completed.clear()
+        
+        # 新会话的音频偏移从零开始；只有PCM可以按偏移回放
+        self._replay = None
+        if self.audio_format == 'pcm' and self.reconnect_attempts > 0 and self.replay_window_ms > 0:
+            self._replay = PCMReplayWindow(self.replay_window_ms, self.sample_rate)
+        self._conn_base = 0
+        self._acked = 0
+        self._index_base = 0
+        self._final_index = 0
+        self._delta.reset()
+        
+        # 上行队列先于连接启动：确认可能在 _open 返回前到达并切换到 streaming
+        self._outbound.start()
+        try:
+            self._open(connection_timeout)
+        except Exception:
+            with self._state_lock:
+                if self.state != STATE_CLOSED:
+                    self._set_state(STATE_CLOSED)
+            self._outbound.stop()
+            raise
+        
+        logger.info("WebSocket connection established successfully")
+        self.is_streaming = True
+    
+    def _open(self, connection_timeout: float) -> None:
+        """
+        Open one WebSocket connection and send the StartTranscription handshake;
+        used for the initial connect and for every reconnect attempt
+        
+        Args:
+            connection_timeout: Seconds to wait for the connection to open
+        """
         # 启用WebSocket跟踪，调试时可打开
         websocket.enableTrace(False)
         
         # 重要：通义听悟WebSocket连接的关键在于使用标准WebSocket头部
         # URL中包含了所有必要的认证信息，不需要添加自定义头部
         # 阿里云文档显示的通义听悟API使用的是标准WebSocket连接
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36"
-        }
+        headers = HEADERS
         
         # 记录连接信息
         logger.debug(f"WebSocket connection URL: {self.ws_url}")
         logger.debug(f"WebSocket headers: {headers}")
         
-        # 创建WebSocket连接
+        # 重置连接状态事件并开始计时
+        self.is_ready = False
+        self._open_done.clear()
+        self._ready.clear()
+        self._phases = {}
+        self._connect_start = self._phase_mark = time.perf_counter()
+        self.connect_metrics.attempts += 1
+        
+        # DNS/TCP/TLS 由我们自己完成以便分别计时（TLS 不验证服务器证书）
+        try:
+            sock = self._open_socket(connection_timeout)
+        except Exception as e:
+            self.connect_metrics.failures += 1
+            logger.error(f"WebSocket connection failed: {str(e)}")
+            raise Exception(f"WebSocket connection failed: {str(e)}")
+        
+        # 创建WebSocket连接，只在已建立的socket上完成升级握手
         self.ws_client = websocket.WebSocketApp(
             self.ws_url,
             header=headers,
             on_open=self._on_ws_open,
             on_message=self._on_ws_message,
             on_error=self._on_ws_error,
-            on_close=self._on_ws_close
+            on_close=self._on_ws_close,
+            socket=sock
         )
         
-        # SSL选项
-        sslopt = {
-            "cert_reqs": ssl.CERT_NONE,  # 不验证服务器证书
-            "check_hostname": False      # 不检查主机名
-        }
-        
         # 启动WebSocket线程
         self.ws_thread = threading.Thread(target=self.ws_client.run_forever, kwargs={
             "ping_interval": 10,          # 心跳间隔
             "ping_timeout": 5,           # 超时时间
             "skip_utf8_validation": True, # 跳过UTF8验证，因为我们发送二进制数据
-            "sslopt": sslopt,            # SSL选项
             "http_proxy_host": None,      # 如果需要代理，这里可以设置
             "http_proxy_port": None
         })
         self.ws_thread.daemon = True
         self.ws_thread.start()
         
-        # 等待连接建立
-        connection_timeout = 15  # 秒
-        connection_start_time = time.time()
-        
-        while not self.is_connected and time.time() - connection_start_time < connection_timeout:
-            time.sleep(0.1)
-        
-        if not self.is_connected:
+        # 等待握手完成（成功或失败都会立即唤醒）
+        if not self._open_done.wait(connection_timeout) or not self.is_connected:
             logger.error(f"WebSocket connection failed to establish within {connection_timeout} seconds")
             raise Exception(f"WebSocket connection failed to establish within {connection_timeout} seconds")
-        
-        logger.info("WebSocket connection established successfully")
-        self.is_streaming = True
     
     def send_audio_data(self, audio_data: bytes) -> None:
         """Send audio data to Tingwu API via WebSocket
         
+        Audio passed before the server has acknowledged the session is copied
+        into a bounded buffer and sent as soon as the acknowledgement arrives.
+        Afterwards frames go through the outbound queue and are written by its
+        sender thread, so this never waits on the network unless the queue
+        uses the 'block' policy.
+        
         Args:
             audio_data: Audio data in bytes (should match the format specified in create_task)
         """
-        if not self.is_connected or not self.is_streaming:
-            logger.error("WebSocket not connected")
-            return
+        if self.state != STATE_STREAMING:
+            with self._state_lock:
+                if self.state in (STATE_CONNECTING, STATE_STARTED):
+                    self._buffer_pending(bytes(audio_data))
+                    return
+                if self.state != STATE_STREAMING:
+                    logger.error("WebSocket not connected")
+                    return
             
+        # 交给上行队列，由发送线程写入socket；队列满时按策略处理
+        self._outbound.put(audio_data)
+    
+    def _abort_connection(self) -> None:
+        """Close a connection whose session never started
+        
+        on_open fires before run_forever registers the socket with its selector,
+        so a WebSocketApp.close() right after start_streaming() can close the file
+        descriptor under it and leave the WebSocket thread asleep until the ping
+        timeout. Shutting the socket down instead always wakes the selector, and
+        run_forever closes the descriptor itself during teardown.
+        """
+        self.ws_client.keep_running = False
+        ws = self.ws_client.sock
+        if not ws or not ws.sock:
+            return
         try:
-            # 直接通过WebSocket发送二进制音频数据
-            if self.ws_client:
-                self.ws_client.send(audio_data, websocket.ABNF.OPCODE_BINARY)
-                # 日志记录在debug级别，避免过多输出
-                logger.debug(f"Sent {len(audio_data)} bytes of audio data")
-            else:
-                logger.error("WebSocket client not initialized")
-        except Exception as e:
-            logger.error(f"Error sending audio data: {str(e)}")
-            if self.on_error:
-                self.on_error(e)
+            ws.send_close()
+            ws.sock.shutdown(socket.SHUT_RDWR)
+        except (OSError, websocket.WebSocketException) as e:
+            logger.debug(f"Closing unstarted connection: {str(e)}")
     
-    def stop_streaming(self) -> None:
-        """Stop WebSocket streaming"""
+    def stop_streaming(self, drain_timeout: float = 5) -> None:
+        """
+        Stop WebSocket streaming
+        
+        A live session is drained first: StopTranscription is sent and the final
+        results are awaited (up to drain_timeout) before the socket is closed.
+        
+        Args:
+            drain_timeout: Seconds to wait for TranscriptionCompleted
+        """
+        # 正在重连时先结束重连线程（同时唤醒它正在等待的连接）
+        reconnect_thread = self._reconnect_thread
+        if reconnect_thread and reconnect_thread is not threading.current_thread():
+            self._stop_reconnect.set()
+            self._open_done.set()
+            self._ready.set()
+            reconnect_thread.join(timeout=self.reconnect_timeout)
+            self._reconnect_thread = None
+        
         if self.ws_client and self.is_connected:
             logger.info("Stopping WebSocket streaming")
             try:
+                # 先把队列中的音频发完
+                if not self._outbound.flush(drain_timeout):
+                    logger.warning(f"Send queue not drained within {drain_timeout} seconds")
+                
                 # 设置状态标记
-                self.is_streaming = False
+                with self._state_lock:
+                    was_live = self.state in (STATE_STARTED, STATE_STREAMING)
+                    if self._pending:
+                        logger.warning(f"Discarding {len(self._pending)} audio frames buffered before the session started")
+                    self._set_state(STATE_DRAINING)
+                    self.is_streaming = False
                 
-                # 关闭WebSocket连接
-                self.ws_client.close()
+                # 请求服务端结束最后一句，并等待 TranscriptionCompleted
+                if was_live:
+                    self.ws_client.send(stop_transcription_message(self.task_id))
+                    if not self._completed.wait(drain_timeout):
+                        logger.warning(f"Transcription not completed within {drain_timeout} seconds")
                 
+                # 关闭WebSocket连接
+                if was_live:
+                    self.ws_client.close()
+                else:
+                    self._abort_connection()
+
                 # 等待线程结束
                 if hasattr(self, 'ws_thread') and self.ws_thread:
                     self.ws_thread.join(timeout=5)
                 
                 # 状态更新
                 self.is_connected = False
+                self._outbound.stop()
                 
                 logger.info("WebSocket streaming stopped successfully")
             except Exception as e:
@@ -601,7 +1170,8 @@ class TingwuSDK:
                      on_transcription_result: Optional[Callable] = None,
                      on_connection_open: Optional[Callable] = None,
                      on_connection_close: Optional[Callable] = None,
-                     on_error: Optional[Callable] = None) -> None:
+                     on_error: Optional[Callable] = None,
+                     on_result_delta: Optional[Callable] = None) -> None:
         """
         Set callbacks for different events
         
@@ -610,9 +1180,12 @@ class TingwuSDK:
             on_connection_open: Callback when WebSocket connection opens
             on_connection_close: Callback when WebSocket connection closes
             on_error: Callback for errors
+            on_result_delta: Callback receiving a ResultDelta per changed result
+                instead of the full sentence text
         """
         self.on_transcription_result = on_transcription_result
         self.on_connection_open = on_connection_open
         self.on_connection_close = on_connection_close
         self.on_error = on_error
+        self.on_result_delta = on_result_delta
         logger.debug("Callbacks set")
@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+Lightweight span tracing exported as Chrome trace-event JSON
+
+Open the exported file in https://ui.perfetto.dev or chrome://tracing.
+Instrumented code uses the shared `tracer`, which is disabled by default:
+
+    if tracer.enabled:
+        tracer.instant('final', 'sdk', {'index': index})
+
+    with tracer.span('on_result', 'sdk'):
+        ...
+
+While disabled, span() returns a shared no-op context manager and every
+other call returns at its first line, so instrumentation costs one
+attribute check. An utterance is an async span keyed by its sentence
+index; the events on its way (partials, callbacks, delivery) carry the
+same index in their args.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+# Default cap on buffered events; the oldest are dropped beyond it
+DEFAULT_MAX_EVENTS = 500000
+
+
+def _now_us() -> float:
+    return time.perf_counter_ns() / 1000.0
+
+
+class _NullSpan:
+    """Context manager returned by span() while tracing is off"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    """Records one complete ('X') event when the block exits"""
+    __slots__ = ('tracer', 'name', 'cat', 'args', 'start')
+
+    def __init__(self, tracer: 'Tracer', name: str, cat: str, args: Optional[Dict]):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self):
+        self.start = _now_us()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.complete(self.name, self.cat, self.start, _now_us() - self.start, self.args)
+        return False
+
+
+class Tracer:
+    """
+    Collects trace events in a bounded in-memory buffer
+
+    Timestamps are perf_counter microseconds; use Tracer.now() for a start
+    time recorded on one thread and closed with complete() on another.
+    """
+    def __init__(self, max_events: int = DEFAULT_MAX_EVENTS):
+        self.enabled = False
+        self.pid = os.getpid()
+        self._events = deque(maxlen=max_events)
+        self._threads = {}
+        self._lock = threading.Lock()
+
+    now = staticmethod(_now_us)
+
+    def enable(self, max_events: Optional[int] = None) -> None:
+        """Start recording, optionally resizing the event buffer"""
+        if max_events is not None:
+            self._events = deque(self._events, maxlen=max_events)
+        self.enabled = True
+
+    def disable(self) -> None:
+        """Stop recording; buffered events are kept for export"""
+        self.enabled = False
+
+    def clear(self) -> None:
+        """Drop every buffered event"""
+        with self._lock:
+            self._events.clear()
+            self._threads.clear()
+
+    def _record(self, event: Dict) -> None:
+        thread = threading.current_thread()
+        event['pid'] = self.pid
+        event['tid'] = thread.ident
+        if thread.ident not in self._threads:
+            with self._lock:
+                self._threads[thread.ident] = thread.name
+        self._events.append(event)
+
+    def span(self, name: str, cat: str = 'app', args: Optional[Dict] = None):
+        """
+        Time a block as one complete event
+
+        Args:
+            name: Event name
+            cat: Category, used for filtering in the viewer
+            args: Extra values shown with the event (e.g. {'index': 3})
+
+        Returns:
+            A context manager
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, cat, args)
+
+    def complete(self, name: str, cat: str, start_us: float, dur_us: float, args: Optional[Dict] = None) -> None:
+        """
+        Record a complete event whose start was taken earlier (e.g. on another thread)
+
+        Args:
+            name: Event name
+            cat: Category
+            start_us: Start time from Tracer.now()
+            dur_us: Duration in microseconds
+            args: Extra values
+        """
+        if not self.enabled:
+            return
+        event = {'name': name, 'cat': cat, 'ph': 'X', 'ts': start_us, 'dur': dur_us}
+        if args:
+            event['args'] = args
+        self._record(event)
+
+    def instant(self, name: str, cat: str = 'app', args: Optional[Dict] = None) -> None:
+        """Record a point in time on the calling thread"""
+        if not self.enabled:
+            return
+        event = {'name': name, 'cat': cat, 'ph': 'i', 's': 't', 'ts': _now_us()}
+        if args:
+            event['args'] = args
+        self._record(event)
+
+    def begin_async(self, name: str, id, cat: str = 'app', args: Optional[Dict] = None) -> None:
+        """
+        Open an async span that may end on another thread
+
+        Args:
+            name: Span name; begin and end must use the same name, id and cat
+            id: Correlation id, e.g. the sentence index
+            cat: Category
+            args: Extra values
+        """
+        if not self.enabled:
+            return
+        event = {'name': name, 'cat': cat, 'ph': 'b', 'id': str(id), 'ts': _now_us()}
+        if args:
+            event['args'] = args
+        self._record(event)
+
+    def end_async(self, name: str, id, cat: str = 'app', args: Optional[Dict] = None) -> None:
+        """Close an async span opened with begin_async"""
+        if not self.enabled:
+            return
+        event = {'name': name, 'cat': cat, 'ph': 'e', 'id': str(id), 'ts': _now_us()}
+        if args:
+            event['args'] = args
+        self._record(event)
+
+    def counter(self, name: str, values: Dict[str, float], cat: str = 'app') -> None:
+        """Record counter values (drawn as a track, e.g. queue depth)"""
+        if not self.enabled:
+            return
+        self._record({'name': name, 'cat': cat, 'ph': 'C', 'ts': _now_us(), 'args': values})
+
+    def event_count(self) -> int:
+        """Number of buffered events"""
+        return len(self._events)
+
+    def export(self, path: str) -> int:
+        """
+        Write the buffered events as Chrome trace-event JSON
+
+        Args:
+            path: Output file
+
+        Returns:
+            Number of events written
+        """
+        with self._lock:
+            threads = dict(self._threads)
+        events = list(self._events)
+        metadata = [{'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': tid, 'args': {'name': name}}
+                    for tid, name in threads.items()]
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': metadata + events, 'displayTimeUnit': 'ms'}, f, ensure_ascii=False)
+        return len(events)
+
+
+# Process-wide tracer shared by all instrumented modules
+tracer = Tracer()
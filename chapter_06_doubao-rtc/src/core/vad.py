@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+import time
+from typing import Callable, Dict
+
+import numpy as np
+
+from utils.logger import logger
+
+
+class VoiceActivityGate:
+    """
+    Energy plus zero-crossing voice activity gate for 16-bit mono PCM
+
+    Sits between AudioCapture and send_audio_data: chunks are analysed in short
+    frames with NumPy, and only speech (plus a short pre-roll lead-in and a
+    hangover tail) is forwarded to the audio callback.
+
+    Analysis and pre-roll use preallocated scratch arrays, so incoming chunks
+    may be pooled buffers that are reused as soon as process() returns, and
+    classifying a chunk allocates no sample-sized arrays. Only the
+    zero-crossing check on quiet-but-not-silent frames makes temporaries.
+    """
+    def __init__(self,
+                 sample_rate: int = 16000,
+                 frame_ms: int = 10,
+                 energy_threshold_db: float = -45.0,
+                 zcr_threshold: float = 0.25,
+                 hangover_ms: int = 400,
+                 pre_roll_ms: int = 300):
+        """
+        Initialize the gate
+
+        Args:
+            sample_rate: Sample rate of the incoming PCM in Hz
+            frame_ms: Analysis frame length in milliseconds
+            energy_threshold_db: Frame RMS level (dBFS) above which a frame is speech
+            zcr_threshold: Zero-crossing rate above which a frame up to 10 dB
+                below the energy threshold still counts as (unvoiced) speech
+            hangover_ms: How long the gate stays open after the last speech frame
+            pre_roll_ms: How much audio before the speech onset is forwarded
+        """
+        self.sample_rate = sample_rate
+        self.frame_len = max(1, sample_rate * frame_ms // 1000)
+        self.energy_threshold_db = energy_threshold_db
+        self.zcr_threshold = zcr_threshold
+        self.hangover_frames = max(1, hangover_ms // frame_ms)
+        self.pre_roll_bytes = sample_rate * pre_roll_ms // 1000 * 2
+        self.pre_roll_samples = self.pre_roll_bytes // 2
+
+        self.on_audio_data = None
+
+        # Per-frame sum-of-squares thresholds so the hot path avoids log10 and
+        # the division by the frame length; 0-d arrays skip the scalar conversion
+        speech_power = (10 ** (energy_threshold_db / 10)) * (32768.0 ** 2)
+        self._speech_energy = np.array(speech_power * self.frame_len, dtype=np.float32)
+        self._unvoiced_energy = np.array(speech_power * self.frame_len / 10, dtype=np.float32)
+        self._ones = np.ones(self.frame_len, dtype=np.float32)
+
+        # Scratch space for analysis; grown on demand, then reused for every chunk
+        self._work = np.zeros(0, dtype=np.float32)
+        self._squares = np.zeros(0, dtype=np.float32)
+        self._energy = np.zeros(0, dtype=np.float32)
+        self._speech = np.zeros(0, dtype=bool)
+        self._unvoiced = np.zeros(0, dtype=bool)
+        self._remainder_len = 0
+
+        # Pre-roll is a circular copy of the most recent suppressed audio
+        self._pre_roll = np.zeros(self.pre_roll_samples, dtype=np.int16)
+        self._pre_roll_view = memoryview(self._pre_roll).cast('B')
+        self._pre_roll_pos = 0
+        self._pre_roll_fill = 0
+        self._hangover = 0
+
+        self.is_open = False
+        self.last_voice_time = time.monotonic()
+        self.chunks_in = 0
+        self.chunks_forwarded = 0
+        self.bytes_suppressed = 0
+
+        logger.info(f"VoiceActivityGate initialized with threshold={energy_threshold_db}dBFS, zcr={zcr_threshold}, hangover={hangover_ms}ms, pre_roll={pre_roll_ms}ms")
+
+    def set_audio_callback(self, callback: Callable[[bytes], None]) -> None:
+        """
+        Set callback for gated audio data
+
+        Args:
+            callback: Function to call with audio that passed the gate
+        """
+        self.on_audio_data = callback
+
+    def reset(self) -> None:
+        """Close the gate, drop buffered pre-roll and restart the silence clock"""
+        self._remainder_len = 0
+        self._pre_roll_pos = 0
+        self._pre_roll_fill = 0
+        self._hangover = 0
+        self.is_open = False
+        self.last_voice_time = time.monotonic()
+
+    def silence_seconds(self) -> float:
+        """Seconds since the last frame classified as speech"""
+        return time.monotonic() - self.last_voice_time
+
+    def _speech_frames(self, samples: np.ndarray) -> np.ndarray:
+        """
+        Classify every complete analysis frame in one vectorized pass
+
+        Args:
+            samples: Float samples, including the remainder of the previous chunk
+
+        Returns:
+            Boolean array with one entry per complete frame (a view of scratch
+            space, valid until the next chunk)
+        """
+        n_frames = samples.size // self.frame_len
+        used = n_frames * self.frame_len
+        frames = samples[:used].reshape(n_frames, self.frame_len)
+        squares = np.multiply(frames, frames, out=self._squares[:used].reshape(n_frames, self.frame_len))
+        # A matrix-vector product sums the rows without the reduction machinery's temporaries
+        energy = np.dot(squares, self._ones, out=self._energy[:n_frames])
+        speech = np.greater(energy, self._speech_energy, out=self._speech[:n_frames])
+
+        # Zero-crossing rate only decides the quiet-but-not-silent frames;
+        # speech frames are above both thresholds, so xor leaves the quiet ones
+        unvoiced = np.greater(energy, self._unvoiced_energy, out=self._unvoiced[:n_frames])
+        np.logical_xor(unvoiced, speech, out=unvoiced)
+        if np.count_nonzero(unvoiced):
+            signs = np.signbit(frames[unvoiced])
+            zcr = np.mean(signs[:, 1:] != signs[:, :-1], axis=1)
+            speech[unvoiced] = zcr > self.zcr_threshold
+        return speech
+
+    def process(self, data: bytes) -> None:
+        """
+        Analyse one chunk and forward it if it belongs to speech
+
+        Args:
+            data: 16-bit mono PCM chunk
+        """
+        self.chunks_in += 1
+        pcm = np.frombuffer(data, dtype=np.int16)
+        total = self._remainder_len + pcm.size
+        if total > self._work.size:
+            work = np.zeros(total, dtype=np.float32)
+            work[:self._remainder_len] = self._work[:self._remainder_len]
+            self._work = work
+            self._squares = np.zeros(total, dtype=np.float32)
+            self._energy = np.zeros(total // self.frame_len, dtype=np.float32)
+            self._speech = np.zeros(total // self.frame_len, dtype=bool)
+            self._unvoiced = np.zeros(total // self.frame_len, dtype=bool)
+        samples = self._work[:total]
+        samples[self._remainder_len:] = pcm
+        speech = self._speech_frames(samples)
+        tail = speech.size * self.frame_len
+        self._remainder_len = total - tail
+        # Move the partial frame to the front of the scratch buffer for next time
+        self._work[:self._remainder_len] = samples[tail:]
+
+        # Walk the hangover counter across frames: open if any frame keeps it alive
+        is_open = False
+        if speech.size:
+            if np.count_nonzero(speech):
+                self.last_voice_time = time.monotonic()
+                # argmax of the reversed view finds the last speech frame without an index array
+                frames_since = int(speech[::-1].argmax())
+                self._hangover = max(0, self.hangover_frames - frames_since)
+                is_open = True
+            else:
+                is_open = self._hangover > 0
+                self._hangover = max(0, self._hangover - speech.size)
+        else:
+            is_open = self._hangover > 0
+
+        if is_open:
+            if not self.is_open:
+                logger.debug("VAD gate opened")
+                self._flush_pre_roll()
+            self.is_open = True
+            self._forward(data)
+        else:
+            if self.is_open:
+                logger.debug("VAD gate closed")
+            self.is_open = False
+            self._remember(data)
+
+    def __call__(self, data: bytes) -> None:
+        self.process(data)
+
+    def _remember(self, data: bytes) -> None:
+        """Copy the chunk into the pre-roll ring, overwriting the oldest audio beyond the limit"""
+        samples = np.frombuffer(data, dtype=np.int16)
+        capacity = self.pre_roll_samples
+        overflow = self._pre_roll_fill + samples.size - capacity
+        if overflow > 0:
+            self.bytes_suppressed += overflow * 2
+        if capacity == 0:
+            return
+
+        keep = samples[-capacity:]
+        start = (self._pre_roll_pos + samples.size - keep.size) % capacity
+        first = min(keep.size, capacity - start)
+        self._pre_roll[start:start + first] = keep[:first]
+        self._pre_roll[:keep.size - first] = keep[first:]
+        self._pre_roll_pos = (self._pre_roll_pos + samples.size) % capacity
+        self._pre_roll_fill = min(capacity, self._pre_roll_fill + samples.size)
+
+    def _flush_pre_roll(self) -> None:
+        """Forward the buffered pre-roll oldest first, as at most two views into the ring"""
+        if self._pre_roll_fill == 0:
+            return
+        start = (self._pre_roll_pos - self._pre_roll_fill) % self.pre_roll_samples
+        first = min(self._pre_roll_fill, self.pre_roll_samples - start)
+        self._forward(self._pre_roll_view[start * 2:(start + first) * 2])
+        if first < self._pre_roll_fill:
+            self._forward(self._pre_roll_view[:(self._pre_roll_fill - first) * 2])
+        self._pre_roll_fill = 0
+
+    def _forward(self, data: bytes) -> None:
+        self.chunks_forwarded += 1
+        if self.on_audio_data:
+            self.on_audio_data(data)
+
+    def get_stats(self) -> Dict:
+        """
+        Get gate counters
+
+        Returns:
+            Dictionary with chunk counts, suppressed bytes and silence duration
+        """
+        return {
+            'is_open': self.is_open,
+            'chunks_in': self.chunks_in,
+            'chunks_forwarded': self.chunks_forwarded,
+            'bytes_suppressed': self.bytes_suppressed,
+            'silence_seconds': self.silence_seconds(),
+        }
@@ -7,7 +7,14 @@ import argparse
 from dotenv import load_dotenv
 
 from core.tingwu_sdk.ws import TingwuSDK
+from core.tingwu_sdk.task_pool import TaskPool
 from core.audio_capture import AudioCapture
+from core.audio_source import FileAudioSource
+from core.vad import VoiceActivityGate
+from core.framer import AudioFramer
+from core.encoder import create_encoder
+from core.pipeline import build_pipeline
+from core.tracing import tracer
 from utils.logger import logger
 
 load_dotenv()
@@ -28,14 +35,31 @@ def main():
     parser.add_argument('--access-key-id', help='Alibaba Cloud Access Key ID')
     parser.add_argument('--access-key-secret', help='Alibaba Cloud Access Key Secret')
     parser.add_argument('--app-key', help='Tingwu App Key')
+    parser.add_argument('--endpoint', help='Control-plane endpoint, e.g. http://127.0.0.1:8766 for the local emulator (default: Tingwu API)')
     parser.add_argument('--language', default='cn', help='Source language (cn, en, multilingual)')
     parser.add_argument('--enable-translation', action='store_true', help='Enable translation')
     parser.add_argument('--target-language', default='en', help='Target language for translation')
     parser.add_argument('--sample-rate', type=int, default=16000, help='Audio sample rate (8000 or 16000)')
 
-    # todo: 可以升级为多长时间没有声音就停止程序
     parser.add_argument('--duration', type=int, default=30, help='Recording duration in seconds')
+    parser.add_argument('--buffer-seconds', type=float, default=2.0, help='Capture ring buffer size in seconds (0 to disable)')
+    parser.add_argument('--capture-mode', choices=['blocking', 'callback'], default='callback', help='Audio capture engine (default: callback)')
+    parser.add_argument('--native-format', action='store_true', help="Capture at the microphone's native rate/channels and resample to --sample-rate mono")
+    parser.add_argument('--input-file', help='Replay a 16-bit WAV/PCM file instead of the microphone')
+    parser.add_argument('--fast-replay', action='store_true', help='Replay --input-file as fast as possible instead of in real time')
+    parser.add_argument('--format', choices=['pcm', 'opus'], default='pcm', help='Upstream audio format (opus requires opuslib)')
+    parser.add_argument('--frame-ms', type=int, default=40, help='Upstream audio frame duration in ms (10-200)')
+    parser.add_argument('--vad', action='store_true', help='Only stream speech (voice activity gating)')
+    parser.add_argument('--reconnect-attempts', type=int, default=5, help='Attempts to resume the session after a dropped connection (0 to disable)')
+    parser.add_argument('--send-queue-frames', type=int, default=50, help='Outbound audio queue capacity in frames')
+    parser.add_argument('--send-policy', choices=['block', 'drop_oldest', 'skip_silence'], default='drop_oldest', help='What to do when the outbound queue is full (default: drop_oldest)')
+    parser.add_argument('--silence-timeout', type=float, default=0, help='Stop after this many seconds without speech (0 to disable, implies --vad)')
+    parser.add_argument('--task-pool', type=int, default=0, help='Keep N realtime tasks created in advance so starting a session skips CreateTask (0 to disable)')
+    parser.add_argument('--trace', metavar='PATH', help='Record per-utterance latency spans and write them as Chrome trace JSON (open in ui.perfetto.dev)')
     args = parser.parse_args()
+    
+    if args.trace:
+        tracer.enable()
 
     # Get credentials from arguments or environment variables
     access_key_id = args.access_key_id or os.environ.get('ALIBABA_CLOUD_ACCESS_KEY_ID')
@@ -48,11 +72,18 @@ def main():
         print("Error: Missing credentials. Please provide them as arguments or environment variables.")
         return
     
+    endpoint = args.endpoint or os.environ.get('TINGWU_ENDPOINT')
+    
     # Initialize Tingwu SDK
     sdk = TingwuSDK(
         access_key_id=access_key_id,
         access_key_secret=access_key_secret,
-        app_key=app_key
+        app_key=app_key,
+        frame_ms=args.frame_ms,
+        reconnect_attempts=args.reconnect_attempts,
+        send_queue_frames=args.send_queue_frames,
+        send_policy=args.send_policy,
+        endpoint=endpoint
     )
     
     # Set up target languages for translation
@@ -60,66 +91,123 @@ def main():
     if args.enable_translation:
         target_languages = [args.target_language]
     
+    task_params = dict(
+        source_language=args.language,
+        format=args.format,
+        sample_rate=args.sample_rate,
+        output_level=2,  # Get interim results
+        enable_translation=args.enable_translation,
+        target_languages=target_languages
+    )
+    
+    # Create tasks ahead of time on a dedicated SDK instance, so a session
+    # starts with only the WebSocket connect
+    task_pool = None
+    if args.task_pool > 0:
+        creator = TingwuSDK(access_key_id, access_key_secret, app_key, endpoint=endpoint)
+        task_pool = TaskPool(creator, size=args.task_pool, **task_params)
+        task_pool.start()
+    
     try:
-        # Create task
-        task_info = sdk.create_task(
-            source_language=args.language,
-            format='pcm',
-            sample_rate=args.sample_rate,
-            output_level=2,  # Get interim results
-            enable_translation=args.enable_translation,
-            target_languages=target_languages
-        )
-        
-        print(f"Task created with ID: {task_info['Data']['TaskId']}")
-        print(f"WebSocket URL: {task_info['Data']['MeetingJoinUrl']}")
+        # Take a pre-created task, or create one now
+        task = task_pool.acquire(timeout=5) if task_pool else None
+        if task is not None:
+            sdk.use_task(task)
+            print(f"Task taken from pool with ID: {sdk.task_id}")
+            print(f"WebSocket URL: {sdk.ws_url}")
+        else:
+            task_info = sdk.create_task(**task_params)
+            
+            print(f"Task created with ID: {task_info['Data']['TaskId']}")
+            print(f"WebSocket URL: {task_info['Data']['MeetingJoinUrl']}")
         
         # Set up callback for transcription results
         sdk.set_callbacks(
             on_transcription_result=on_transcription_result,
             on_connection_open=lambda: print("\nWebSocket connection opened and ready to stream audio"),
-            on_connection_close=lambda: print("\nWebSocket connection closed - will try to reconnect if still recording"),
+            on_connection_close=lambda: print("\nWebSocket connection closed"),
             on_error=lambda error: print(f"\nWebSocket error: {error}")
         )
         
-        # Start WebSocket connection
+        # Start WebSocket connection and wait for the server to accept the transcription
         sdk.start_streaming()
+        if not sdk.wait_ready(timeout=5):
+            print("\nWarning: transcription start not acknowledged yet, streaming anyway")
+        
+        # Initialize audio source: microphone or file replay
+        if args.input_file:
+            audio = FileAudioSource(args.input_file, realtime=not args.fast_replay, target_rate=args.sample_rate)
+        else:
+            audio = AudioCapture(rate=args.sample_rate, buffer_seconds=args.buffer_seconds, mode=args.capture_mode,
+                                 native_format=args.native_format)
         
-        # Initialize audio capture
-        audio = AudioCapture(rate=args.sample_rate)
+        # Optionally gate silence out before it reaches the SDK, then re-frame
+        # the capture chunks into fixed-duration upstream packets
+        vad_gate = None
+        if args.vad or args.silence_timeout > 0:
+            vad_gate = VoiceActivityGate(sample_rate=args.sample_rate)
+        # Opus frames internally, so the PCM framer is only needed for raw PCM
+        encoder = create_encoder(args.format, sample_rate=args.sample_rate)
+        framer = None if encoder else AudioFramer(frame_ms=args.frame_ms, sample_rate=args.sample_rate)
         
-        # Set up callback for audio data
-        audio.set_audio_callback(sdk.send_audio_data)
+        # Set up callback for audio data: capture -> [VAD] -> framer|encoder -> SDK
+        audio.set_audio_callback(build_pipeline([vad_gate, framer, encoder], sdk.send_audio_data))
         
         # Start recording with connection check
         print("\nStarting microphone recording...")
         print(f"Recording for {args.duration} seconds. Speak now...")
         audio.start()
         
-        # Monitor connection status during recording
+        # Monitor connection status during recording; the SDK reconnects and
+        # replays unacknowledged audio on its own, so wait_closed only returns
+        # once the session could not be resumed
         start_time = time.time()
-        connection_check_interval = 2  # Check connection every 2 seconds
-        next_check_time = start_time + connection_check_interval
         
-        while time.time() - start_time < args.duration:
-            if time.time() >= next_check_time:
-                if not sdk.is_connected:
-                    print("\nWebSocket connection lost, attempting to reconnect...")
-                    try:
-                        # Try to restart streaming
-                        sdk.stop_streaming()
-                        time.sleep(1)
-                        sdk.start_streaming()
-                        print("Reconnected successfully")
-                    except Exception as e:
-                        print(f"\nFailed to reconnect: {e}")
-                        break
-                next_check_time = time.time() + connection_check_interval
-            time.sleep(0.1)  # Small sleep to prevent CPU overuse
+        while time.time() - start_time < args.duration and audio.is_recording:
+            if sdk.wait_closed(timeout=0.1):
+                print("\nWebSocket connection lost and could not be resumed")
+                break
+            if args.silence_timeout > 0 and vad_gate.silence_seconds() >= args.silence_timeout:
+                print(f"\nNo speech for {args.silence_timeout} seconds")
+                break
         
         # Stop recording
         print("\nStopping recording...")
         audio.stop()
+        (encoder or framer).flush()
+        
+        if isinstance(audio, AudioCapture):
+            buffer_stats = audio.get_buffer_stats()
+            if buffer_stats:
+                print(f"Capture buffer: overruns={buffer_stats['overruns']}, underruns={buffer_stats['underruns']}")
+            jitter = audio.get_jitter_stats()
+            print(f"Capture jitter ({jitter['mode']}): mean={jitter['mean']:.2f} ms, max={jitter['max']:.2f} ms, buckets={jitter['buckets']}")
+            metrics = audio.get_metrics()
+            print(f"Capture health: frames={metrics['frames_captured']}, overflows={metrics['input_overflows']}, "
+                  f"drops={metrics['queue_drops']}, peak_fill={metrics['peak_fill']}/{metrics['capacity']}, "
+                  f"callback mean={metrics['callback_ms']['mean']:.2f} ms max={metrics['callback_ms']['max']:.2f} ms")
+        if vad_gate:
+            print(f"VAD: {vad_gate.get_stats()}")
+        if encoder:
+            stats = encoder.get_stats()
+            print(f"Encoder: {stats['bytes_in']} -> {stats['bytes_out']} bytes, saved {stats['bandwidth_saved']:.1%}, mean encode {stats['encode_ms']['mean']:.3f} ms")
+        
+        connect = sdk.get_connect_stats()
+        print(f"Connect: attempts={connect['attempts']}, failures={connect['failures']}, last={ {k: round(v, 1) for k, v in connect['last_ms'].items()} }")
+        control = sdk.get_control_stats()
+        if control:
+            create = control['operations_ms'].get('CreateTask', {})
+            print(f"Control plane: CreateTask {create.get('mean', 0.0):.0f} ms, connections opened={control['connections_opened']}, "
+                  f"reused={control['connections_reused']}, TLS connect mean={control['connect_ms']['mean']:.0f} ms")
+        send_stats = sdk.get_send_queue_stats()
+        print(f"Send queue ({send_stats['policy']}): peak depth={send_stats['peak_depth']}/{send_stats['capacity']}, "
+              f"dropped={send_stats['frames_dropped']} frames ({send_stats['bytes_dropped']} bytes), "
+              f"latency mean={send_stats['latency_ms']['mean']:.2f} ms max={send_stats['latency_ms']['max']:.2f} ms")
+        reconnect = sdk.get_reconnect_stats()
+        if reconnect['drops']:
+            print(f"Reconnect: drops={reconnect['drops']}, recoveries={reconnect['recoveries']}, "
+                  f"replayed={reconnect['replayed_ms']:.0f} ms, lost={reconnect['lost_ms']:.0f} ms, duplicates suppressed={reconnect['duplicates_suppressed']}, "
+                  f"recovery max={reconnect['recovery_ms']['max']:.0f} ms")
         
         # Stop streaming
         sdk.stop_streaming()
@@ -135,6 +223,13 @@ def main():
     except Exception as e:
         logger.error(f"Error in demo: {str(e)}")
         print(f"Error: {str(e)}")
+    finally:
+        if task_pool:
+            # Tasks still in the pool are ended on the service
+            task_pool.stop()
+        if args.trace:
+            count = tracer.export(args.trace)
+            print(f"Trace written to {args.trace} ({count} events)")
     
 if __name__ == "__main__":
     main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+多站点实时语音转写演示程序 - 每个麦克风对应一个通义听悟会话
+"""
+
+import os
+import time
+import argparse
+from dotenv import load_dotenv
+
+import pyaudio
+
+from core.multi_capture import MultiCaptureManager
+from utils.logger import Logger
+
+logger = Logger().logger
+
+load_dotenv()
+
+
+def parse_station(value: str):
+    """
+    解析 --station 参数，格式为 ID=DEVICE，DEVICE 可以是设备序号或名称片段
+    """
+    station_id, _, device = value.partition('=')
+    if not station_id or not device:
+        raise argparse.ArgumentTypeError(f"Expected ID=DEVICE, got '{value}'")
+    return station_id, int(device) if device.isdigit() else device
+
+
+def list_input_devices():
+    """列出所有可用的音频输入设备"""
+    p = pyaudio.PyAudio()
+    try:
+        for index in range(p.get_device_count()):
+            info = p.get_device_info_by_index(index)
+            if info['maxInputChannels'] > 0:
+                print(f"[{index}] {info['name']} ({int(info['defaultSampleRate'])} Hz, {info['maxInputChannels']} ch)")
+    finally:
+        p.terminate()
+
+
+def on_result(station_id: str, result_text, is_sentence_end, begin_time_ms):
+    """转写结果回调，带站点标识"""
+    logger.info(f"[{station_id}] {result_text}")
+
+
+def on_error(station_id: str, message):
+    """错误回调，带站点标识"""
+    logger.error(f"[{station_id}] Error: {message}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-station demo for Alibaba Tingwu Real-time Speech-to-Text")
+    parser.add_argument('--access-key-id', help='Alibaba Cloud Access Key ID')
+    parser.add_argument('--access-key-secret', help='Alibaba Cloud Access Key Secret')
+    parser.add_argument('--app-key', help='Tingwu App Key')
+    parser.add_argument('--language', default='cn', help='Source language (default: cn)')
+    parser.add_argument('--sample-rate', type=int, default=16000, help='Audio sample rate (8000 or 16000)')
+    parser.add_argument('--frame-ms', type=int, default=40, help='Upstream audio frame duration in ms (10-200)')
+    parser.add_argument('--native-format', action='store_true', help="Capture at each microphone's native rate/channels")
+    parser.add_argument('--station', action='append', type=parse_station, default=[], help='Station as ID=DEVICE (device index or name), repeatable')
+    parser.add_argument('--list-devices', action='store_true', help='List audio input devices and exit')
+    parser.add_argument('--duration', type=int, default=60, help='Recording duration in seconds')
+    args = parser.parse_args()
+
+    if args.list_devices:
+        list_input_devices()
+        return
+
+    if not args.station:
+        print("Error: At least one --station ID=DEVICE is required (see --list-devices).")
+        return
+
+    access_key_id = args.access_key_id or os.environ.get('ALIBABA_CLOUD_ACCESS_KEY_ID')
+    access_key_secret = args.access_key_secret or os.environ.get('ALIBABA_CLOUD_ACCESS_KEY_SECRET')
+    app_key = args.app_key or os.environ.get('TINGWU_APP_KEY')
+
+    if not access_key_id or not access_key_secret or not app_key:
+        print("Error: Missing credentials. Please provide them as arguments or environment variables.")
+        return
+
+    manager = MultiCaptureManager(
+        access_key_id, access_key_secret, app_key,
+        sample_rate=args.sample_rate,
+        frame_ms=args.frame_ms,
+        native_format=args.native_format
+    )
+    manager.set_callbacks(on_result=on_result, on_error=on_error)
+
+    for station_id, device in args.station:
+        manager.add_station(station_id, device)
+
+    try:
+        started = manager.start(source_language=args.language)
+        print(f"Stations streaming: {', '.join(started) or 'none'}")
+        time.sleep(args.duration)
+    except KeyboardInterrupt:
+        print("\nInterrupted by user")
+    finally:
+        manager.stop()
+        for station_id, stats in manager.get_stats().items():
+            print(f"[{station_id}] device={stats['device']}, drops={stats['queue_drops']}, latency={stats['latency']}")
+        combined = manager.get_combined_latency()
+        if combined.get('count'):
+            print(f"All stations: {combined['count']} latency samples, p50={combined['p50']:.0f} ms, "
+                  f"p99={combined['p99']:.0f} ms, p99.9={combined['p999']:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
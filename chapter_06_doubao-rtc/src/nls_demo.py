@@ -9,13 +9,25 @@ import os
 import time
 import argparse
 import asyncio
+import functools
 import websockets
 import threading
+from http import HTTPStatus
 from typing import Dict, Set
 from dotenv import load_dotenv
 
 from core.tingwu_sdk.nls import TingwuNlsSDK
+from core.tingwu_sdk.task_pool import TaskPool
 from core.audio_capture import AudioCapture
+from core.audio_source import FileAudioSource
+from core.vad import VoiceActivityGate
+from core.framer import AudioFramer
+from core.encoder import create_encoder
+from core.pipeline import build_pipeline
+from core.tracing import tracer
+from core.metrics import Histogram
+from core.openmetrics import (CONTENT_TYPE_OPENMETRICS, CONTENT_TYPE_PROMETHEUS, MetricsRegistry,
+                              collect_capture, collect_sdk)
 from utils.logger import Logger
 
 logger = Logger().logger
@@ -27,19 +39,58 @@ websocket_clients: Set[websockets.ServerConnection] = set() # Updated type hint
 WEBSOCKET_PORT = 8765
 WEBSOCKET_HOST = "127.0.0.1"
 
-async def send_to_td(message: str):
-    """Sends a message to all connected WebSocket clients."""
+# --delta-results: forward only the changed part of each result as JSON
+delta_results = False
+
+# 当前会话的SDK实例，供回调中显示延迟统计
+sdk = None
+
+# Scraped over HTTP at /metrics on the WebSocket port; collectors only read
+# counters that are already maintained, so the send path pays nothing extra
+metrics_registry = MetricsRegistry()
+METRICS_PATH = '/metrics'
+TD_SEND_BUCKETS_MS = (0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 25.0, 50.0, 100.0)
+td_send_histogram = Histogram(TD_SEND_BUCKETS_MS)
+td_messages_sent = 0
+
+def collect_td(writer):
+    """Adds the TouchDesigner fan-out metrics to a scrape."""
+    writer.gauge('td_clients', 'TouchDesigner clients connected', len(websocket_clients))
+    writer.counter('td_messages', 'Results fanned out to TouchDesigner', td_messages_sent)
+    writer.histogram('td_send_seconds', 'Time to send one result to every TouchDesigner client',
+                     td_send_histogram.snapshot())
+
+metrics_registry.register(collect_td)
+
+async def send_to_td(message: str, index=None, scheduled_at=None):
+    """Sends a message to all connected WebSocket clients.
+
+    index and scheduled_at (tracer.now() on the SDK thread) only label the
+    trace: the hop onto this loop and the delivery to TouchDesigner.
+    """
+    if tracer.enabled and scheduled_at is not None:
+        tracer.complete('loop_hop', 'td', scheduled_at, tracer.now() - scheduled_at, {'index': index})
     if websocket_clients:
-        # Create a list of tasks to send messages concurrently
-        tasks = [client.send(message) for client in websocket_clients]
-        await asyncio.gather(*tasks, return_exceptions=True) # Log exceptions if any
+        global td_messages_sent
+        start = time.perf_counter()
+        with tracer.span('send_to_td', 'td', {'index': index, 'clients': len(websocket_clients)}):
+            # Create a list of tasks to send messages concurrently
+            tasks = [client.send(message) for client in websocket_clients]
+            await asyncio.gather(*tasks, return_exceptions=True) # Log exceptions if any
+        td_send_histogram.observe((time.perf_counter() - start) * 1000.0)
+        td_messages_sent += 1
 
 def on_result(result_text, is_sentence_end, begin_time_ms):
     """转写结果回调函数"""
     logger.info(f"[on result] {result_text}")
     # Schedule the send_to_td coroutine on the WebSocket server's event loop
+    if websocket_server_loop and not delta_results:
+        asyncio.run_coroutine_threadsafe(send_to_td(result_text, sdk.current_index, tracer.now()), websocket_server_loop)
+
+def on_result_delta(delta):
+    """增量结果回调：只把变化的部分发给 TouchDesigner"""
     if websocket_server_loop:
-        asyncio.run_coroutine_threadsafe(send_to_td(result_text), websocket_server_loop)
+        asyncio.run_coroutine_threadsafe(send_to_td(delta.to_json(), delta.index, tracer.now()), websocket_server_loop)
 
 def on_sentence_begin(message: Dict):
     """
@@ -114,6 +165,13 @@ def display_latency_stats():
             print(f"50th percentile: {stats['p50_ms']:.2f} ms")
             print(f"95th percentile: {stats['p95_ms']:.2f} ms")
             print(f"99th percentile: {stats['p99_ms']:.2f} ms")
+            print(f"99.9th percentile: {stats['p999_ms']:.2f} ms")
+        
+        # 最近1分钟/15分钟窗口
+        for label, window in stats.get('windows', {}).items():
+            if 'p50_ms' in window:
+                print(f"Last {label}: {window['count']} samples, p50={window['p50_ms']:.2f} ms, "
+                      f"p95={window['p95_ms']:.2f} ms, p99={window['p99_ms']:.2f} ms")
             
         print("=" * 50)
     except Exception as e:
@@ -149,6 +207,16 @@ async def ws_handler(websocket: websockets.ServerConnection, path: str = None):
         websocket_clients.remove(websocket)
         logger.info(f"TouchDesigner client {websocket.remote_address} removed. Remaining clients: {len(websocket_clients)}")
 
+def process_request(connection: websockets.ServerConnection, request):
+    """Answers GET /metrics over plain HTTP; every other path goes on to the WebSocket handshake."""
+    if request.path.split('?', 1)[0] != METRICS_PATH:
+        return None
+    openmetrics = 'application/openmetrics-text' in request.headers.get('Accept', '')
+    response = connection.respond(HTTPStatus.OK, metrics_registry.render(openmetrics))
+    del response.headers['Content-Type']
+    response.headers['Content-Type'] = CONTENT_TYPE_OPENMETRICS if openmetrics else CONTENT_TYPE_PROMETHEUS
+    return response
+
 websocket_server_loop = None
 
 async def _async_websocket_server_main():
@@ -160,8 +228,9 @@ async def _async_websocket_server_main():
     try:
         # Use async with for cleaner server lifecycle management.
         # The server runs until this async with block exits or is cancelled.
-        async with websockets.serve(ws_handler, WEBSOCKET_HOST, WEBSOCKET_PORT):
+        async with websockets.serve(ws_handler, WEBSOCKET_HOST, WEBSOCKET_PORT, process_request=process_request):
             logger.info(f"WebSocket server (async with) is running on ws://{WEBSOCKET_HOST}:{WEBSOCKET_PORT}")
+            logger.info(f"Metrics available at http://{WEBSOCKET_HOST}:{WEBSOCKET_PORT}{METRICS_PATH}")
             await asyncio.Future() # Keep running until cancelled from outside
     except asyncio.CancelledError:
         logger.info("WebSocket server task (_async_websocket_server_main) was cancelled.")
@@ -221,14 +290,31 @@ def main():
     parser.add_argument('--access-key-id', help='Alibaba Cloud Access Key ID')
     parser.add_argument('--access-key-secret', help='Alibaba Cloud Access Key Secret')
     parser.add_argument('--app-key', help='Tingwu App Key')
+    parser.add_argument('--endpoint', help='Control-plane endpoint, e.g. http://127.0.0.1:8766 for the local emulator (default: Tingwu API)')
     parser.add_argument('--language', default='cn', help='Source language (default: cn)')
     parser.add_argument('--enable-translation', action='store_true', help='Enable translation')
     parser.add_argument('--target-language', default='en', help='Target language for translation')
     parser.add_argument('--sample-rate', type=int, default=16000, help='Audio sample rate (8000 or 16000)')
-    # todo: 可以升级为多长时间没有声音就停止程序
     parser.add_argument('--duration', type=int, default=5, help='Recording duration in seconds')
+    parser.add_argument('--buffer-seconds', type=float, default=2.0, help='Capture ring buffer size in seconds (0 to disable)')
+    parser.add_argument('--capture-mode', choices=['blocking', 'callback'], default='callback', help='Audio capture engine (default: callback)')
+    parser.add_argument('--native-format', action='store_true', help="Capture at the microphone's native rate/channels and resample to --sample-rate mono")
+    parser.add_argument('--input-file', help='Replay a 16-bit WAV/PCM file instead of the microphone')
+    parser.add_argument('--fast-replay', action='store_true', help='Replay --input-file as fast as possible instead of in real time')
+    parser.add_argument('--format', choices=['pcm', 'opus'], default='pcm', help='Upstream audio format (opus requires opuslib)')
+    parser.add_argument('--frame-ms', type=int, default=40, help='Upstream audio frame duration in ms (10-200)')
+    parser.add_argument('--vad', action='store_true', help='Only stream speech (voice activity gating)')
+    parser.add_argument('--delta-results', action='store_true', help='Send TouchDesigner JSON deltas against the previous partial instead of the full sentence text')
+    parser.add_argument('--send-queue-frames', type=int, default=50, help='Outbound audio queue capacity in frames')
+    parser.add_argument('--send-policy', choices=['block', 'drop_oldest', 'skip_silence'], default='drop_oldest', help='What to do when the outbound queue is full (default: drop_oldest)')
+    parser.add_argument('--trace', metavar='PATH', help='Record per-utterance latency spans and write them as Chrome trace JSON (open in ui.perfetto.dev)')
+    parser.add_argument('--task-pool', type=int, default=0, help='Keep N realtime tasks created in advance so starting a session skips CreateTask (0 to disable)')
+    parser.add_argument('--silence-timeout', type=float, default=0, help='Stop after this many seconds without speech (0 to disable, implies --vad)')
     args = parser.parse_args()
     
+    if args.trace:
+        tracer.enable()
+    
     # 从命令行参数或环境变量获取密钥
     access_key_id = args.access_key_id or os.environ.get('ALIBABA_CLOUD_ACCESS_KEY_ID')
     access_key_secret = args.access_key_secret or os.environ.get('ALIBABA_CLOUD_ACCESS_KEY_SECRET')
@@ -240,8 +326,17 @@ def main():
         print("Error: Missing credentials. Please provide them as arguments or environment variables.")
         return
     
-    # 创建通义听悟SDK实例
-    sdk = TingwuNlsSDK(access_key_id, access_key_secret, app_key)
+    # 创建通义听悟SDK实例（全局变量，回调中显示延迟统计时使用）
+    global sdk
+    endpoint = args.endpoint or os.environ.get('TINGWU_ENDPOINT')
+    sdk = TingwuNlsSDK(access_key_id, access_key_secret, app_key,
+                       send_queue_frames=args.send_queue_frames, send_policy=args.send_policy,
+                       endpoint=endpoint)
+    
+    metrics_registry.register(functools.partial(collect_sdk, sdk=sdk))
+    
+    global delta_results
+    delta_results = args.delta_results
     
     # 设置回调函数
     sdk.set_callbacks(
@@ -251,31 +346,47 @@ def main():
         on_completed=on_completed,
         on_error=on_error,
         on_connection_open=on_connection_open,
-        on_connection_close=on_connection_close
+        on_connection_close=on_connection_close,
+        on_result_delta=on_result_delta if delta_results else None
+    )
+    
+    task_params = dict(
+        source_language=args.language,
+        format=args.format,
+        sample_rate=args.sample_rate,
+        # 如果需要翻译，添加相关参数
+        enable_translation=args.enable_translation,
+        target_languages=[args.target_language] if args.enable_translation else None
     )
     
+    # 任务池：启动时用单独的SDK实例预先创建任务，访客到来时只需建立WebSocket连接
+    task_pool = None
+    if args.task_pool > 0:
+        creator = TingwuNlsSDK(access_key_id, access_key_secret, app_key, endpoint=endpoint)
+        task_pool = TaskPool(creator, size=args.task_pool, **task_params)
+        task_pool.start()
+    
     try:
-        # 创建任务
-        task_info = sdk.create_task(
-            source_language=args.language,
-            format="pcm",  # 固定为PCM格式
-            sample_rate=args.sample_rate,
-            # 如果需要翻译，添加相关参数
-            enable_translation=args.enable_translation,
-            target_languages=[args.target_language] if args.enable_translation else None
-        )
-        
-        # task_info 形式为 {'Code': '0', 'Data': {'TaskId': '...', 'MeetingJoinUrl': '...'}, ...}
-        if 'Data' in task_info:
-            task_id = task_info['Data'].get('TaskId')
-            ws_url = task_info['Data'].get('MeetingJoinUrl')
-            
-            print(f"Task created with ID: {task_id}")
-            print(f"WebSocket URL: {ws_url}")
-        else:
-            # 如果没有Data字段，直接使用对象属性
-            print(f"Task created with ID: {sdk.task_id}")
+        # 优先从任务池取预先创建的任务，池为空时再创建任务
+        task = task_pool.acquire(timeout=5) if task_pool else None
+        if task is not None:
+            sdk.use_task(task)
+            print(f"Task taken from pool with ID: {sdk.task_id}")
             print(f"WebSocket URL: {sdk.ws_url}")
+        else:
+            task_info = sdk.create_task(**task_params)
+            
+            # task_info 形式为 {'Code': '0', 'Data': {'TaskId': '...', 'MeetingJoinUrl': '...'}, ...}
+            if 'Data' in task_info:
+                task_id = task_info['Data'].get('TaskId')
+                ws_url = task_info['Data'].get('MeetingJoinUrl')
+                
+                print(f"Task created with ID: {task_id}")
+                print(f"WebSocket URL: {ws_url}")
+            else:
+                # 如果没有Data字段，直接使用对象属性
+                print(f"Task created with ID: {sdk.task_id}")
+                print(f"WebSocket URL: {sdk.ws_url}")
         
         # 启动WebSocket连接
         if not sdk.start_streaming(
@@ -286,14 +397,36 @@ def main():
             logger.error("Failed to start WebSocket connection")
             return
         
-        # 初始化音频捕获
-        audio_capture = AudioCapture(
-            rate=args.sample_rate,
-            channels=1,
-            chunk_size=1024
-        )
-                # Set up callback for audio data
-        audio_capture.set_audio_callback(sdk.send_audio_data)
+        # 初始化音频源：麦克风或文件回放
+        if args.input_file:
+            audio_capture = FileAudioSource(
+                args.input_file,
+                chunk_size=1024,
+                realtime=not args.fast_replay,
+                target_rate=args.sample_rate
+            )
+        else:
+            audio_capture = AudioCapture(
+                rate=args.sample_rate,
+                channels=1,
+                chunk_size=1024,
+                buffer_seconds=args.buffer_seconds,
+                mode=args.capture_mode,
+                native_format=args.native_format
+            )
+            metrics_registry.register(functools.partial(collect_capture, capture=audio_capture))
+        
+        # 可选的语音活动检测：只发送语音段，并用于静音超时停止；
+        # 分帧器把任意大小的采集块切成固定时长的上行帧
+        vad_gate = None
+        if args.vad or args.silence_timeout > 0:
+            vad_gate = VoiceActivityGate(sample_rate=args.sample_rate)
+        # Opus frames internally, so the PCM framer is only needed for raw PCM
+        encoder = create_encoder(args.format, sample_rate=args.sample_rate)
+        framer = None if encoder else AudioFramer(frame_ms=args.frame_ms, sample_rate=args.sample_rate)
+        
+        # Set up callback for audio data: capture -> [VAD] -> framer|encoder -> SDK
+        audio_capture.set_audio_callback(build_pipeline([vad_gate, framer, encoder], sdk.send_audio_data))
         
         print("\nStarting microphone recording...")
         print(f"Recording for {args.duration} seconds. Speak now...")
@@ -311,8 +444,16 @@ def main():
             current_time = time.time()
             if current_time >= next_display:
                 next_display = current_time + display_interval
+            if args.silence_timeout > 0 and vad_gate.silence_seconds() >= args.silence_timeout:
+                print(f"\nNo speech for {args.silence_timeout} seconds, stopping...")
+                audio_capture.stop()
+                break
             time.sleep(0.1)  # 避免CPU过度使用
         
+        # 发送最后一个不完整的帧
+        audio_capture.stop()
+        (encoder or framer).flush()
+        
         # 停止流式转写
         sdk.stop_streaming()
         
@@ -320,6 +461,30 @@ def main():
         print("\n--- Final Latency Statistics ---")
         display_latency_stats()
         
+        if isinstance(audio_capture, AudioCapture):
+            metrics = audio_capture.get_metrics()
+            print(f"Capture health: frames={metrics['frames_captured']}, overflows={metrics['input_overflows']}, "
+                  f"drops={metrics['queue_drops']}, peak_fill={metrics['peak_fill']}/{metrics['capacity']}, "
+                  f"callback mean={metrics['callback_ms']['mean']:.2f} ms max={metrics['callback_ms']['max']:.2f} ms")
+        
+        if encoder:
+            stats = encoder.get_stats()
+            print(f"Encoder: {stats['bytes_in']} -> {stats['bytes_out']} bytes, saved {stats['bandwidth_saved']:.1%}, mean encode {stats['encode_ms']['mean']:.3f} ms")
+        
+        if delta_results:
+            stats = sdk.get_delta_stats()
+            print(f"Result deltas: {stats['results']} results, {stats['chars_in']} -> {stats['chars_out']} chars, saved {stats['saved']:.1%}")
+        
+        control = sdk.get_control_stats()
+        if control:
+            create = control['operations_ms'].get('CreateTask', {})
+            print(f"Control plane: CreateTask {create.get('mean', 0.0):.0f} ms, connections opened={control['connections_opened']}, "
+                  f"reused={control['connections_reused']}, TLS connect mean={control['connect_ms']['mean']:.0f} ms")
+        send_stats = sdk.get_send_queue_stats()
+        print(f"Send queue ({send_stats['policy']}): peak depth={send_stats['peak_depth']}/{send_stats['capacity']}, "
+              f"dropped={send_stats['frames_dropped']} frames ({send_stats['bytes_dropped']} bytes), "
+              f"latency mean={send_stats['latency_ms']['mean']:.2f} ms max={send_stats['latency_ms']['max']:.2f} ms")
+        
         # 结束任务
         print("Ending task...")
         task_status = sdk.end_task()
@@ -330,6 +495,13 @@ def main():
     except Exception as e:
         logger.error(f"Error in main: {str(e)}")
         print(f"Error: {str(e)}")
+    finally:
+        if task_pool:
+            # 池中未使用的任务在服务端结束
+            task_pool.stop()
+        if args.trace:
+            count = tracer.export(args.trace)
+            print(f"Trace written to {args.trace} ({count} events)")
 
 if __name__ == "__main__":
     # Start WebSocket server in a separate thread
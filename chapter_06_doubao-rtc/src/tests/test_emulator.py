@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+Smoke tests: the WebSocket SDKs against the local Tingwu emulator
+
+Run from the src directory:
+    python -m pytest -q tests
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.tingwu_sdk.aio import AsyncTingwuSDK
+from core.tingwu_sdk.emulator import TingwuEmulator
+from core.tingwu_sdk.ws import TingwuSDK
+
+SAMPLE_RATE = 16000
+FRAME_MS = 40
+FRAME = bytes(SAMPLE_RATE * FRAME_MS // 1000 * 2)
+
+# Short sentences so a couple of seconds of audio yield several finals
+EMULATOR_ARGS = dict(http_port=0, ws_port=0, sentence_ms=400, gap_ms=100, partial_interval_ms=100,
+                     latency_ms=20, jitter_ms=0, seed=1)
+
+
+def emulator(**overrides) -> TingwuEmulator:
+    return TingwuEmulator(**{**EMULATOR_ARGS, **overrides})
+
+
+class TingwuSDKTest(unittest.TestCase):
+    """Threaded TingwuSDK"""
+
+    def open_session(self, emu: TingwuEmulator) -> TingwuSDK:
+        sdk = TingwuSDK('emulator', 'emulator', 'emulator', frame_ms=FRAME_MS, endpoint=emu.endpoint)
+        sdk.finals = []
+        sdk.on_result = lambda text, is_final, confidence: is_final and sdk.finals.append(text)
+        sdk.create_task(sample_rate=SAMPLE_RATE)
+        sdk.start_streaming()
+        return sdk
+
+    def stream(self, sdk: TingwuSDK, seconds: float) -> None:
+        # Twice real time keeps the tests short
+        for _ in range(int(seconds * 1000 / FRAME_MS)):
+            sdk.send_audio_data(FRAME)
+            time.sleep(FRAME_MS / 2000.0)
+
+    def test_stream_and_stop(self):
+        with emulator() as emu:
+            sdk = self.open_session(emu)
+            self.stream(sdk, 2.0)
+            sdk.stop_streaming()
+            # 2 s at 500 ms per sentence; StopTranscription flushes the last one
+            self.assertGreaterEqual(len(sdk.finals), 4)
+            self.assertFalse(sdk.is_connected)
+            self.assertEqual(sdk.get_send_queue_stats()['frames_dropped'], 0)
+
+    def test_stop_before_ack(self):
+        with emulator(latency_ms=3000) as emu:
+            sdk = self.open_session(emu)
+            sdk.send_audio_data(FRAME)
+            start = time.monotonic()
+            sdk.stop_streaming(drain_timeout=5)
+            self.assertLess(time.monotonic() - start, 2.0)
+            self.assertEqual(sdk.finals, [])
+            self.assertFalse(sdk.is_connected)
+
+    def test_forced_disconnect_recovers(self):
+        with emulator(disconnect_after_s=0.6) as emu:
+            sdk = self.open_session(emu)
+            # Keep streaming through the jittered reconnect backoff until the session is back
+            deadline = time.monotonic() + 10
+            while not sdk.get_reconnect_stats()['recoveries'] and time.monotonic() < deadline:
+                self.stream(sdk, 0.4)
+            sdk.stop_streaming()
+            self.assertGreaterEqual(emu.get_stats()['forced_disconnects'], 1)
+            self.assertGreaterEqual(sdk.get_reconnect_stats()['recoveries'], 1)
+            self.assertTrue(sdk.finals)
+
+
+class AsyncTingwuSDKTest(unittest.TestCase):
+    """asyncio AsyncTingwuSDK; the emulator is started from inside the loop"""
+
+    async def open_session(self, emu: TingwuEmulator) -> AsyncTingwuSDK:
+        sdk = AsyncTingwuSDK('emulator', 'emulator', 'emulator', frame_ms=FRAME_MS, send_queue_chunks=8,
+                             endpoint=emu.endpoint)
+        sdk.finals = []
+        sdk.closed = threading.Event()
+        sdk.on_result = lambda text, is_final, confidence: is_final and sdk.finals.append(text)
+        sdk.on_connection_close = sdk.closed.set
+        await sdk.create_task(sample_rate=SAMPLE_RATE)
+        await sdk.start_streaming()
+        return sdk
+
+    async def stream(self, sdk: AsyncTingwuSDK, seconds: float) -> None:
+        for _ in range(int(seconds * 1000 / FRAME_MS)):
+            sdk.send_audio_data(FRAME)
+            await asyncio.sleep(FRAME_MS / 2000.0)
+
+    def test_stream_and_stop(self):
+        async def run():
+            with emulator() as emu:
+                sdk = await self.open_session(emu)
+                await self.stream(sdk, 2.0)
+                await asyncio.wait_for(sdk.stop_streaming(), 10)
+                self.assertGreaterEqual(len(sdk.finals), 4)
+                self.assertFalse(sdk.is_connected)
+                self.assertEqual(sdk.get_stats()['queue_drops'], 0)
+
+        asyncio.run(run())
+
+    def test_stop_before_ack(self):
+        async def run():
+            with emulator(latency_ms=3000) as emu:
+                sdk = await self.open_session(emu)
+                # Fill the pre-ready queue; stopping must not wait for room in it
+                for _ in range(sdk.send_queue_chunks * 2):
+                    sdk.send_audio_data(FRAME)
+                await asyncio.sleep(0.05)
+                start = time.monotonic()
+                await asyncio.wait_for(sdk.stop_streaming(timeout=5), 5)
+                self.assertLess(time.monotonic() - start, 2.0)
+                self.assertEqual(sdk.finals, [])
+                self.assertFalse(sdk.is_connected)
+
+        asyncio.run(run())
+
+    def test_forced_disconnect(self):
+        async def run():
+            with emulator(disconnect_after_s=0.6) as emu:
+                sdk = await self.open_session(emu)
+                await self.stream(sdk, 1.2)
+                # No replay reconnect in the async SDK: the drop reaches the caller
+                self.assertTrue(sdk.closed.is_set())
+                self.assertTrue(sdk.finals)
+                await asyncio.wait_for(sdk.stop_streaming(), 5)
+                self.assertEqual(emu.get_stats()['forced_disconnects'], 1)
+
+        asyncio.run(run())
+
+
+if __name__ == '__main__':
+    unittest.main()
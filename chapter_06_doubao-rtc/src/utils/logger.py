@@ -2,7 +2,9 @@
 # coding=utf-8
 
 import logging
+import logging.handlers
 import os
+import queue
 from datetime import datetime
 
 class Logger:
@@ -20,7 +22,7 @@ class Logger:
     def _initialize_logger(self):
         """Initialize the logger with appropriate configuration"""
         self.logger = logging.getLogger("TingwuSDK")
-        self.logger.setLevel(logging.DEBUG)
+        self._listener = None
         
         # Create logs directory if it doesn't exist
         logs_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "logs")
@@ -29,7 +31,12 @@ class Logger:
         # Create file handler for logs
         log_file = os.path.join(logs_dir, f"tingwu_{datetime.now().strftime('%Y%m%d')}.log")
         file_handler = logging.FileHandler(log_file, encoding="utf-8")
-        file_handler.setLevel(logging.DEBUG)
+        
+        # 文件日志级别，默认为 INFO，热路径上的调试日志不会被格式化；
+        # 需要时通过 LOG_FILE_LEVEL=DEBUG 开启
+        file_level_name = os.environ.get('LOG_FILE_LEVEL', 'INFO').upper()
+        file_level = getattr(logging, file_level_name, logging.INFO)
+        file_handler.setLevel(file_level)
         
         # Create console handler
         console_handler = logging.StreamHandler()
@@ -38,6 +45,9 @@ class Logger:
         log_level_name = os.environ.get('LOG_LEVEL', 'INFO').upper()
         log_level = getattr(logging, log_level_name, logging.INFO)
         console_handler.setLevel(log_level)
+        
+        # Records below both handler levels are rejected before any formatting
+        self.logger.setLevel(min(file_level, log_level))
         self.logger.debug(f"Console log level set to {log_level_name} from environment variable")
         
         # Create formatter
@@ -49,6 +59,46 @@ class Logger:
         self.logger.addHandler(file_handler)
         self.logger.addHandler(console_handler)
     
+    def start_background_writer(self) -> bool:
+        """
+        Hand records to a listener thread that owns the file and console handlers,
+        so threads and event loops that log never block on I/O
+        
+        Returns:
+            True if this call started the writer, False if it was already running
+        """
+        if self._listener is not None:
+            return False
+        handlers = list(self.logger.handlers)
+        records = queue.SimpleQueue()
+        self._listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+        for handler in handlers:
+            self.logger.removeHandler(handler)
+        self.logger.addHandler(logging.handlers.QueueHandler(records))
+        self._listener.start()
+        return True
+    
+    def stop_background_writer(self):
+        """Flush pending records and restore direct output"""
+        if self._listener is None:
+            return
+        self._listener.stop()
+        for handler in list(self.logger.handlers):
+            self.logger.removeHandler(handler)
+        for handler in self._listener.handlers:
+            self.logger.addHandler(handler)
+        self._listener = None
+    
+    def isEnabledFor(self, level: int) -> bool:
+        """
+        Whether a record at `level` would be written anywhere; hot paths check
+        this before building an expensive debug message
+        
+        Args:
+            level: logging level, e.g. logging.DEBUG
+        """
+        return self.logger.isEnabledFor(level)
+    
     def debug(self, message):
         """Log debug message"""
         self.logger.debug(message)